@@ -0,0 +1,108 @@
+"""
+Cluster de N nós `P2PNode` em 127.0.0.x. Mede a latência de propagação de
+chats minerados no nó 127.0.0.1 e o tráfego de sincronização em regime, pelas
+métricas dos próprios nós e pela interface de loopback.
+Uso: python -m benchmarks.cluster [--nodes N] [--chats C] [--sync-window S]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from dcc_chat.config import PEER_REQUEST_INTERVAL
+from dcc_chat.connection import P2PNode
+from dcc_chat.messages import put_chat_in_queue, send_to_chats_to_all_peers
+from dcc_chat.mining import Miner
+
+
+def loopback_bytes():
+    """Bytes transmitidos pela interface de loopback (Linux), ou None."""
+    try:
+        with open("/proc/net/dev") as f:
+            for line in f:
+                name, _, data = line.partition(":")
+                if name.strip() == "lo":
+                    return int(data.split()[8])
+    except OSError:
+        pass
+    return None
+
+
+async def _wait_for(predicate, timeout: float, interval: float = 0.005) -> bool:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if predicate():
+            return True
+        await asyncio.sleep(interval)
+    return predicate()
+
+
+async def run_cluster(nodes: int = 4, chats: int = 3, sync_window: float = PEER_REQUEST_INTERVAL, timeout: float = 10.0):
+    ips = [f"127.0.0.{i + 1}" for i in range(nodes)]
+    cluster = [P2PNode(ips[0])] + [P2PNode(ip, bootstrap_ip=ips[0]) for ip in ips[1:]]
+    for node in cluster:
+        node.miner.close()
+        node.miner = Miner(workers=1)
+    tasks = [asyncio.create_task(cluster[0].start())]
+    await asyncio.sleep(0.2)
+    tasks += [asyncio.create_task(node.start()) for node in cluster[1:]]
+
+    result = {"nodes": nodes, "chats": chats}
+    try:
+        connected = await _wait_for(lambda: len(cluster[0].peers) == nodes - 1, timeout)
+        result["connected"] = connected
+
+        origin = cluster[0]
+        latencies = []
+        for i in range(chats):
+            await put_chat_in_queue(origin.chats, f"bench {i}", origin.miner)
+            origin.on_chain_changed(len(origin.chats) - 1)
+            height = len(origin.chats)
+            start = time.perf_counter()
+            await send_to_chats_to_all_peers(origin)
+            ok = await _wait_for(lambda: all(len(n.chats) >= height for n in cluster), timeout)
+            latencies.append(time.perf_counter() - start if ok else None)
+        done = [x for x in latencies if x is not None]
+        result["propagation_s"] = latencies
+        result["propagation_mean_s"] = sum(done) / len(done) if done else None
+        result["propagation_max_s"] = max(done) if done else None
+        result["gossip"] = {node.my_ip: node.gossip.stats() for node in cluster[1:]}
+
+        sent_before = sum(n.metrics.total("dcc_peer_bytes_sent_total") for n in cluster)
+        before = loopback_bytes()
+        await asyncio.sleep(sync_window)
+        after = loopback_bytes()
+        sent = sum(n.metrics.total("dcc_peer_bytes_sent_total") for n in cluster) - sent_before
+        result["sync_window_s"] = sync_window
+        result["sync_bytes_sent"] = sent
+        result["sync_bytes_sent_per_s"] = sent / sync_window
+        messages = {}
+        for node in cluster:
+            for (name, labels), value in node.metrics.counters.items():
+                if name == "dcc_messages_sent_total":
+                    kind = dict(labels)["type"]
+                    messages[kind] = messages.get(kind, 0) + value
+        result["messages_sent"] = messages
+        if before is not None and after is not None:
+            result["sync_loopback_bytes"] = after - before
+            result["sync_loopback_bytes_per_s"] = (after - before) / sync_window
+    finally:
+        for node in cluster:
+            await node.stop()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=4)
+    parser.add_argument("--chats", type=int, default=3)
+    parser.add_argument("--sync-window", type=float, default=PEER_REQUEST_INTERVAL)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run_cluster(args.nodes, args.chats, args.sync_window)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
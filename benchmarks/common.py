@@ -0,0 +1,29 @@
+import hashlib
+import struct
+import time
+
+from dcc_chat.chain import ChatChain
+
+
+def synthetic_chain(count: int) -> ChatChain:
+    """
+    Cadeia com `count` chats cujos hashes conferem com suas janelas, sem a
+    prova de trabalho (que a verificação não reexecuta). Gerá-la é barato.
+    """
+    chain = ChatChain()
+    for i in range(count):
+        text = b"chat %d" % i
+        partial = struct.pack("!B", len(text)) + text + i.to_bytes(16, "big")
+        md5 = hashlib.md5(bytes(chain.tail()) + partial).digest()
+        chain.append_record(partial + md5)
+    return chain
+
+
+def best_of(func, repeat: int = 3) -> float:
+    """Menor tempo, em segundos, entre `repeat` execuções de `func`."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
@@ -0,0 +1,84 @@
+"""
+Mede a latência do laço de eventos enquanto vários pares enviam o mesmo
+ArchiveResponse ao mesmo tempo, lidos por `read_archive_response` e
+verificados pelo pipeline.
+Uso: python -m benchmarks.pipeline [--peers N] [--chats N]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from benchmarks.common import synthetic_chain
+from dcc_chat.connection import P2PNode
+from dcc_chat.pipeline import read_archive_response
+from dcc_chat.protocol import FrameReader, encode_archive_response
+
+# Período do relógio que mede o atraso do laço de eventos.
+TICK = 0.001
+
+
+async def _flood(body: bytes, peers: int) -> dict:
+    node = P2PNode("127.0.0.1")
+    lags = []
+    running = True
+
+    async def ticker():
+        while running:
+            start = time.perf_counter()
+            await asyncio.sleep(TICK)
+            lags.append(time.perf_counter() - start - TICK)
+
+    async def peer(i: int):
+        reader = asyncio.StreamReader()
+        reader.feed_data(body)
+        reader.feed_eof()
+        await read_archive_response(node, FrameReader(reader), f"10.0.0.{i}")
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(TICK)
+    start = time.perf_counter()
+    await asyncio.gather(*(peer(i) for i in range(peers)))
+    await node.pipeline.join()
+    elapsed = time.perf_counter() - start
+    running = False
+    await tick
+    node.pipeline.close()
+    node.verifier.close()
+    node.miner.close()
+
+    lags.sort()
+    return {
+        "seconds": elapsed,
+        "lag_p50_ms": lags[len(lags) // 2] * 1000,
+        "lag_max_ms": lags[-1] * 1000,
+        "verifications": sum(
+            h.count for (name, _), h in node.metrics.histograms.items() if name == "dcc_verification_seconds"
+        ),
+    }
+
+
+def run(peers: int = 8, chats: int = 20_000) -> dict:
+    body = encode_archive_response(synthetic_chain(chats))[1:]
+    logging.disable(logging.INFO)
+    try:
+        return {
+            "peers": peers,
+            "chats": chats,
+            "pipeline": asyncio.run(_flood(body, peers)),
+        }
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--peers", type=int, default=8)
+    parser.add_argument("--chats", type=int, default=20_000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.peers, args.chats), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Executa a suíte de benchmarks e grava os resultados em JSON, para comparar
+versões. Uso: python -m benchmarks.run [--output arquivo.json] [--quick]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import time
+
+from benchmarks.cluster import run_cluster
+from benchmarks.common import best_of, synthetic_chain
+from benchmarks.pipeline import run as run_pipeline
+from benchmarks.scheduler import simulate as simulate_scheduler
+from dcc_chat.config import PEER_REQUEST_INTERVAL
+from dcc_chat.connection import P2PNode
+from dcc_chat.mining import Miner, mine_batch
+from dcc_chat.pipeline import read_archive_response
+from dcc_chat.protocol import NEW_TIP_SIZE, FrameReader, decode_new_tip, decode_peer_list, encode_archive_response, encode_new_tip, encode_peer_list
+from dcc_chat.verification import first_invalid, verification_check
+
+
+def bench_encode_archive_response(chain):
+    as_dict = dict(enumerate(chain.values()))
+    return {
+        "chats": len(chain),
+        "chain_s": best_of(lambda: encode_archive_response(chain)),
+        "dict_s": best_of(lambda: encode_archive_response(as_dict)),
+    }
+
+
+def bench_decode_peer_list(peers: int = 1000):
+    body = encode_peer_list([f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(peers)])[1:]
+    return {"peers": peers, "seconds": best_of(lambda: decode_peer_list(body))}
+
+
+def bench_verification(chain):
+    as_dict = dict(enumerate(chain.values()))
+
+    def legacy():
+        for idx in range(1, len(as_dict)):
+            verification_check(as_dict[idx], as_dict, range(max(0, idx - 19), idx))
+
+    return {
+        "chats": len(chain),
+        "verification_check_s": best_of(legacy, repeat=1),
+        "first_invalid_s": best_of(lambda: first_invalid(chain)),
+    }
+
+
+def bench_archive_decode(chain):
+    body = encode_archive_response(chain)[1:]
+
+    async def decode():
+        reader = asyncio.StreamReader()
+        reader.feed_data(body)
+        reader.feed_eof()
+        node = P2PNode("127.0.0.1")
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                await read_archive_response(node, reader)
+                await node.pipeline.join()
+        finally:
+            node.pipeline.close()
+        assert len(node.chats) == len(chain)
+
+    return {"chats": len(chain), "bytes": len(body), "seconds": best_of(lambda: asyncio.run(decode()))}
+
+
+def bench_framing(messages: int = 20_000):
+    data = b"".join(encode_new_tip(i, bytes(16), i) for i in range(messages))
+
+    def reader():
+        stream = asyncio.StreamReader()
+        stream.feed_data(data)
+        stream.feed_eof()
+        return stream
+
+    async def per_field():
+        stream = reader()
+        for _ in range(messages):
+            await stream.readexactly(1)
+            decode_new_tip(await stream.readexactly(NEW_TIP_SIZE))
+
+    async def framed():
+        count = 0
+        async for _ in FrameReader(reader()):
+            count += 1
+        assert count == messages
+
+    return {
+        "messages": messages,
+        "readexactly_s": best_of(lambda: asyncio.run(per_field())),
+        "frame_reader_s": best_of(lambda: asyncio.run(framed())),
+    }
+
+
+def bench_mining(chats: int = 4, workers: int | None = None):
+    tries = 1 << 18
+    start = time.perf_counter()
+    mine_batch(b"x" * 600, b"\x05hello", os.urandom(8), tries)
+    single = tries / (time.perf_counter() - start)
+
+    async def mine():
+        miner = Miner(workers=workers)
+        try:
+            for i in range(chats):
+                await miner.mine(b"x" * 600, b"\x05hello" + bytes([i]))
+            return miner.stats()
+        finally:
+            miner.close()
+
+    stats = asyncio.run(mine())
+    return {"single_process_hashrate": single, "pool": stats}
+
+
+def bench_cluster(nodes: int, sync_window: float):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return asyncio.run(run_cluster(nodes=nodes, chats=3, sync_window=sync_window))
+
+
+def metadata():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--quick", action="store_true", help="cadeias menores e janela de sincronização curta")
+    parser.add_argument("--chats", type=int, default=None)
+    parser.add_argument("--nodes", type=int, default=4)
+    args = parser.parse_args()
+
+    size = args.chats or (5_000 if args.quick else 50_000)
+    chain = synthetic_chain(size)
+    results = {
+        "encode_archive_response": bench_encode_archive_response(chain),
+        "decode_peer_list": bench_decode_peer_list(),
+        "verification": bench_verification(chain),
+        "archive_decode": bench_archive_decode(chain),
+        "framing": bench_framing(),
+        "archive_flood": run_pipeline(peers=8, chats=min(size, 20_000)),
+        "sync_scheduler": simulate_scheduler(peers=50, duration=600.0 if args.quick else 3600.0),
+        "mining": bench_mining(chats=2 if args.quick else 8),
+        "cluster": bench_cluster(
+            args.nodes, sync_window=PEER_REQUEST_INTERVAL * (1 if args.quick else 2)
+        ),
+    }
+    report = {"meta": metadata(), "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Simula a agenda de sincronização com relógio virtual e compara o volume de
+requisições periódicas com o envio fixo a cada PEER_REQUEST_INTERVAL.
+Uso: python -m benchmarks.scheduler [--peers N] [--duration S] [--chat-every S]
+"""
+import argparse
+import json
+import random
+from collections import Counter
+
+from dcc_chat.config import PEER_REQUEST_INTERVAL
+from dcc_chat.scheduler import SyncScheduler
+
+
+def simulate(peers: int = 50, duration: float = 3600.0, chat_every: float = 300.0, seed: int = 1):
+    """
+    Um nó com `peers` pares durante `duration` segundos virtuais; um chat novo
+    surge na rede em média a cada `chat_every` segundos e muda a ponta de todos.
+    """
+    rng = random.Random(seed)
+    now = 0.0
+    scheduler = SyncScheduler(clock=lambda: now, rng=rng)
+    for i in range(peers):
+        scheduler.add(f"peer{i}")
+
+    tip = 0
+    next_chat = rng.expovariate(1 / chat_every)
+    per_second = Counter()
+    while now < duration:
+        step = max(scheduler.delay(), 1e-6)
+        if now + step >= next_chat:
+            now = next_chat
+            tip += 1
+            next_chat += rng.expovariate(1 / chat_every)
+            scheduler.kick()
+            continue
+        now += step
+        for ip in scheduler.pop_due():
+            per_second[int(now)] += scheduler.cost
+            scheduler.observe(ip, tip)
+
+    rounds = int(duration // PEER_REQUEST_INTERVAL)
+    fixed = peers * 2 * rounds
+    return {
+        "peers": peers,
+        "duration_s": duration,
+        "chats": tip,
+        "fixed_requests": fixed,
+        "fixed_peak_per_s": peers * 2,
+        "adaptive_requests": scheduler.sent,
+        "adaptive_peak_per_s": max(per_second.values(), default=0),
+        "reduction": fixed / scheduler.sent if scheduler.sent else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--peers", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=3600.0)
+    parser.add_argument("--chat-every", type=float, default=300.0)
+    args = parser.parse_args()
+    print(json.dumps(simulate(args.peers, args.duration, args.chat_every), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Simulador de cluster em um único processo: centenas de `P2PNode` num só laço
+de eventos, ligados pela rede em memória de dcc_chat/memnet.py, com latência,
+banda e perda configuráveis. Cenários:
+
+  storm      todos os nós entram ao mesmo tempo pelo mesmo bootstrap
+  mining     vários nós mineram ao mesmo tempo sobre a mesma ponta
+  partition  a rede se divide ao meio, cada lado minera e depois ela se reúne
+
+Cada cenário mede o tempo até a convergência e os bytes transmitidos.
+Uso: python -m benchmarks.simulator [--scenario S] [--nodes N] [--latency S] [--bandwidth B] [--loss P]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from dcc_chat.config import PEER_REQUEST_INTERVAL, TARGET_OUTBOUND
+from dcc_chat.connection import P2PNode
+from dcc_chat.memnet import MemoryNetwork
+from dcc_chat.mining import Miner
+
+
+class Simulation:
+    """Nós sem bootstrap próprio, exceto o primeiro, que é o bootstrap de todos."""
+
+    def __init__(self, nodes: int = 100, latency: float = 0.02, bandwidth: float | None = None, loss: float = 0.0, seed=1):
+        self.network = MemoryNetwork(latency, bandwidth, loss, seed=seed)
+        self.ips = [f"10.0.{i // 250}.{i % 250 + 1}" for i in range(nodes)]
+        # Um único minerador para todos: a simulação não tem núcleos para um pool por nó.
+        self.miner = Miner(workers=1)
+        self.nodes = [
+            P2PNode(ip, self.ips[0] if i else None, chain_path=None, show_chats=False, network=self.network.host(ip))
+            for i, ip in enumerate(self.ips)
+        ]
+        for node in self.nodes:
+            node.miner = self.miner
+        self.tasks = []
+
+    async def start(self):
+        self.tasks = [asyncio.create_task(node.start()) for node in self.nodes]
+        await asyncio.sleep(0)
+
+    async def stop(self):
+        for node in self.nodes:
+            await node.stop()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        # Conexões aceitas durante o desligamento ainda têm tarefas pendentes.
+        rest = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in rest:
+            task.cancel()
+        await asyncio.gather(*rest, return_exceptions=True)
+
+    async def wait_for(self, predicate, timeout: float, interval: float = 0.05) -> float | None:
+        """Segundos até `predicate()` valer, ou None se o prazo acabar antes."""
+        start = time.perf_counter()
+        while not predicate():
+            if time.perf_counter() - start > timeout:
+                return None
+            await asyncio.sleep(interval)
+        return time.perf_counter() - start
+
+    def connected(self, nodes=None) -> bool:
+        """Se o grafo de conexões entre `nodes` é conexo."""
+        nodes = self.nodes if nodes is None else nodes
+        by_ip = {node.my_ip: node for node in nodes}
+        seen = {nodes[0].my_ip}
+        frontier = [nodes[0]]
+        while frontier:
+            node = frontier.pop()
+            for ip in node.peers:
+                if ip in by_ip and ip not in seen:
+                    seen.add(ip)
+                    frontier.append(by_ip[ip])
+        return len(seen) == len(nodes)
+
+    def formed(self) -> bool:
+        """Se a rede se formou: grafo conexo e todo nó com o grau de saída alvo."""
+        target = min(TARGET_OUTBOUND, len(self.nodes) - 1)
+        return all(len(node.peers) >= target for node in self.nodes) and self.connected()
+
+    def converged(self, nodes=None, tip=None) -> bool:
+        """Se todos os `nodes` têm a mesma ponta (ou a ponta `tip`)."""
+        nodes = self.nodes if nodes is None else nodes
+        tip = nodes[0].chats.tip if tip is None else tip
+        return all(node.chats.tip == tip for node in nodes)
+
+    async def mine(self, node: P2PNode, text: str):
+        """Minera um chat em `node` e o anuncia, como faria o usuário do nó."""
+        await node.submit_chat(text)
+
+
+async def storm(sim: Simulation, timeout: float) -> dict:
+    await sim.start()
+    elapsed = await sim.wait_for(sim.formed, timeout)
+    degrees = [len(node.peers) for node in sim.nodes]
+    return {"convergence_s": elapsed, "mean_degree": sum(degrees) / len(degrees), "min_degree": min(degrees)}
+
+
+async def mining(sim: Simulation, timeout: float, miners: int = 4) -> dict:
+    await sim.start()
+    await sim.wait_for(sim.formed, timeout)
+    chosen = sim.nodes[:: max(1, len(sim.nodes) // miners)][:miners]
+    before = sim.network.bytes_sent
+    start = time.perf_counter()
+    await asyncio.gather(*(sim.mine(node, f"chat de {node.my_ip}") for node in chosen))
+    height = max(len(node.chats) for node in sim.nodes)
+    heights = await sim.wait_for(lambda: all(len(node.chats) == height for node in sim.nodes), timeout)
+    # Ramos de mesma altura só se resolvem com o próximo chat.
+    await sim.mine(chosen[0], "desempate")
+    tip = chosen[0].chats.tip
+    elapsed = await sim.wait_for(lambda: sim.converged(tip=tip), timeout)
+    return {
+        "miners": len(chosen),
+        "same_height_s": heights,
+        "convergence_s": elapsed and time.perf_counter() - start,
+        "bytes_during": sim.network.bytes_sent - before,
+    }
+
+
+async def partition(sim: Simulation, timeout: float, settle: float = 2 * PEER_REQUEST_INTERVAL) -> dict:
+    await sim.start()
+    await sim.wait_for(sim.formed, timeout)
+    # Tempo para as trocas de PeerList espalharem os endereços; um nó que só
+    # conhece pares do outro lado fica isolado durante toda a partição.
+    await asyncio.sleep(settle)
+    half = len(sim.nodes) // 2
+    left, right = sim.nodes[:half], sim.nodes[half:]
+    sim.network.partition([node.my_ip for node in left], [node.my_ip for node in right])
+    await sim.mine(left[0], "esquerda 1")
+    await sim.mine(left[0], "esquerda 2")
+    await sim.mine(right[0], "direita")
+    split = await sim.wait_for(lambda: sim.converged(left) and sim.converged(right), timeout)
+    isolated = sum(1 for node in sim.nodes if not node.peers)
+
+    before = sim.network.bytes_sent
+    sim.network.heal()
+    tip = left[0].chats.tip
+    elapsed = await sim.wait_for(lambda: sim.converged(tip=tip), timeout)
+    return {
+        "sides_converged_s": split,
+        "isolated_nodes": isolated,
+        "convergence_s": elapsed,
+        "bytes_during": sim.network.bytes_sent - before,
+    }
+
+
+SCENARIOS = {"storm": storm, "mining": mining, "partition": partition}
+
+
+async def simulate(scenario: str = "storm", nodes: int = 100, latency: float = 0.02, bandwidth: float | None = None, loss: float = 0.0, timeout: float = 60.0, seed=1) -> dict:
+    sim = Simulation(nodes, latency, bandwidth, loss, seed)
+    try:
+        result = await SCENARIOS[scenario](sim, timeout)
+    finally:
+        await sim.stop()
+    return {
+        "scenario": scenario,
+        "nodes": nodes,
+        "latency_s": latency,
+        "bandwidth_Bps": bandwidth,
+        "loss": loss,
+        **result,
+        "bytes_total": sim.network.bytes_sent,
+        "connections": sim.network.connections,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="storm")
+    parser.add_argument("--nodes", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--bandwidth", type=float, default=None)
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR, format="%(message)s")
+    print(json.dumps(asyncio.run(simulate(args.scenario, args.nodes, args.latency, args.bandwidth, args.loss, args.timeout)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Mede o tempo entre criar o processo de um nó (`main.py --headless`) e ele
+escutar na porta, para N processos criados ao mesmo tempo.
+Uso: python -m benchmarks.startup [--nodes N]
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+# Meta por processo: um nó sozinho precisa estar escutando em menos que isso.
+STARTUP_TARGET_S = 0.5
+
+
+def spawn(ip: str, port: int = 0, env=None) -> subprocess.Popen:
+    """Cria um nó sem bootstrap que loga ao começar a escutar."""
+    return subprocess.Popen(
+        [sys.executable, MAIN, ip, "--headless", "--port", str(port), "--log-level", "INFO"],
+        stderr=subprocess.PIPE,
+        text=True,
+        env=env,
+    )
+
+
+def wait_listening(process: subprocess.Popen) -> bool:
+    """Lê o log do nó até a linha de início; False se o processo terminou antes."""
+    for line in process.stderr:
+        if line.startswith("Nó escutando em"):
+            return True
+    return False
+
+
+def run(nodes: int = 8) -> dict:
+    start = time.perf_counter()
+    processes = [spawn(f"127.0.0.{10 + i}") for i in range(nodes)]
+    ready = []
+    for process in processes:
+        ok = wait_listening(process)
+        ready.append(time.perf_counter() - start if ok else None)
+    for process in processes:
+        process.send_signal(signal.SIGTERM)
+    codes = [process.wait(10) for process in processes]
+
+    started = sorted(t for t in ready if t is not None)
+    return {
+        "nodes": nodes,
+        "started": len(started),
+        "clean_exits": codes.count(0),
+        "first_s": started[0] if started else None,
+        "last_s": started[-1] if started else None,
+        "target_s": STARTUP_TARGET_S,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=8)
+    args = parser.parse_args()
+    print(json.dumps(run(args.nodes), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Compara a verificação serial (`first_invalid`) com a paralela
+(`ParallelVerifier`), e os kernels de verificação entre si.
+Uso: python -m benchmarks.verification [N ...] [--workers W]
+"""
+import argparse
+import os
+import sys
+
+from benchmarks.common import best_of, synthetic_chain
+from dcc_chat.verification import ParallelVerifier, first_invalid, make_kernel
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+KERNELS = ("hashlib", "openssl", "threads")
+
+
+def _kernels() -> dict:
+    """Os kernels de KERNELS disponíveis aqui; sem libcrypto, o "openssl" fica de fora."""
+    kernels = {}
+    for name in KERNELS:
+        try:
+            kernels[name] = make_kernel(name)
+        except (OSError, AttributeError):
+            print(f"kernel {name} indisponível; ignorado", file=sys.stderr)
+    return kernels
+
+
+def run(sizes, workers):
+    verifier = ParallelVerifier(workers=workers)
+    kernels = _kernels()
+    results = []
+    try:
+        for n in sizes:
+            chain = synthetic_chain(n)
+            verifier.first_invalid(chain)  # aquece o pool de processos
+            repeat = 1 if n >= 1_000_000 else 3
+            times = {
+                f"{name}_s": best_of(lambda: first_invalid(chain, kernel=kernel), repeat=repeat)
+                for name, kernel in kernels.items()
+            }
+            serial = times["hashlib_s"]
+            parallel = best_of(lambda: verifier.first_invalid(chain), repeat=repeat)
+            results.append({
+                "chats": n,
+                "serial_s": serial,
+                "parallel_s": parallel,
+                "speedup": serial / parallel if parallel else None,
+                "workers": verifier.workers,
+                **times,
+            })
+    finally:
+        verifier.close()
+        kernels["threads"].close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("sizes", nargs="*", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    print(f"{'chats':>10} {'serial (s)':>12} {'paralelo (s)':>13} {'speedup':>8} {'openssl (s)':>12} {'threads (s)':>12}")
+    for row in run(args.sizes, args.workers):
+        openssl = f"{row['openssl_s']:>12.3f}" if "openssl_s" in row else f"{'-':>12}"
+        print(
+            f"{row['chats']:>10} {row['serial_s']:>12.3f} {row['parallel_s']:>13.3f} {row['speedup']:>8.2f}"
+            f" {openssl} {row['threads_s']:>12.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+from dcc_chat.cli import main
+
+main()
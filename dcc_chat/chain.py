@@ -0,0 +1,205 @@
+from array import array
+
+# Tamanho mínimo de um chat no fio: tamanho (1) + código (16) + md5 (16).
+CHAT_MIN_SIZE = 33
+# Quantidade de chats anteriores que entram no hash de um chat.
+WINDOW = 19
+
+
+def decode_chat(record) -> dict:
+    """Converte um chat no formato do fio para um dicionário de campos."""
+    length = record[0]
+    return {
+        "length": bytes(record[:1]),
+        "text": bytes(record[1 : 1 + length]),
+        "verification_code": bytes(record[1 + length : 17 + length]),
+        "md5": bytes(record[17 + length : 33 + length]),
+    }
+
+
+class ChatChain:
+    """
+    Cadeia de chats guardada em um único bytearray, já no formato do fio,
+    com um índice de offsets. `_offsets[i]` é o início do chat i e o último
+    offset é o fim do buffer. `version` muda a cada alteração da cadeia.
+
+    Uma cadeia podada (`prune`) guarda só os chats a partir da altura `base`,
+    que começam no byte `base_offset` do fio; os índices continuam sendo
+    alturas absolutas, e pedir um chat podado levanta IndexError. Os chats
+    podados podem ser lidos de `snapshot` (ver ChainStore.prefix), se houver.
+
+    As `memoryview`s devolvidas apontam para o próprio buffer e devem ser
+    descartadas antes do próximo `append`, que pode realocá-lo.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._offsets = array("Q", [0])
+        self.version = 0
+        self.base = 0
+        self.base_offset = 0
+        self.snapshot = None
+
+    @classmethod
+    def from_chats(cls, chats) -> "ChatChain":
+        """Cria uma cadeia a partir de um iterável de dicionários de chat."""
+        chain = cls()
+        for chat in chats:
+            chain.append(chat["length"], chat["text"], chat["verification_code"], chat["md5"])
+        return chain
+
+    @classmethod
+    def from_buffer(cls, data) -> "ChatChain":
+        """
+        Cria uma cadeia com os chats completos contidos em `data` (por exemplo,
+        um arquivo mapeado em memória). Um chat final incompleto é ignorado.
+        """
+        chain = cls()
+        offsets = chain._offsets
+        offset, end = 0, len(data)
+        while offset < end:
+            size = CHAT_MIN_SIZE + data[offset]
+            if offset + size > end:
+                break
+            offset += size
+            offsets.append(offset)
+        with memoryview(data) as view:
+            chain._buf = bytearray(view[:offset])
+        chain.version = len(chain)
+        return chain
+
+    def __len__(self) -> int:
+        return self.base + len(self._offsets) - 1
+
+    def _index(self, idx: int) -> int:
+        """Posição em `_offsets` do chat de altura `idx`."""
+        n = len(self)
+        if idx < 0:
+            idx += n
+        if not self.base <= idx < n:
+            raise IndexError("índice de chat fora da cadeia" if idx >= self.base else "chat podado da memória")
+        return idx - self.base
+
+    def _resident(self, height: int) -> int:
+        """Como `_index`, mas aceita também `height == len`."""
+        if not self.base <= height <= len(self):
+            raise IndexError("altura fora da cadeia" if height >= self.base else "chat podado da memória")
+        return height - self.base
+
+    def append(self, length: bytes, text: bytes, verification_code: bytes, md5: bytes):
+        self.append_record(b"".join((length, text, verification_code, md5)))
+
+    def append_record(self, record):
+        """Acrescenta um chat já no formato do fio, em O(1) amortizado."""
+        if len(record) != CHAT_MIN_SIZE + record[0]:
+            raise ValueError("chat com tamanho inconsistente")
+        self._buf += record
+        self._offsets.append(len(self._buf))
+        self.version += 1
+
+    def extend(self, data):
+        """Acrescenta todos os chats contidos em `data`, no formato do fio."""
+        view = memoryview(data)
+        offset = 0
+        while offset < len(view):
+            size = CHAT_MIN_SIZE + view[offset]
+            self.append_record(view[offset : offset + size])
+            offset += size
+
+    def truncate(self, height: int):
+        """Descarta os chats a partir de `height`."""
+        if height < len(self):
+            height = self._resident(height)
+            del self._buf[self._offsets[height]:]
+            del self._offsets[height + 1:]
+            self.version += 1
+
+    def prune(self, height: int):
+        """
+        Tira da memória os chats antes de `height`. A cadeia continua a mesma
+        (`version` não muda); só deixa de ser possível ler esses chats dela.
+        """
+        if height <= self.base:
+            return
+        idx = self._resident(height)
+        cut = self._offsets[idx]
+        # Um bytearray novo: apagar o início do antigo não devolve a memória.
+        self._buf = bytearray(memoryview(self._buf)[cut:])
+        self._offsets = array("Q", (offset - cut for offset in self._offsets[idx:]))
+        self.base = height
+        self.base_offset += cut
+
+    def offset(self, height: int) -> int:
+        """Posição no fio onde começa o chat `height` (ou o fim, se height == len)."""
+        return self.base_offset + self._offsets[self._resident(height)]
+
+    def record(self, idx: int) -> memoryview:
+        idx = self._index(idx)
+        return memoryview(self._buf)[self._offsets[idx] : self._offsets[idx + 1]]
+
+    def md5(self, idx: int) -> bytes:
+        end = self._offsets[self._index(idx) + 1]
+        return bytes(self._buf[end - 16 : end])
+
+    @property
+    def tip(self):
+        """MD5 do último chat, ou None se a cadeia estiver vazia."""
+        return self.md5(-1) if len(self) else None
+
+    def window(self, idx: int) -> memoryview:
+        """Bytes hasheados para o chat `idx`: os 19 anteriores e o próprio chat sem o md5."""
+        idx = self._index(idx)
+        if idx < WINDOW and self.base:
+            raise IndexError("janela do chat alcança chats podados")
+        start = self._offsets[max(0, idx - WINDOW)]
+        return memoryview(self._buf)[start : self._offsets[idx + 1] - 16]
+
+    def tail(self, count: int = WINDOW) -> memoryview:
+        """Os últimos `count` chats completos, prefixo da mineração do próximo chat."""
+        return self.view(max(self.base, len(self) - count))
+
+    def view(self, start: int | None = None, stop: int | None = None) -> memoryview:
+        """Chats [start, stop) no formato do fio, sem cópia (por padrão, todos os em memória)."""
+        start = self.base if start is None else start
+        stop = len(self) if stop is None else stop
+        return memoryview(self._buf)[self._offsets[self._resident(start)] : self._offsets[self._resident(stop)]]
+
+    @property
+    def offsets(self) -> array:
+        """
+        Índice de offsets dos chats em memória (a partir de `base`, relativos ao
+        início de `view(base)`), com len - base + 1 entradas; não deve ser alterado.
+        """
+        return self._offsets
+
+    @property
+    def complete(self) -> bool:
+        """Se a cadeia inteira pode ser lida: sem poda, ou com `snapshot` dos chats podados."""
+        return self.base == 0 or self.snapshot is not None
+
+    @property
+    def nbytes(self) -> int:
+        """Tamanho da cadeia inteira no fio, incluindo os chats podados."""
+        return self.base_offset + len(self._buf)
+
+    def __getitem__(self, idx: int) -> dict:
+        return decode_chat(self.record(idx))
+
+    def values(self, start: int = 0):
+        for idx in range(max(start, self.base), len(self)):
+            yield self[idx]
+
+    def copy(self) -> "ChatChain":
+        chain = ChatChain()
+        chain._buf = bytearray(self._buf)
+        chain._offsets = array("Q", self._offsets)
+        chain.base = self.base
+        chain.base_offset = self.base_offset
+        chain.snapshot = self.snapshot
+        return chain
+
+    def __eq__(self, other):
+        if not isinstance(other, ChatChain):
+            return NotImplemented
+        return self.base == other.base and self._buf == other._buf
+
@@ -0,0 +1,158 @@
+"""
+Ponto de entrada do nó: python main.py [MEU_IP] [BOOTSTRAP] [opções].
+
+Cada opção também pode vir de uma variável de ambiente DCC_* (ver `--help`);
+a linha de comando prevalece sobre o ambiente, e o ambiente sobre o config.py.
+"""
+import argparse
+import asyncio
+import ipaddress
+import logging
+import os
+import signal
+import socket
+import sys
+
+from dcc_chat import config
+from dcc_chat.connection import P2PNode
+
+log = logging.getLogger(__name__)
+
+# Destino usado só para descobrir a interface de saída; nenhum pacote é enviado.
+PROBE_ADDRESS = ("8.8.8.8", 80)
+
+
+def detect_local_ip(probe=PROBE_ADDRESS) -> str:
+    """
+    IP da interface pela qual o nó sai para a rede. O connect de um socket UDP
+    apenas escolhe a rota; sem rota nenhuma, o nó fica em 127.0.0.1.
+    """
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(probe)
+            return s.getsockname()[0]
+    except OSError:
+        return "127.0.0.1"
+
+
+def _port(value: str) -> int:
+    port = int(value)
+    if not 0 <= port <= 65535:
+        raise ValueError(value)
+    return port
+
+
+def _flag(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "on", "sim")
+
+
+def parse_args(argv=None, environ=None) -> argparse.Namespace:
+    environ = os.environ if environ is None else environ
+
+    def env(name, default, cast=str):
+        value = environ.get("DCC_" + name)
+        if value is None or value == "":
+            return default
+        try:
+            return cast(value)
+        except ValueError:
+            parser.error(f"valor inválido em DCC_{name}: {value!r}")
+
+    parser = argparse.ArgumentParser(prog="main.py", description="Nó da rede de chats DCC.")
+    parser.add_argument(
+        "ip", nargs="?", default=env("IP", None),
+        help="IP em que o nó escuta e se identifica (DCC_IP; padrão: detectado)",
+    )
+    parser.add_argument(
+        "bootstrap", nargs="?", default=env("BOOTSTRAP", None),
+        help="IP ou nome do nó de bootstrap (DCC_BOOTSTRAP; padrão: nenhum)",
+    )
+    parser.add_argument(
+        "--port", type=_port, default=env("PORT", config.PORT, _port),
+        help="porta TCP em que o nó escuta (DCC_PORT)",
+    )
+    parser.add_argument(
+        "--peer-port", type=_port, default=env("PEER_PORT", None, _port),
+        help="porta TCP discada nos pares (DCC_PEER_PORT; padrão: a de --port, ou PORT com --port 0)",
+    )
+    parser.add_argument(
+        "--chain-file", default=env("CHAIN_FILE", config.CHAIN_FILE),
+        help="arquivo onde a cadeia é persistida (DCC_CHAIN_FILE)",
+    )
+    parser.add_argument(
+        "--metrics-port", type=_port, default=env("METRICS_PORT", config.METRICS_PORT, _port),
+        help="porta local do endpoint de métricas (DCC_METRICS_PORT)",
+    )
+    parser.add_argument(
+        "--query-port", type=_port, default=env("QUERY_PORT", config.QUERY_PORT, _port),
+        help="porta local do socket de consultas ao histórico (DCC_QUERY_PORT)",
+    )
+    parser.add_argument(
+        "--prune-tail", type=int, default=env("PRUNE_TAIL", config.PRUNE_TAIL, int),
+        help="chats mantidos em memória; os mais antigos ficam só no disco (DCC_PRUNE_TAIL)",
+    )
+    parser.add_argument(
+        "--log-level", default=env("LOG_LEVEL", config.LOG_LEVEL),
+        type=str.upper, choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        help="nível de log (DCC_LOG_LEVEL)",
+    )
+    parser.add_argument(
+        "--headless", action="store_true", default=env("HEADLESS", False, _flag),
+        help="modo serviço: não imprime o histórico de chats (DCC_HEADLESS)",
+    )
+    return parser.parse_args(argv)
+
+
+async def resolve(host: str, port: int) -> str:
+    """Converte um nome de host em IPv4; um IP é devolvido como veio."""
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        pass
+    loop = asyncio.get_running_loop()
+    infos = await loop.getaddrinfo(host, port, family=socket.AF_INET, type=socket.SOCK_STREAM)
+    return infos[0][4][0]
+
+
+async def run(args: argparse.Namespace) -> int:
+    """Executa o nó até SIGINT ou SIGTERM. Retorna o código de saída do processo."""
+    bootstrap_ip = None
+    if args.bootstrap:
+        try:
+            bootstrap_ip = await resolve(args.bootstrap, args.peer_port or args.port)
+        except OSError as e:
+            log.error("Não foi possível resolver o bootstrap %s: %s", args.bootstrap, e)
+            return 1
+
+    node = P2PNode(
+        args.ip or detect_local_ip(),
+        bootstrap_ip,
+        chain_path=args.chain_file,
+        metrics_port=args.metrics_port,
+        query_port=args.query_port,
+        prune_tail=args.prune_tail,
+        port=args.port,
+        peer_port=args.peer_port,
+        show_chats=not args.headless,
+    )
+    serving = asyncio.create_task(node.start())
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, serving.cancel)
+        except (NotImplementedError, RuntimeError):
+            pass
+    try:
+        await serving
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await node.stop()
+    return 0 if node.ready.is_set() else 1
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="%(message)s")
+    sys.exit(asyncio.run(run(args)))
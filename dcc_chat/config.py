@@ -1,2 +1,85 @@
 PORT = 51511
-PEER_REQUEST_INTERVAL = 5
\ No newline at end of file
+# Intervalo mínimo (s) entre sincronizações periódicas com um par, usado após
+# uma conexão, um chat novo ou uma ponta nova do par.
+PEER_REQUEST_INTERVAL = 5
+# Enquanto a ponta do par não muda, o intervalo é multiplicado por SYNC_BACKOFF
+# até SYNC_MAX_INTERVAL, com ruído de ±SYNC_JITTER.
+SYNC_MAX_INTERVAL = 60
+SYNC_BACKOFF = 2
+SYNC_JITTER = 0.2
+# Orçamento global de requisições periódicas por segundo, somando todos os pares.
+SYNC_REQUESTS_PER_SECOND = 50
+# Processos usados na mineração (None = todos os núcleos).
+MINING_WORKERS = None
+# Um lote de chats minerados em sequência é anunciado ao atingir esta quantidade
+# de chats ou de segundos desde o primeiro, mesmo com a fila ainda cheia.
+MAX_BATCH_CHATS = 64
+MAX_BATCH_SECONDS = 1.0
+# Arquivo onde a cadeia é persistida (None = apenas em memória).
+CHAIN_FILE = None
+# Com W processos de verificação, trechos com pelo menos esta quantidade de
+# chats vezes W/(W-1) são verificados em paralelo; com um só processo, nunca.
+PARALLEL_VERIFY_THRESHOLD = 50_000
+# Chats de um ArchiveResponse ou ArchiveSuffix lidos entre duas verificações: um
+# arquivo inválido é recusado no primeiro bloco com um chat inválido.
+ARCHIVE_VERIFY_BLOCK = 65_536
+# Arquivos recebidos aguardando em cada fila do pipeline de verificação; com a
+# fila cheia, a leitura do par que enviou para até haver espaço.
+PIPELINE_QUEUE_SIZE = 4
+# Kernel que calcula os MD5 na verificação: "hashlib", "openssl" (libcrypto via
+# ctypes) ou "threads" (lotes em um pool de threads). Ver verification.py.
+VERIFY_KERNEL = "hashlib"
+# Processos usados na verificação paralela (None = todos os núcleos).
+VERIFY_WORKERS = None
+# Pares que recebem cada anúncio de nova ponta (None = todos).
+GOSSIP_FANOUT = 8
+# Limites de conexões por direção e grau de saída mantido pelo nó.
+MAX_INBOUND = 32
+MAX_OUTBOUND = 16
+TARGET_OUTBOUND = 8
+# Discagens simultâneas e espera (s) após falhas seguidas: base, 2*base, ... até o máximo.
+MAX_CONCURRENT_DIALS = 4
+DIAL_BACKOFF_BASE = 1
+DIAL_BACKOFF_MAX = 300
+# Intervalo (s) máximo entre revisões do grau de saída.
+DIAL_INTERVAL = 10
+# Endereços lembrados na tabela de pares.
+MAX_KNOWN_PEERS = 1000
+# Pares de difusão de menor RTT que também recebem pedidos periódicos de histórico.
+ARCHIVE_SYNC_PEERS = 3
+# Maior mensagem aceita de um par, em bytes; acima disso a conexão é fechada.
+MAX_MESSAGE_SIZE = 1 << 20
+# Limite próprio de ArchiveResponse e ArchiveSuffix, que trazem o histórico.
+MAX_ARCHIVE_SIZE = 1 << 28
+# Mensagens aceitas de cada par, por tipo: (por segundo, rajada). Tipos fora
+# da tabela não têm limite.
+RATE_LIMITS = {
+    "peer_request": (1, 10),
+    "peer_list": (1, 10),
+    "archive_request": (0.2, 5),
+    "archive_since_request": (2, 20),
+    "archive_response": (0.5, 10),
+    "archive_suffix": (2, 20),
+    "new_tip": (10, 100),
+}
+# Mensagens acima do limite toleradas de um par, recuperadas a uma a cada
+# MISBEHAVIOR_DECAY s. Na seguinte a conexão é fechada, e o par fica
+# PEER_BAN_SECONDS sem ser aceito nem discado.
+MISBEHAVIOR_TOLERANCE = 20
+MISBEHAVIOR_DECAY = 10
+PEER_BAN_SECONDS = 60
+# Uma conexão calada há mais que isso (s) pode ser trocada por outra que se
+# identifica com o IP do par sem vir desse endereço. Um par vivo responde ao
+# PeerRequest enviado pelo menos a cada SYNC_MAX_INTERVAL.
+PEER_STALE_SECONDS = 120
+# Porta local do endpoint de métricas Prometheus (None = desativado).
+METRICS_PORT = None
+METRICS_HOST = "127.0.0.1"
+# Porta local do socket de consultas ao histórico (None = desativado).
+QUERY_PORT = None
+QUERY_HOST = "127.0.0.1"
+# Chats mantidos em memória (None = a cadeia inteira). Com um valor, os chats
+# mais antigos são podados da memória e servidos a partir do CHAIN_FILE.
+PRUNE_TAIL = None
+# Nível de log usado pelo main.py; em WARNING o nó só reporta problemas.
+LOG_LEVEL = "INFO"
@@ -1,36 +1,113 @@
 import asyncio
-import struct
-import socket
-s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-s.connect(("8.8.8.8", 80))
-local_ip = s.getsockname()[0]
+import logging
+import time
 
-from dcc_chat.messages import print_chats, put_chat_in_queue, periodic_requests, recive_archive_response, send_archive_request, send_archive_response, send_message, send_peer_request, send_to_chats_to_all_peers, verification_check
+from dcc_chat.messages import periodic_requests, announce_tip, handle_new_tip, send_archive_request, send_archive_response, send_message, send_peer_request, suffix_fits
 from dcc_chat.protocol import (
-    encode_archive_response,
+    ArchiveCache,
+    FrameReader,
+    ProtocolError,
+    encode_archive_suffix,
     encode_identify,
-    decode_identify,
-    encode_peer_request,
     encode_peer_list,
-    decode_peer_list,
+    encode_hello,
+    encode_version,
     IDENTIFY,
     PEER_REQUEST,
     PEER_LIST,
     ARCHIVE_REQUEST,
-    ARCHIVE_RESPONSE
+    ARCHIVE_RESPONSE,
+    HELLO,
+    ARCHIVE_SINCE_REQUEST,
+    ARCHIVE_SUFFIX,
+    NEW_TIP,
+    VERSION,
+    PROTOCOL_VERSION,
+    CAP_HANDSHAKE,
+    CAP_DELTA_SYNC,
+    CAP_GOSSIP,
+    STREAMED,
 )
-from dcc_chat.config import PORT, PEER_REQUEST_INTERVAL
+from dcc_chat.config import CHAIN_FILE, DIAL_INTERVAL, METRICS_HOST, METRICS_PORT, MINING_WORKERS, PEER_BAN_SECONDS, PORT, PRUNE_TAIL, QUERY_HOST, QUERY_PORT, VERIFY_WORKERS
+from dcc_chat.chain import WINDOW, ChatChain
+from dcc_chat.forkchoice import ForkChoice
+from dcc_chat.gossip import Gossip
+from dcc_chat.history import HistoryIndex, serve_history
+from dcc_chat.metrics import CountingReader, Metrics, message_name, serve_metrics
+from dcc_chat.mining import Miner
+from dcc_chat.outbound import PeerSender
+from dcc_chat.peers import PeerTable
+from dcc_chat.pipeline import SyncPipeline, discard_archive, read_archive_response, read_archive_suffix
+from dcc_chat.ratelimit import RateLimiter, RateLimitExceeded
+from dcc_chat.scheduler import SyncScheduler
+from dcc_chat.storage import ChainStore
+from dcc_chat.submission import ChatSubmitter
+from dcc_chat.verification import InvalidChainError, ParallelVerifier, VerifiedPrefix
+
+log = logging.getLogger(__name__)
 
 class P2PNode:
-    def __init__(self, my_ip, bootstrap_ip=None):
+    def __init__(self, my_ip, bootstrap_ip=None, capabilities=CAP_DELTA_SYNC | CAP_GOSSIP | CAP_HANDSHAKE, chain_path=CHAIN_FILE, metrics_port=METRICS_PORT, port=PORT, show_chats=True, network=asyncio, query_port=QUERY_PORT, prune_tail=PRUNE_TAIL, peer_port=None):
         self.my_ip = my_ip
         self.bootstrap_ip = bootstrap_ip
-        self.peers = {}
-        self.lock = asyncio.Lock()
+        # Porta em que o nó escuta; com 0, a escolhida pelo sistema em `start`.
+        self.listen_port = port
+        # Porta discada nos pares: a rede usa uma porta só, e a efêmera de
+        # `port=0` não é a de ninguém.
+        self.peer_port = peer_port if peer_port is not None else port or PORT
+        # Quem abre conexões e servidores: o asyncio ou uma rede simulada (ver memnet.py).
+        self.network = network
+        self.show_chats = show_chats
+        self.ready = asyncio.Event()
+        self.capabilities = capabilities
+        self.peer_table = PeerTable(my_ip)
+        self.peer_capabilities = {}
+        self.peer_versions = {}
+        # Altura e ponta do último histórico completo enviado a cada par.
+        self.archive_served = {}
+        self.rate_limiter = RateLimiter()
         self.server = None
         self.background_tasks = set()
-        self.chats = {}
-        self.a = 0
+        self.chats = ChatChain()
+        self.verified = VerifiedPrefix()
+        self.fork_choice = ForkChoice()
+        self.gossip = Gossip()
+        self.archive_cache = ArchiveCache()
+        self.store = ChainStore(chain_path) if chain_path else None
+        self.miner = Miner(workers=MINING_WORKERS)
+        self.verifier = ParallelVerifier(workers=VERIFY_WORKERS)
+        self.scheduler = SyncScheduler()
+        self.pipeline = SyncPipeline(self)
+        self.submitter = ChatSubmitter(self)
+        self.metrics = Metrics()
+        self.metrics.collectors.append(self._collect_metrics)
+        self.metrics_port = metrics_port
+        self.metrics_server = None
+        self.history = HistoryIndex()
+        self.query_port = query_port
+        self.query_server = None
+        # Menos que uma janela em memória não bastaria para verificar novos chats.
+        self.prune_tail = prune_tail and max(prune_tail, WINDOW + 1)
+        self.handlers = {
+            PEER_REQUEST: self.on_peer_request,
+            PEER_LIST: self.on_peer_list,
+            ARCHIVE_REQUEST: self.on_archive_request,
+            ARCHIVE_RESPONSE: self.on_archive_response,
+            HELLO: self.on_hello,
+            ARCHIVE_SINCE_REQUEST: self.on_archive_since_request,
+            ARCHIVE_SUFFIX: self.on_archive_suffix,
+            NEW_TIP: self.on_new_tip,
+            VERSION: self.on_version,
+        }
+
+    @property
+    def peers(self) -> dict:
+        """Retrato atual dos pares conectados (ip -> writer); pode ser lido sem lock."""
+        return self.peer_table.connected
+
+    @peers.setter
+    def peers(self, peers: dict):
+        self.peer_table.connected = dict(peers)
 
     def _create_task(self, coro):
         """Cria, rastreia e agenda a remoção de uma tarefa."""
@@ -39,31 +116,139 @@ class P2PNode:
         task.add_done_callback(self.background_tasks.discard)
         return task
 
+    def _collect_metrics(self):
+        """Amostras lidas do estado do nó no momento da exportação."""
+        yield "dcc_chain_height", "gauge", {}, len(self.chats)
+        yield "dcc_chain_pruned_height", "gauge", {}, self.chats.base
+        yield "dcc_chain_resident_bytes", "gauge", {}, self.chats.nbytes - self.chats.base_offset
+        yield "dcc_peers", "gauge", {}, len(self.peers)
+        yield "dcc_mining_hashes_total", "counter", {}, self.miner.total_hashes
+        yield "dcc_mining_hashrate", "gauge", {}, self.miner.last_hashrate
+        yield "dcc_chat_queue_depth", "gauge", {}, len(self.submitter.queue)
+        yield "dcc_chat_batches_total", "counter", {}, self.submitter.batches
+        yield "dcc_mining_aborted_total", "counter", {}, self.submitter.aborted
+        yield "dcc_archive_cache_hits_total", "counter", {}, self.archive_cache.hits
+        yield "dcc_archive_cache_misses_total", "counter", {}, self.archive_cache.misses
+        yield "dcc_known_peers", "gauge", {}, len(self.peer_table.known)
+        yield "dcc_pipeline_queue_depth", "gauge", {"stage": "decoded"}, self.pipeline.decoded.qsize()
+        yield "dcc_pipeline_queue_depth", "gauge", {"stage": "verified"}, self.pipeline.verified.qsize()
+        for direction in ("in", "out"):
+            yield "dcc_connected_peers", "gauge", {"direction": direction}, self.peer_table.count(direction)
+        for ip, writer in self.peers.items():
+            info = self.peer_table.info(ip)
+            if info is not None and info.rtt is not None:
+                yield "dcc_peer_rtt_seconds", "gauge", {"peer": ip}, info.rtt
+            if isinstance(writer, PeerSender):
+                yield "dcc_peer_queue_depth", "gauge", {"peer": ip}, writer.depth
+                yield "dcc_peer_queue_dropped_total", "counter", {"peer": ip}, writer.dropped
+                yield "dcc_peer_queue_replaced_total", "counter", {"peer": ip}, writer.replaced
+
+    def _register_peer(self, ip: str, writer, direction: str, rtt: float | None = None):
+        """Registra um par recém-conectado."""
+        reconnect = self.peer_table.info(ip) is not None and self.peer_table.info(ip).last_seen is not None
+        self.peer_table.attach(ip, writer, direction, rtt)
+        self.scheduler.add(ip)
+        self.metrics.inc("dcc_connections_total", direction=direction)
+        if reconnect:
+            self.metrics.inc("dcc_reconnects_total")
+
+    def load_chain(self):
+        """Carrega a cadeia persistida em disco, se houver uma."""
+        if self.store is not None:
+            self.chats = self.store.load()
+            self.verified.update(self.chats)
+            self._prune()
+            self.history.sync(self.chats)
+            log.info("%d chats carregados de %s", len(self.chats), self.store.path)
+
+    def on_chain_changed(self, start: int, source=None):
+        """
+        Registra que a cadeia mudou a partir da altura `start` e anuncia a nova
+        ponta aos pares, exceto a `source` de quem ela veio. A gravação em disco
+        vem primeiro: se ela falhar, nada mais do nó foi alterado.
+        """
+        if self.store is not None:
+            self.store.sync(self.chats, start)
+        self.verified.update(self.chats)
+        self.scheduler.kick()
+        if source is not None:
+            self.submitter.competing_tip()
+        self._prune()
+        self.history.sync(self.chats, start)
+        if self.chats:
+            self.gossip.record_adoption(self.chats.tip)
+            self._create_task(announce_tip(self, exclude=source))
+
+    def _prune(self):
+        """
+        Com `prune_tail`, tira da memória os chats mais antigos que os últimos
+        `prune_tail`. A poda só acontece depois de a parte em memória dobrar,
+        para que cada chat seja copiado poucas vezes.
+        """
+        chats = self.chats
+        if self.prune_tail and len(chats) - chats.base >= 2 * self.prune_tail:
+            chats.snapshot = self.store
+            chats.prune(len(chats) - self.prune_tail)
+            log.debug("Cadeia podada até a altura %d", chats.base)
+
+    def submit_chat(self, text: str) -> asyncio.Future:
+        """Enfileira um chat para mineração; o futuro devolve sua altura ao ser publicado."""
+        return self.submitter.submit(text)
+
+    def history_page(self, before: int | None = None, limit: int = 50):
+        """Os `limit` chats antes da altura `before` (None = ponta) e o cursor da página anterior."""
+        return self.history.page(before, limit)
+
+    def find_chat(self, md5: bytes):
+        """(altura, chat) do chat com este md5, ou None."""
+        return self.history.find(md5)
+
+    def search_history(self, query: str, before: int | None = None, limit: int = 50):
+        """Chats com todas as palavras de `query`, do mais novo ao mais antigo, e o cursor seguinte."""
+        return self.history.search(query, before, limit)
+
     async def start(self):
         """Inicia o servidor e as tarefas de background."""
+        self.load_chain()
         try:
-            self.server = await asyncio.start_server(
-                self.handle_connection, self.my_ip, PORT
+            self.server = await self.network.start_server(
+                self.handle_connection, self.my_ip, self.listen_port
             )
-            print(f"Nó escutando em {self.my_ip}:{PORT}")
+            self.listen_port = self.server.sockets[0].getsockname()[1]
+            log.info("Nó escutando em %s:%d", self.my_ip, self.listen_port)
+            if self.metrics_port is not None:
+                self.metrics_server = await serve_metrics(self.metrics, METRICS_HOST, self.metrics_port)
+                log.info("Métricas em http://%s:%d/metrics", METRICS_HOST, self.metrics_port)
+            if self.query_port is not None:
+                self.query_server = await serve_history(self, QUERY_HOST, self.query_port)
+                log.info("Consultas ao histórico em %s:%d", QUERY_HOST, self.query_port)
         except OSError as e:
-            print(f"Erro ao iniciar o servidor: {e}")
+            log.error("Erro ao iniciar o servidor: %s", e)
             return
+        self.ready.set()
 
         self._create_task(periodic_requests(self))
 
         if self.bootstrap_ip:
+            self.peer_table.add_known(self.bootstrap_ip)
             self._create_task(self.connect_to_peer(self.bootstrap_ip))
+        self._create_task(self.maintain_peers())
 
         async with self.server:
             await self.server.serve_forever()
 
     async def stop(self):
-        print(f"Desligando o nó {self.my_ip}...")
+        log.info("Desligando o nó %s...", self.my_ip)
 
         if self.server:
             self.server.close()
             await self.server.wait_closed()
+        if self.metrics_server:
+            self.metrics_server.close()
+            await self.metrics_server.wait_closed()
+        if self.query_server:
+            self.query_server.close()
+            await self.query_server.wait_closed()
 
         for task in list(self.background_tasks):
             task.cancel()
@@ -71,121 +256,266 @@ class P2PNode:
         if self.background_tasks:
             await asyncio.gather(*self.background_tasks, return_exceptions=True)
 
-        async with self.lock:
-            for writer in self.peers.values():
-                writer.close()
-                try:
-                    await writer.wait_closed()
-                except (BrokenPipeError, ConnectionResetError):
-                    pass 
-            self.peers.clear()
+        for writer in self.peers.values():
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (BrokenPipeError, ConnectionResetError):
+                pass 
+        self.peer_table.clear()
 
-        print(f"Nó {self.my_ip} desligado.")
+        self.submitter.close()
+        self.miner.close()
+        self.pipeline.close()
+        self.verifier.close()
+        if self.store is not None:
+            self.store.close()
+        log.info("Nó %s desligado.", self.my_ip)
+
+    async def maintain_peers(self):
+        """
+        Mantém o grau de saída alvo, discando os pares conhecidos de melhor
+        pontuação. A cada DIAL_INTERVAL sem nada a discar, tenta também um par ao acaso.
+        """
+        table = self.peer_table
+        next_feeler = time.monotonic() + DIAL_INTERVAL
+        while True:
+            candidates = table.dial_candidates()
+            if not candidates and time.monotonic() >= next_feeler:
+                next_feeler = time.monotonic() + DIAL_INTERVAL
+                feeler = table.feeler()
+                candidates = [feeler] if feeler else []
+            for ip in candidates:
+                table.dialing.add(ip)
+                self._create_task(self._dial(ip))
+            await table.wait(DIAL_INTERVAL)
 
     async def connect_to_peer(self, ip: str):
         """Conecta, se identifica e inicia a escuta a um par."""
-        async with self.lock:
-            if ip == self.my_ip or ip in self.peers:
-                return
+        if ip in self.peer_table.dialing:
+            return
+        self.peer_table.dialing.add(ip)
+        await self._dial(ip)
 
-        print(f"Tentando conectar a {ip}...")
+    async def _dial(self, ip: str):
+        """Disca para `ip`, já marcado em `peer_table.dialing`."""
         try:
-            reader, writer = await asyncio.open_connection(ip, PORT)
+            if not self.peer_table.can_accept(ip, "out"):
+                return
+            log.info("Tentando conectar a %s...", ip)
+            await self._open(ip)
+        finally:
+            self.peer_table.dialing.discard(ip)
+            self.peer_table.wakeup.set()
 
-            async with self.lock:
-                self.peers[ip] = writer
+    async def _open(self, ip: str):
+        try:
+            start = time.perf_counter()
+            reader, writer = await self.network.open_connection(ip, self.peer_port)
+            rtt = time.perf_counter() - start
+            existing = self.peers.get(ip)
+            if existing is not None:
+                if not self.peer_table.replaces(ip, "out"):
+                    # O par discou ao mesmo tempo e a conexão dele é a que fica.
+                    self.metrics.inc("dcc_duplicate_connections_total")
+                    log.info("Conexão com %s já aberta pelo par; descartando a discagem.", ip)
+                    writer.close()
+                    return
+                self._replace_peer(ip, existing)
+            reader = CountingReader(reader, self.metrics, ip)
+            writer = PeerSender(writer, metrics=self.metrics, peer=ip)
+            self._register_peer(ip, writer, "out", rtt)
 
+            await send_message(writer, encode_identify(self.my_ip))
+            await self.send_hello(writer)
             await send_peer_request(writer)
             await send_archive_request(writer)
             self._create_task(self.listen_to_peer(ip, reader, writer))
 
         except Exception as e:
-            print(f"Falha ao conectar a {ip}: {e}")
+            self.peer_table.record_failure(ip)
+            self.metrics.inc("dcc_connect_failures_total")
+            log.warning("Falha ao conectar a %s: %s", ip, e)
 
     async def handle_connection(
         self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
     ):
         """Recebe uma conexão, aguarda identificação e inicia a escuta."""
+        frames = FrameReader(reader)
         try:
-            header = await reader.readexactly(1)
-            if header[0] == IDENTIFY:
-                ip_data = await reader.readexactly(4)
-                peer_ip = decode_identify(ip_data)
-                print(f"<- Conexão recebida e identificada de {peer_ip}")
+            msg_type, peer_ip = await frames.read_frame()
+            if msg_type == IDENTIFY:
+                log.info("<- Conexão recebida e identificada de %s", peer_ip)
             else:
-                print("Conexão recebida sem identificação. Fechando.")
+                log.warning("Conexão recebida sem identificação. Fechando.")
                 writer.close()
                 await writer.wait_closed()
                 return
-        except (asyncio.IncompleteReadError, ConnectionResetError) as e:
-            print(f"Conexão perdida antes da identificação: {e}")
+        except (asyncio.IncompleteReadError, ConnectionResetError, ProtocolError) as e:
+            log.info("Conexão perdida antes da identificação: %s", e)
+            writer.close()
             return
 
-        async with self.lock:
-            if peer_ip in self.peers:
-                writer.close()
-                await writer.wait_closed()
-                return
-            self.peers[peer_ip] = writer
+        existing = self.peers.get(peer_ip)
+        # Só quem conecta do próprio endereço prova ser `peer_ip`; o Identify é livre.
+        address = writer.get_extra_info("peername")
+        confirmed = address is not None and address[0] == peer_ip
+        if existing is not None and self.peer_table.replaces(peer_ip, "in", confirmed):
+            self._replace_peer(peer_ip, existing)
+        elif existing is not None:
+            # Discagem simultânea perdida no desempate, ou Identify vindo de
+            # outro endereço: a conexão atual é a que fica.
+            self.metrics.inc("dcc_duplicate_connections_total")
+            log.info("Conexão duplicada de %s; mantida a atual.", peer_ip)
+            writer.close()
+            await writer.wait_closed()
+            return
+        elif not self.peer_table.can_accept(peer_ip, "in"):
+            # Sem vaga: antes de fechar, indica outros pares, para quem entrou por
+            # um bootstrap lotado não ficar sem ninguém a quem discar.
+            self.metrics.inc("dcc_rejected_connections_total")
+            await send_message(writer, encode_peer_list(list(self.peers)))
+            writer.close()
+            await writer.wait_closed()
+            return
+        writer = PeerSender(writer, metrics=self.metrics, peer=peer_ip)
+        self._register_peer(peer_ip, writer, "in")
+
+        await self.send_hello(writer)
+        frames.reader = CountingReader(reader, self.metrics, peer_ip)
+        await self.listen_to_peer(peer_ip, frames, writer)
+
+    def _replace_peer(self, ip: str, writer):
+        """Fecha a conexão atual com `ip`, substituída por uma nova."""
+        self.metrics.inc("dcc_duplicate_connections_total")
+        log.info("Conexão duplicada com %s; a anterior foi fechada.", ip)
+        # A nova conexão repete o Hello e o Version.
+        self.peer_capabilities.pop(ip, None)
+        self.peer_versions.pop(ip, None)
+        self.archive_served.pop(ip, None)
+        writer.close()
+
+    async def send_hello(self, writer: asyncio.StreamWriter):
+        """Anuncia as extensões suportadas; pares sem suporte nunca respondem com Hello."""
+        if self.capabilities:
+            await send_message(writer, encode_hello(self.capabilities))
+
+    async def on_peer_request(self, ip: str, writer, _):
+        await send_message(writer, encode_peer_list(list(self.peers)))
+
+    async def on_peer_list(self, ip: str, writer, new_peers: list[str]):
+        self.peer_table.pong_received(ip)
+        log.debug("-> Recebido PeerList de %s com %d pares: %s", ip, len(new_peers), new_peers)
+        for new_ip in new_peers:
+            self.peer_table.add_known(new_ip)
 
-        await self.listen_to_peer(peer_ip, reader, writer)
+    async def on_archive_request(self, ip: str, writer, _):
+        await self._send_archive(ip, writer)
+
+    async def _send_archive(self, ip: str, writer):
+        """
+        Envia o histórico completo, a menos que ele não tenha mudado desde o
+        último enviado a este par. Nesse caso a resposta é "nada novo": um
+        ArchiveSuffix vazio na ponta, para quem tem CAP_DELTA_SYNC, ou nada.
+        """
+        state = (len(self.chats), self.chats.tip)
+        if self.archive_served.get(ip) == state:
+            self.metrics.inc("dcc_archive_not_modified_total")
+            if self.peer_capabilities.get(ip, 0) & CAP_DELTA_SYNC:
+                await send_message(writer, encode_archive_suffix(self.chats, len(self.chats)))
+            return
+        # Só conta como servido o que foi de fato para a fila do par.
+        if await send_archive_response(self.chats, writer, self.archive_cache):
+            self.archive_served[ip] = state
+
+    async def on_archive_response(self, ip: str, writer, frames: FrameReader):
+        await read_archive_response(self, frames, ip)
+
+    async def on_hello(self, ip: str, writer, capabilities: int):
+        self.peer_capabilities[ip] = capabilities
+        if capabilities & self.capabilities & CAP_HANDSHAKE:
+            await send_message(writer, encode_version(PROTOCOL_VERSION, self.capabilities))
+
+    async def on_version(self, ip: str, writer, value):
+        """Fecha a conexão se a versão maior do protocolo não for a nossa."""
+        version, capabilities = value
+        if version[0] != PROTOCOL_VERSION[0]:
+            raise ProtocolError("versão de protocolo incompatível: %d.%d" % version)
+        self.peer_versions[ip] = version
+        self.peer_capabilities[ip] = capabilities
+
+    async def on_archive_since_request(self, ip: str, writer, request):
+        height, tip = request
+        if suffix_fits(self.chats, height, tip):
+            await send_message(writer, encode_archive_suffix(self.chats, height))
+        else:
+            await self._send_archive(ip, writer)
+
+    async def on_archive_suffix(self, ip: str, writer, frames: FrameReader):
+        await read_archive_suffix(self, frames, ip)
+
+    async def on_new_tip(self, ip: str, writer, new_tip):
+        height, tip, origin_ms = new_tip
+        await handle_new_tip(self, ip, height, tip, origin_ms)
+
+    def drop_peer(self, ip: str | None, error: InvalidChainError):
+        """Fecha a conexão com um par que enviou um histórico inválido."""
+        self.metrics.inc("dcc_invalid_chains_total")
+        log.warning("Histórico inválido recebido de %s (%s). Fechando conexão.", ip, error)
+        writer = self.peers.get(ip)
+        if writer is not None:
+            writer.close()
 
     async def listen_to_peer(
         self, ip: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
     ):
-        """Loop para processar mensagens APÓS a identificação."""
+        """
+        Loop para processar mensagens APÓS a identificação: cada mensagem lida
+        pelo FrameReader vai para o tratador registrado em `self.handlers`.
+        """
+        frames = reader if isinstance(reader, FrameReader) else FrameReader(reader)
         try:
-            while True:
-                msg_type_byte = await reader.readexactly(1)
-                msg_type = struct.unpack("!B", msg_type_byte)[0]
-                print(msg_type, 'vmsg_typemsg_typemsg_typemsg_typemsg_typemsg_typemsg_typemsg_typemsg_type')
-                if msg_type == PEER_REQUEST:
-                    print(f"===> Recebido PeerRequest de {ip}")
-                    async with self.lock:
-                        print(self.peers.keys(), 'self.peers.keys()')
-                        response = encode_peer_list(list(self.peers.keys()))
-                        print(f'enviado para {ip} ===> {response}')
-                    await send_message(writer, response)
-                    print(f"<==== Enviado PeerList para {ip}")
-
-                elif msg_type == PEER_LIST:
-                    print('===>recebido peerList msg')
-                    count_data = await reader.readexactly(4)
-                    count = struct.unpack("!I", count_data)[0]
-                    if count > 0:
-                        body = await reader.readexactly(count * 4)
-                        new_peers = decode_peer_list(count_data + body)
-                        print(
-                            f"-> Recebido PeerList de {ip} com {count} pares: {new_peers}"
-                        )
-                        for new_ip in new_peers:
-                            #self._create_task(self.connect_to_peer(new_ip))
-                            print(f'NÂO CONECTADO COM O {new_ip} POR CAUSA DO NAT')
-                    else:
-                        print(f"-> Recebido PeerList de {ip} com 0 pares.")
-                elif msg_type == ARCHIVE_REQUEST:
-                    print('===> RECEBIDO ARCHIVE_REQUEST')
-                    await send_archive_response(self.chats, writer)
-                elif msg_type == ARCHIVE_RESPONSE:
-                    print('===> RECEBIDO ARCHIVE_REPONSE')
-                    await recive_archive_response(self,reader)
-                    c = ['(^_^)', '(T_T)', '(O_O)', '(o_-)', '=^.^=']
-                    if self.a < 1:
-                        #await put_chat_in_queue(self.chats, f"Como se chama a pessoa que viu o Thor de perto? Vi-Thor.")
-                        #await send_to_chats_to_all_peers(self)
-                        self.a = self.a + 1
+            async for msg_type, value in frames:
+                name = message_name(msg_type)
+                self.metrics.inc("dcc_messages_received_total", type=name)
+                log.debug("<- %s de %s", name, ip)
+                self.peer_table.seen(ip)
+                handler = self.handlers.get(msg_type)
+                if handler is None:
+                    continue
+                if not self.rate_limiter.allow(ip, name):
+                    self.metrics.inc("dcc_rate_limited_total", type=name)
+                    if msg_type in STREAMED:
+                        await discard_archive(value, msg_type)
+                    continue
+                with self.metrics.timer("dcc_message_seconds", type=name):
+                    await handler(ip, writer, value)
 
         except (
             asyncio.IncompleteReadError,
             ConnectionResetError,
             BrokenPipeError,
         ) as e:
-            print(f"Conexão com {ip} perdida. Razão: {e}")
+            log.info("Conexão com %s perdida. Razão: %s", ip, e)
+        except InvalidChainError as e:
+            self.metrics.inc("dcc_invalid_chains_total")
+            log.warning("Histórico inválido recebido de %s (%s). Fechando conexão.", ip, e)
+        except RateLimitExceeded as e:
+            self.metrics.inc("dcc_misbehaving_peers_total")
+            self.peer_table.ban(ip, PEER_BAN_SECONDS)
+            log.warning("Par %s excedeu os limites de mensagens (%s). Fechando conexão.", ip, e)
+        except ProtocolError as e:
+            self.metrics.inc("dcc_protocol_errors_total")
+            log.warning("Mensagem inválida de %s (%s). Fechando conexão.", ip, e)
         finally:
             writer.close()
-            async with self.lock:
-                if ip in self.peers:
-                    del self.peers[ip]
-                    print(f"Par {ip} removido da lista.")
-
-    
\ No newline at end of file
+            self.metrics.inc("dcc_disconnects_total")
+            # Uma conexão substituída no desempate não leva o estado da nova.
+            if self.peers.get(ip) is writer:
+                self.peer_capabilities.pop(ip, None)
+                self.peer_versions.pop(ip, None)
+                self.archive_served.pop(ip, None)
+                self.rate_limiter.forget(ip)
+                self.scheduler.remove(ip)
+                self.peer_table.detach(ip)
+                log.info("Par %s removido da lista.", ip)
@@ -0,0 +1,89 @@
+from collections import OrderedDict
+
+from dcc_chat.chain import ChatChain
+
+# Quantidade de ramos alternativos lembrados.
+MAX_BRANCHES = 8
+
+
+def common_ancestor(a: ChatChain, b: ChatChain, start: int = 0) -> int:
+    """
+    Quantidade de chats iniciais byte a byte iguais em `a` e `b`. Os buffers são
+    comparados em blocos de `step` chats e só o bloco divergente chat a chat.
+    Os `start` primeiros chats já são sabidos iguais e não são comparados.
+
+    Se uma delas foi podada, os chats anteriores à poda valem como iguais
+    quando o primeiro chat em memória é o mesmo nas duas: o md5 dele ancora os
+    anteriores. Se não for, o resultado fica abaixo da poda.
+    """
+    count = min(len(a), len(b))
+    low, step = max(a.base, b.base), 4096
+    if start > low:
+        low = start
+    elif low and (low >= count or a.record(low) != b.record(low)):
+        return min(count, low - 1)
+    while low < count:
+        high = min(low + step, count)
+        if a.offset(high) - a.offset(low) == b.offset(high) - b.offset(low) and a.view(low, high) == b.view(low, high):
+            low = high
+            continue
+        while a.record(low) == b.record(low):
+            low += 1
+        return low
+    return count
+
+
+class Branch:
+    """Ramo alternativo: altura da bifurcação e os chats a partir dela."""
+
+    def __init__(self, fork_height: int, suffix: ChatChain):
+        self.fork_height = fork_height
+        self.suffix = suffix
+
+    def __len__(self) -> int:
+        return self.fork_height + len(self.suffix)
+
+
+class ForkChoice:
+    """
+    Escolha de ramo: uma cadeia recebida só substitui a local se for
+    estritamente mais longa, o que torna a escolha determinística e evita que
+    ramos de mesmo tamanho se alternem. Os ramos preteridos são guardados
+    (só a partir da bifurcação) em uma lista limitada, indexada pelo md5 da ponta.
+    """
+
+    def __init__(self, max_branches: int = MAX_BRANCHES):
+        self.max_branches = max_branches
+        self.branches = OrderedDict()
+
+    def is_known(self, tip) -> bool:
+        """Se a ponta `tip` pertence a um ramo já avaliado e preterido."""
+        return tip in self.branches
+
+    def remember(self, chats: ChatChain, fork_height: int):
+        if not chats or fork_height >= len(chats):
+            return
+        suffix = ChatChain()
+        suffix.extend(chats.view(fork_height))
+        self.branches[chats.tip] = Branch(fork_height, suffix)
+        self.branches.move_to_end(chats.tip)
+        while len(self.branches) > self.max_branches:
+            self.branches.popitem(last=False)
+
+    def forget(self, tip):
+        """Esquece o ramo de ponta `tip`, lembrado por uma escolha que foi desfeita."""
+        self.branches.pop(tip, None)
+
+    def choose(self, local: ChatChain, incoming: ChatChain, fork_height: int | None = None) -> bool:
+        """
+        Decide entre a cadeia local e uma recebida já verificada. Retorna True
+        se a recebida deve ser adotada; o ramo perdedor é lembrado.
+        """
+        if fork_height is None:
+            fork_height = common_ancestor(local, incoming)
+        if len(incoming) > len(local):
+            self.remember(local, fork_height)
+            self.branches.pop(incoming.tip, None)
+            return True
+        self.remember(incoming, fork_height)
+        return False
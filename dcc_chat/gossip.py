@@ -0,0 +1,73 @@
+import random
+import time
+from collections import OrderedDict, deque
+
+from dcc_chat.config import GOSSIP_FANOUT
+
+# Pontas lembradas pelo cache de anúncios.
+MAX_SEEN = 1024
+# Latências guardadas para as estatísticas.
+MAX_LATENCIES = 256
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class Gossip:
+    """
+    Estado da difusão de novas pontas: um cache limitado das pontas já vistas
+    (com o instante em que foram criadas na origem), para que nenhuma seja
+    pedida ou repassada duas vezes, e as latências de propagação observadas.
+    """
+
+    def __init__(self, fanout: int | None = GOSSIP_FANOUT, max_seen: int = MAX_SEEN):
+        self.fanout = fanout
+        self.max_seen = max_seen
+        self.seen = OrderedDict()
+        self.latencies_ms = deque(maxlen=MAX_LATENCIES)
+
+    def mark_seen(self, tip: bytes, origin_ms: int) -> bool:
+        """Registra a ponta; retorna False se ela já era conhecida."""
+        if tip in self.seen:
+            return False
+        self.seen[tip] = {"origin_ms": origin_ms, "forwarded": False, "adopted": False}
+        while len(self.seen) > self.max_seen:
+            self.seen.popitem(last=False)
+        return True
+
+    def origin(self, tip: bytes) -> int:
+        entry = self.seen.get(tip)
+        return entry["origin_ms"] if entry else now_ms()
+
+    def should_forward(self, tip: bytes) -> bool:
+        """True apenas na primeira vez que a ponta é repassada."""
+        self.mark_seen(tip, now_ms())
+        entry = self.seen[tip]
+        if entry["forwarded"]:
+            return False
+        entry["forwarded"] = True
+        return True
+
+    def record_adoption(self, tip: bytes):
+        """Registra a latência desde a origem de uma ponta anunciada e adotada."""
+        entry = self.seen.get(tip)
+        if entry is not None and not entry["adopted"]:
+            entry["adopted"] = True
+            self.latencies_ms.append(max(0, now_ms() - entry["origin_ms"]))
+
+    def targets(self, peers: list) -> list:
+        if self.fanout is None or len(peers) <= self.fanout:
+            return peers
+        return random.sample(peers, self.fanout)
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies_ms)
+        if not latencies:
+            return {"adopted": 0}
+        return {
+            "adopted": len(latencies),
+            "latency_mean_ms": sum(latencies) / len(latencies),
+            "latency_p50_ms": latencies[len(latencies) // 2],
+            "latency_max_ms": latencies[-1],
+        }
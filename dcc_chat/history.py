@@ -0,0 +1,184 @@
+import asyncio
+import json
+import re
+from bisect import bisect_left
+
+# Maior quantidade de chats devolvida por página.
+MAX_PAGE = 500
+
+_TOKEN = re.compile(rb"[0-9a-z]+")
+
+
+def tokenize(text: bytes) -> set[bytes]:
+    """Palavras (letras e dígitos, em minúsculas) de um texto, sem repetição."""
+    return set(_TOKEN.findall(text.lower()))
+
+
+def chat_to_json(height: int, chat: dict) -> dict:
+    return {
+        "height": height,
+        "text": chat["text"].decode("ascii", "replace"),
+        "verification_code": chat["verification_code"].hex(),
+        "md5": chat["md5"].hex(),
+    }
+
+
+class HistoryIndex:
+    """
+    Índice da cadeia local por altura, md5 e palavras do texto. A altura já é
+    indexada pelos offsets da própria ChatChain; aqui ficam o mapa md5 -> altura
+    e, para cada palavra, a lista crescente das alturas em que ela aparece.
+
+    Como o ChainStore, é atualizado por `sync(chats, start)`: numa troca de
+    ramo só as alturas a partir de `start` são desfeitas e indexadas de novo.
+    Com a cadeia podada, só os chats em memória (a partir de `base`) ficam no índice.
+    """
+
+    def __init__(self):
+        self.chats = None
+        self.base = 0
+        self.by_md5 = {}
+        self.postings = {}
+        self._md5s = []
+        self._tokens = []
+
+    @property
+    def height(self) -> int:
+        return self.base + len(self._md5s)
+
+    def sync(self, chats, start: int = 0):
+        """Indexa `chats` sabendo que os chats antes de `start` não mudaram."""
+        start = min(start, self.height, len(chats))
+        if start < max(self.base, chats.base):
+            # A troca começa antes do que está em memória: reindexa tudo a partir da base.
+            self.base = start = chats.base
+            self.by_md5, self.postings, self._md5s, self._tokens = {}, {}, [], []
+        for height in range(self.height - 1, start - 1, -1):
+            md5 = self._md5s.pop()
+            if self.by_md5.get(md5) == height:
+                del self.by_md5[md5]
+            for token in self._tokens.pop():
+                postings = self.postings[token]
+                postings.pop()
+                if not postings:
+                    del self.postings[token]
+        for height in range(start, len(chats)):
+            record = chats.record(height)
+            md5 = bytes(record[-16:])
+            tokens = tokenize(bytes(record[1 : 1 + record[0]]))
+            self._md5s.append(md5)
+            self._tokens.append(tokens)
+            self.by_md5.setdefault(md5, height)
+            for token in tokens:
+                self.postings.setdefault(token, []).append(height)
+        self.chats = chats
+        self._prune(chats.base)
+
+    def _prune(self, height: int):
+        """Esquece as alturas abaixo de `height`, já podadas da cadeia."""
+        drop = height - self.base
+        if drop <= 0:
+            return
+        for idx, md5 in enumerate(self._md5s[:drop]):
+            if self.by_md5.get(md5) == self.base + idx:
+                del self.by_md5[md5]
+        for token in set().union(*self._tokens[:drop]):
+            postings = self.postings[token]
+            del postings[: bisect_left(postings, height)]
+            if not postings:
+                del self.postings[token]
+        del self._md5s[:drop], self._tokens[:drop]
+        self.base = height
+
+    def page(self, before: int | None = None, limit: int = 50):
+        """
+        Até `limit` chats imediatamente antes da altura `before` (None = ponta),
+        do mais antigo ao mais novo, e o cursor da página anterior (None no início).
+        """
+        stop = self.height if before is None else max(self.base, min(before, self.height))
+        start = max(self.base, stop - max(0, min(limit, MAX_PAGE)))
+        chats = [(height, self.chats[height]) for height in range(start, stop)]
+        return chats, (start if start > self.base else None)
+
+    def find(self, md5: bytes):
+        """Altura e chat com este md5, ou None."""
+        height = self.by_md5.get(md5)
+        return None if height is None else (height, self.chats[height])
+
+    def search(self, query: str, before: int | None = None, limit: int = 50):
+        """
+        Chats com todas as palavras de `query`, do mais novo ao mais antigo,
+        abaixo da altura `before`, e o cursor da próxima página (None no fim).
+        """
+        tokens = tokenize(query.encode("ascii", "ignore"))
+        lists = [self.postings.get(token, []) for token in tokens]
+        if not lists:
+            return [], None
+        lists.sort(key=len)
+        first, rest = lists[0], lists[1:]
+        stop = len(first) if before is None else bisect_left(first, before)
+        limit = max(0, min(limit, MAX_PAGE))
+        found = []
+        for idx in range(stop - 1, -1, -1):
+            height = first[idx]
+            if all(_contains(other, height) for other in rest):
+                if len(found) == limit:
+                    return found, found[-1][0]
+                found.append((height, self.chats[height]))
+        return found, None
+
+
+def _contains(postings: list, height: int) -> bool:
+    idx = bisect_left(postings, height)
+    return idx < len(postings) and postings[idx] == height
+
+
+async def serve_history(node, host: str = "127.0.0.1", port: int | None = None, path: str | None = None):
+    """
+    Serve consultas ao histórico numa porta local ou, com `path`, num socket
+    Unix. Cada linha recebida é um objeto JSON e é respondida com uma linha:
+
+      {"op": "page", "before": 120, "limit": 20}  ->  {"chats": [...], "next": 100}
+      {"op": "find", "md5": "<hex>"}               ->  {"chat": {...} ou null}
+      {"op": "search", "query": "oi", "limit": 5}  ->  {"chats": [...], "next": ...}
+      {"op": "height"}                             ->  {"height": 120}
+
+    Retorna o servidor asyncio.
+    """
+
+    def answer(request: dict) -> dict:
+        op = request.get("op")
+        limit = int(request.get("limit", 50))
+        before = request.get("before")
+        before = None if before is None else int(before)
+        if op == "page":
+            chats, cursor = node.history_page(before, limit)
+        elif op == "search":
+            chats, cursor = node.search_history(str(request.get("query", "")), before, limit)
+        elif op == "find":
+            found = node.find_chat(bytes.fromhex(request.get("md5", "")))
+            return {"chat": found and chat_to_json(*found)}
+        elif op == "height":
+            return {"height": node.history.height}
+        else:
+            return {"error": f"operação desconhecida: {op}"}
+        return {"chats": [chat_to_json(height, chat) for height, chat in chats], "next": cursor}
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    response = answer(request) if isinstance(request, dict) else {"error": "esperado um objeto"}
+                except (ValueError, TypeError) as e:
+                    response = {"error": str(e)}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionResetError, BrokenPipeError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    if path is not None:
+        return await asyncio.start_unix_server(handle, path)
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,219 @@
+import asyncio
+import random
+from collections import deque
+
+
+class _Socket:
+    def __init__(self, address):
+        self.address = address
+
+    def getsockname(self):
+        return self.address
+
+
+class MemoryServer:
+    """Servidor registrado na rede em memória; imita o `asyncio.Server`."""
+
+    def __init__(self, network, address, handler):
+        self.network = network
+        self.address = address
+        self.handler = handler
+        self.sockets = [_Socket(address)]
+        self._serving = asyncio.get_running_loop().create_future()
+        self._tasks = set()
+
+    def accept(self, reader, writer):
+        task = asyncio.create_task(self.handler(reader, writer))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def close(self):
+        if self.network.servers.get(self.address) is self:
+            del self.network.servers[self.address]
+        if not self._serving.done():
+            self._serving.cancel()
+
+    async def wait_closed(self):
+        pass
+
+    async def serve_forever(self):
+        await self._serving
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+
+class MemoryWriter:
+    """
+    Um sentido de uma conexão em memória, com a interface do `StreamWriter`
+    que o nó usa. Os bytes chegam ao `StreamReader` do outro lado depois da
+    latência, em ordem, ao ritmo da banda da rede.
+    """
+
+    def __init__(self, network, local, remote, reader, remote_reader):
+        self.network = network
+        self.local = local
+        self.remote = remote
+        self.reader = reader
+        self.remote_reader = remote_reader
+        self.peer = None
+        self.closed = False
+        self.broken = False
+        self._busy_until = 0.0
+        self._in_flight = deque()
+
+    def write(self, data):
+        if self.closed or self.broken:
+            return
+        network = self.network
+        now = asyncio.get_running_loop().time()
+        size = len(data)
+        network.bytes_sent += size
+        self._busy_until = max(now, self._busy_until)
+        if network.bandwidth:
+            self._busy_until += size / network.bandwidth
+        delivery = self._busy_until + network.latency
+        if network.loss and network.rng.random() < network.loss:
+            # O TCP retransmite o segmento perdido: ele e os seguintes atrasam.
+            delivery += network.rto
+        self._send(delivery, bytes(data))
+
+    def _send(self, delivery: float, data: bytes | None):
+        """Agenda a entrega de `data` (None = fim da conexão), sempre em ordem."""
+        if self._in_flight:
+            delivery = max(delivery, self._in_flight[-1][0])
+        self._in_flight.append((delivery, data))
+        if len(self._in_flight) == 1:
+            asyncio.get_running_loop().call_at(delivery, self._deliver)
+
+    def _deliver(self):
+        loop = asyncio.get_running_loop()
+        while self._in_flight and self._in_flight[0][0] <= loop.time():
+            _, data = self._in_flight.popleft()
+            if self.broken or self.peer.closed:
+                continue
+            if data is None:
+                self.remote_reader.feed_eof()
+            else:
+                self.remote_reader.feed_data(data)
+        if self._in_flight:
+            loop.call_at(self._in_flight[0][0], self._deliver)
+
+    async def drain(self):
+        if self.broken:
+            raise ConnectionResetError("conexão interrompida pela partição")
+        wait = self._busy_until - asyncio.get_running_loop().time()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.network.writers.discard(self)
+        if not self.broken:
+            self.reader.feed_eof()
+            self._send(asyncio.get_running_loop().time() + self.network.latency, None)
+
+    def reset(self):
+        """Derruba a conexão nos dois sentidos, descartando o que estava em trânsito."""
+        for writer in (self, self.peer):
+            if not writer.broken:
+                writer.broken = True
+                if not writer.closed:
+                    writer.reader.set_exception(ConnectionResetError("conexão interrompida pela partição"))
+            self.network.writers.discard(writer)
+
+    async def wait_closed(self):
+        pass
+
+    def is_closing(self) -> bool:
+        return self.closed or self.broken
+
+    def get_extra_info(self, name, default=None):
+        return {"peername": self.remote, "sockname": self.local}.get(name, default)
+
+
+class MemoryHost:
+    """Visão da rede a partir de um IP: substitui `asyncio` como `P2PNode(network=...)`."""
+
+    def __init__(self, network, ip: str):
+        self.network = network
+        self.ip = ip
+
+    async def start_server(self, handler, host, port):
+        return self.network.start_server(handler, host, port)
+
+    async def open_connection(self, host, port):
+        return await self.network.open_connection(self.ip, host, port)
+
+
+class MemoryNetwork:
+    """
+    Rede simulada, para executar centenas de nós num único laço de eventos.
+    Cada envio chega ao destino após `latency` segundos, e cada sentido de uma
+    conexão transmite no máximo `bandwidth` bytes/s (None = sem limite). Como o
+    protocolo roda sobre TCP, uma perda (probabilidade `loss` por envio) não
+    some com os bytes: atrasa o envio e os seguintes em `rto` segundos.
+
+    `partition` separa os nós em grupos: as conexões entre grupos caem e novas
+    são recusadas até `heal`. `bytes_sent` soma tudo o que foi transmitido.
+    """
+
+    def __init__(self, latency: float = 0.0, bandwidth: float | None = None, loss: float = 0.0, rto: float = 0.2, seed=None):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.loss = loss
+        self.rto = rto
+        self.rng = random.Random(seed)
+        self.servers = {}
+        self.writers = set()
+        self.groups = None
+        self.bytes_sent = 0
+        self.connections = 0
+        self._next_port = 40000
+
+    def host(self, ip: str) -> MemoryHost:
+        return MemoryHost(self, ip)
+
+    def reachable(self, a: str, b: str) -> bool:
+        return self.groups is None or self.groups.get(a) == self.groups.get(b)
+
+    def start_server(self, handler, host, port):
+        if not port:
+            self._next_port += 1
+            port = self._next_port
+        if (host, port) in self.servers:
+            raise OSError(f"endereço em uso: {host}:{port}")
+        server = self.servers[(host, port)] = MemoryServer(self, (host, port), handler)
+        return server
+
+    async def open_connection(self, local: str, host: str, port: int):
+        # Estabelecer a conexão custa uma ida e volta.
+        await asyncio.sleep(2 * self.latency)
+        server = self.servers.get((host, port))
+        if server is None or not self.reachable(local, host):
+            raise ConnectionRefusedError(f"{host}:{port} inacessível")
+        self._next_port += 1
+        local_address = (local, self._next_port)
+        reader, remote_reader = asyncio.StreamReader(), asyncio.StreamReader()
+        writer = MemoryWriter(self, local_address, (host, port), reader, remote_reader)
+        remote_writer = MemoryWriter(self, (host, port), local_address, remote_reader, reader)
+        writer.peer, remote_writer.peer = remote_writer, writer
+        self.writers.update((writer, remote_writer))
+        self.connections += 1
+        server.accept(remote_reader, remote_writer)
+        return reader, writer
+
+    def partition(self, *groups):
+        """Separa os IPs em `groups`; IPs não listados formam um grupo à parte."""
+        self.groups = {ip: i for i, group in enumerate(groups) for ip in group}
+        for writer in list(self.writers):
+            if not self.reachable(writer.local[0], writer.remote[0]):
+                writer.reset()
+
+    def heal(self):
+        self.groups = None
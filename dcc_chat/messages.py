@@ -1,126 +1,180 @@
 import asyncio
 import binascii
-from functools import reduce
-import hashlib
+import logging
 import struct
-import os
-from dcc_chat.config import PEER_REQUEST_INTERVAL
-from dcc_chat.protocol import encode_archive_request, encode_archive_response, encode_peer_request
+from dcc_chat.config import ARCHIVE_SYNC_PEERS, MINING_WORKERS
+from dcc_chat.mining import Miner
+from dcc_chat.protocol import (
+    ArchiveDecoder,
+    encode_archive_request,
+    encode_archive_response,
+    encode_archive_since_request,
+    encode_new_tip,
+    encode_peer_request,
+    CAP_DELTA_SYNC,
+    CAP_GOSSIP,
+)
 
+# Maior bloco lido de uma vez ao receber um ArchiveResponse.
+ARCHIVE_READ_CHUNK = 1 << 16
 
-async def send_message( writer: asyncio.StreamWriter, message: bytes):
+log = logging.getLogger(__name__)
+
+
+_default_miner = None
+
+
+def get_default_miner():
+    """Minerador compartilhado usado quando nenhum outro é informado."""
+    global _default_miner
+    if _default_miner is None:
+        _default_miner = Miner(workers=MINING_WORKERS)
+    return _default_miner
+
+
+async def send_message( writer: asyncio.StreamWriter, message: bytes) -> bool:
+        """Envia `message`; retorna False se ela não pôde ser entregue ao par."""
         try:
-            writer.write(message)
+            sent = writer.write(message) is not False
             await writer.drain()
+            return sent
         except (ConnectionResetError, BrokenPipeError) as e:
             peer_ip = "desconhecido"
             try:
                 peer_ip = writer.get_extra_info("peername")
             except:
                 pass
-            print(f"Não foi possível enviar mensagem para {peer_ip}: {e}")
+            log.warning("Não foi possível enviar mensagem para %s: %s", peer_ip, e)
+            return False
 
 async def send_peer_request(writer: asyncio.StreamWriter):
-        print(f'===> SEND PEER_REQUEST to {writer.get_extra_info("peername")}')
         await send_message(writer, encode_peer_request())
 
 async def send_archive_request(writer: asyncio.StreamWriter):
-        print('===> SEND ARCIVE_REQUEST')
         await send_message(writer, encode_archive_request())
 
+async def send_archive_since_request(chats, writer: asyncio.StreamWriter):
+        await send_message(writer, encode_archive_since_request(len(chats), chats.tip))
+
 async def periodic_requests(p2PNode):
+        """
+        Sincroniza com cada par quando a agenda `p2PNode.scheduler` indicar:
+        PeerRequest e o pedido de histórico adequado às extensões do par. Pares
+        com difusão anunciam as próprias pontas, então só os ARCHIVE_SYNC_PEERS
+        de menor RTT entre eles recebem também o pedido de histórico.
+        """
+        scheduler = p2PNode.scheduler
         while True:
-            await asyncio.sleep(PEER_REQUEST_INTERVAL)
-            async with p2PNode.lock:
-                if not p2PNode.peers:
+            await scheduler.wait()
+            due = scheduler.pop_due()
+            if not due:
+                continue
+            fastest = set(p2PNode.peer_table.by_latency()[:ARCHIVE_SYNC_PEERS])
+            for ip in due:
+                writer = p2PNode.peers.get(ip)
+                if writer is None:
+                    scheduler.remove(ip)
                     continue
-                peer_writers = list(p2PNode.peers.values())
-
-            for writer in peer_writers:
+                p2PNode.peer_table.ping_sent(ip)
                 await send_peer_request(writer)
-                await send_archive_request(writer)
+                capabilities = p2PNode.peer_capabilities.get(ip, 0)
+                if capabilities & CAP_GOSSIP and ip not in fastest:
+                    scheduler.idle(ip)
+                elif capabilities & CAP_DELTA_SYNC:
+                    await send_archive_since_request(p2PNode.chats, writer)
+                else:
+                    await send_archive_request(writer)
     
-async def send_archive_response(chats, writer:asyncio.StreamWriter):
+async def send_archive_response(chats, writer:asyncio.StreamWriter, cache=None) -> bool:
         #print(f'===> ARCHIVE RESPONSE to {writer.get_extra_info('peername')}')
-        response = encode_archive_response(chats)
-        await send_message(writer, response)
+        if not chats.complete:
+            # Cadeia podada sem arquivo em disco: só dá para servir sufixos.
+            return False
+        response = cache.get(chats) if cache is not None else encode_archive_response(chats)
+        return await send_message(writer, response)
         
-async def recive_archive_response(p2PNode, reader:asyncio.StreamReader):
-        count_chats_bytes = await reader.readexactly(4)
-        count_chats = struct.unpack("!I",count_chats_bytes)[0]
-        chats = {}
-        for i in range(0, count_chats):
-            count_character_byte = await reader.readexactly(1)
-            count_character = struct.unpack("!B",count_character_byte)[0]
-            text_bytes =  await reader.readexactly(count_character)
-            verification_code = await reader.readexactly(16)
-            md5 = await reader.readexactly(16)
-            chat = {"length":count_character_byte, "text": text_bytes, 
-                    "verification_code": verification_code, "md5": md5}
-            chats[i] = chat
-        for idx, chat in enumerate(chats.values()):
-            if idx == 0:
-                continue
-            index_before = idx - 19 if idx - 19 > 0 else 0
-            if verification_check(chat, chats ,range(index_before,idx)) == False:
-                return
-        print_chats(chats, '')
-        p2PNode.chats = chats
-            
-async def put_chat_in_queue(chats, text):
- 
+def suffix_fits(chats, height: int, tip: bytes) -> bool:
+    """Se um par com `height` chats e ponta `tip` pode receber só um ArchiveSuffix."""
+    return height > len(chats) or height == chats.base == 0 or (height > chats.base and chats.md5(height - 1) == tip)
+
+async def read_chats(reader: asyncio.StreamReader, count: int, chats=None):
+        """
+        Lê `count` chats em blocos grandes, acrescentando-os a `chats` sem
+        verificá-los. Sem `chats`, os bytes são apenas consumidos.
+        """
+        decoder = ArchiveDecoder(count)
+        while decoder.remaining:
+            data = await reader.readexactly(min(decoder.bytes_needed(), ARCHIVE_READ_CHUNK))
+            records = decoder.feed(data)
+            if chats is not None:
+                for record in records:
+                    chats.append_record(record)
+            # Cede o laço entre blocos: um arquivo que já está todo no buffer não
+            # impede os outros pares de serem atendidos.
+            await asyncio.sleep(0)
+
+def encode_text(text: str) -> bytes:
+    """Tamanho + texto de um chat, a parte que a mineração completa."""
     if len(text) > 255:
         raise ValueError("Texto excede o limite de 255 caracteres.")
+    return struct.pack("!B", len(text)) + text.encode("ascii")
+
+async def put_chat_in_queue(chats, text, miner=None):
 
-    bytes_s = b''
-    recent_chats = list(chats.values())[-19:]
-    for chat in recent_chats:
-        bytes_s += chat["length"] + chat["text"] + chat["verification_code"] + chat["md5"]
-
-   
-    len_bytes = struct.pack("!B", len(text))
-    text_bytes = text.encode("ascii")            
-
-
-    while True:
-        verification_code = os.urandom(16)      
-        partial_chat = len_bytes + text_bytes + verification_code
-        S = bytes_s + partial_chat
-        md5 = hashlib.md5(S).digest()
-
-        if md5.startswith(b'\x00\x00'):
-            break 
-    chat = {
-        "length": len_bytes,
-        "text": text_bytes,
-        "verification_code": verification_code,
-        "md5": md5
-    }
-    chats[len(chats)] = chat
-    encode_archive_response(chats)
+    partial = encode_text(text)
+    bytes_s = bytes(chats.tail())
+
+    if miner is None:
+        miner = get_default_miner()
+    verification_code, md5 = await miner.mine(bytes_s, partial)
+
+    chats.append(partial[:1], partial[1:], verification_code, md5)
     
 async def send_to_chats_to_all_peers(p2PNode):
-    async with p2PNode.lock:
-        if not p2PNode.peers:
-            return
-        peer_writers = list(p2PNode.peers.values())
-    for writer in peer_writers:
-        await send_archive_response(p2PNode.chats,writer)
-        
-def verification_check(chat, chats_before, range):
-    
-    bytes_s = b''
-    for i in range:
-        bytes_s += b''.join(chats_before[i].values())
-    
-    md5 = b'\x11' * 16
-    message = chat["length"] + chat["text"] + chat["verification_code"]
-    S = bytes_s + message
-    md5 = hashlib.md5(S).digest()
-    return True if chat["md5"] == md5 else False
+    """
+    Propaga a cadeia local: pares com difusão recebem só o anúncio da nova
+    ponta; os demais, o ArchiveResponse completo (codificado uma vez).
+    """
+    peers = p2PNode.peers
+    if not peers:
+        return
+    peer_writers = [
+        writer for ip, writer in peers.items()
+        if not p2PNode.peer_capabilities.get(ip, 0) & CAP_GOSSIP
+    ]
+    await announce_tip(p2PNode)
+    if not peer_writers or not p2PNode.chats.complete:
+        return
+    response = p2PNode.archive_cache.get(p2PNode.chats)
+    await asyncio.gather(*(send_message(writer, response) for writer in peer_writers))
 
+async def announce_tip(p2PNode, exclude=None):
+    """Anuncia a ponta local aos pares com difusão, uma única vez por ponta."""
+    chats = p2PNode.chats
+    if not chats or not p2PNode.gossip.should_forward(chats.tip):
+        return
+    peer_writers = [
+        writer for ip, writer in p2PNode.peers.items()
+        if ip != exclude and p2PNode.peer_capabilities.get(ip, 0) & CAP_GOSSIP
+    ]
+    message = encode_new_tip(len(chats), chats.tip, p2PNode.gossip.origin(chats.tip))
+    await asyncio.gather(*(send_message(w, message) for w in p2PNode.gossip.targets(peer_writers)))
+
+async def handle_new_tip(p2PNode, ip: str, height: int, tip: bytes, origin_ms: int):
+    """Pede ao par que anunciou uma ponta desconhecida e mais alta só o que falta."""
+    if not p2PNode.gossip.mark_seen(tip, origin_ms) or height <= len(p2PNode.chats):
+        return
+    p2PNode.scheduler.observe(ip, (height, tip))
+    writer = p2PNode.peers.get(ip)
+    if writer is None:
+        return
+    if p2PNode.peer_capabilities.get(ip, 0) & CAP_DELTA_SYNC:
+        await send_archive_since_request(p2PNode.chats, writer)
+    else:
+        await send_archive_request(writer)
+        
   
-def print_chats(chats: dict, st):
+def print_chats(chats, st, start=0):
     print("="*60)
     print(f"{'Histórico de Chats':^60} {st}")
     print("="*60)
@@ -129,7 +183,7 @@ def print_chats(chats: dict, st):
         print("Nenhum chat disponível.")
         return
 
-    for idx, chat in enumerate(chats.values(), start=1):
+    for idx, chat in enumerate(chats.values(start), start=start + 1):
         # if(idx < len(chats)):
         #     continue
         # Garante que 'text' está como string
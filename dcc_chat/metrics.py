@@ -0,0 +1,169 @@
+import asyncio
+import bisect
+import time
+from contextlib import contextmanager
+
+from dcc_chat.protocol import MESSAGE_NAMES
+
+# Limites (em segundos) dos baldes dos histogramas de tempo.
+TIME_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+def message_name(msg_type: int) -> str:
+    """Nome de um tipo de mensagem para uso como rótulo."""
+    return MESSAGE_NAMES.get(msg_type, "unknown")
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted(labels.items())))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _format_labels(labels, extra=()) -> str:
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+class Histogram:
+    """Contagens por balde (não cumulativas), soma e total de observações."""
+
+    def __init__(self, buckets=TIME_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """
+    Registro de contadores e histogramas de um nó, exportado no formato texto
+    do Prometheus. Valores que já existem em outros objetos (altura da cadeia,
+    hashrate, filas de saída) não são copiados a cada mudança: os `collectors`
+    os leem no momento da exportação, devolvendo tuplas
+    (nome, tipo, rótulos, valor).
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observa em `name` o tempo gasto dentro do bloco."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def get(self, name: str, **labels) -> float:
+        return self.counters.get(_key(name, labels), 0)
+
+    def total(self, name: str) -> float:
+        """Soma de um contador em todos os rótulos."""
+        return sum(value for (n, _), value in self.counters.items() if n == name)
+
+    def render(self) -> str:
+        families = {}
+        for (name, labels), value in self.counters.items():
+            families.setdefault(name, ("counter", []))[1].append((labels, value))
+        for collector in self.collectors:
+            for name, kind, labels, value in collector():
+                families.setdefault(name, (kind, []))[1].append((tuple(sorted(labels.items())), value))
+
+        lines = []
+        for name in sorted(families):
+            kind, samples = families[name]
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for name in sorted({n for n, _ in self.histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            for (n, labels), histogram in self.histograms.items():
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+class CountingReader:
+    """Envolve um `asyncio.StreamReader` contando os bytes recebidos do par."""
+
+    def __init__(self, reader: asyncio.StreamReader, metrics: Metrics, peer: str):
+        self.reader = reader
+        self.metrics = metrics
+        self.peer = peer
+
+    async def readexactly(self, n: int) -> bytes:
+        data = await self.reader.readexactly(n)
+        self.metrics.inc("dcc_peer_bytes_received_total", len(data), peer=self.peer)
+        return data
+
+    async def read(self, n: int = -1) -> bytes:
+        data = await self.reader.read(n)
+        self.metrics.inc("dcc_peer_bytes_received_total", len(data), peer=self.peer)
+        return data
+
+    def at_eof(self) -> bool:
+        return self.reader.at_eof()
+
+
+async def serve_metrics(metrics: Metrics, host: str = "127.0.0.1", port: int | None = None, path: str | None = None):
+    """
+    Serve `GET /metrics` em HTTP numa porta local ou, com `path`, num socket Unix.
+    Retorna o servidor asyncio.
+    """
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request.split()
+            if len(parts) >= 2 and parts[0] == b"GET" and parts[1] in (b"/metrics", b"/"):
+                status, body = "200 OK", metrics.render().encode()
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.0 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            writer.close()
+
+    if path is not None:
+        return await asyncio.start_unix_server(handle, path)
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,127 @@
+import asyncio
+import hashlib
+import os
+import time
+
+# Um chat é válido quando seu MD5 começa com dois bytes nulos.
+DIFFICULTY_PREFIX = b"\x00\x00"
+# Tentativas por lote enviado a um worker; também é a granularidade do cancelamento.
+BATCH_SIZE = 1 << 16
+
+
+class MiningCancelled(Exception):
+    """Mineração interrompida antes de encontrar um código válido."""
+
+
+def mine_batch(prefix: bytes, partial: bytes, seed: bytes, tries: int):
+    """
+    Testa `tries` códigos de verificação da forma seed (8 bytes) + contador (8 bytes).
+    O estado MD5 de `prefix + partial` é calculado uma vez e copiado a cada tentativa,
+    de modo que só os 16 bytes do código são processados por hash.
+    Retorna (código, md5, tentativas); código e md5 são None se nada foi encontrado.
+    """
+    base = hashlib.md5(prefix)
+    base.update(partial)
+    for counter in range(tries):
+        code = seed + counter.to_bytes(8, "big")
+        h = base.copy()
+        h.update(code)
+        md5 = h.digest()
+        if md5.startswith(DIFFICULTY_PREFIX):
+            return code, md5, counter + 1
+    return None, None, tries
+
+
+class Miner:
+    """Motor de mineração que distribui lotes de tentativas por um pool de processos."""
+
+    def __init__(self, workers: int | None = None, batch_size: int = BATCH_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self._executor = None
+        self._cancel = None
+        self.total_hashes = 0
+        self.total_seconds = 0.0
+        self.last_hashrate = 0.0
+
+    def _get_executor(self):
+        if self._executor is None:
+            # Importado só aqui: o pool de processos pesa no início do nó.
+            from concurrent.futures import ProcessPoolExecutor
+
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    @property
+    def hashrate(self) -> float:
+        """Hashes por segundo acumulados desde a criação do minerador."""
+        if self.total_seconds == 0:
+            return 0.0
+        return self.total_hashes / self.total_seconds
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "total_hashes": self.total_hashes,
+            "total_seconds": self.total_seconds,
+            "hashrate": self.hashrate,
+            "last_hashrate": self.last_hashrate,
+        }
+
+    def cancel(self):
+        """Cancela todas as minerações em andamento."""
+        if self._cancel is not None:
+            self._cancel.set()
+
+    async def mine(self, prefix: bytes, partial: bytes, cancel: asyncio.Event | None = None):
+        """
+        Procura um código de verificação para `partial` (tamanho + texto) após `prefix`
+        (os até 19 chats anteriores). Retorna (código, md5) ou levanta MiningCancelled
+        se `cancel` ou `Miner.cancel()` forem acionados.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        if self._cancel is None or self._cancel.is_set():
+            self._cancel = asyncio.Event()
+        stop_events = [self._cancel] + ([cancel] if cancel is not None else [])
+        stop_waiters = {asyncio.ensure_future(event.wait()) for event in stop_events}
+
+        pending = set()
+
+        def submit():
+            pending.add(loop.run_in_executor(
+                executor, mine_batch, prefix, partial, os.urandom(8), self.batch_size
+            ))
+
+        for _ in range(self.workers):
+            submit()
+
+        hashes = 0
+        start = time.perf_counter()
+        try:
+            while True:
+                done, _ = await asyncio.wait(
+                    pending | stop_waiters, return_when=asyncio.FIRST_COMPLETED
+                )
+                if done & stop_waiters:
+                    raise MiningCancelled("Mineração cancelada.")
+                for fut in done:
+                    pending.discard(fut)
+                    code, md5, tries = fut.result()
+                    hashes += tries
+                    if code is not None:
+                        return code, md5
+                    submit()
+        finally:
+            for fut in pending | stop_waiters:
+                fut.cancel()
+            elapsed = time.perf_counter() - start
+            self.total_hashes += hashes
+            self.total_seconds += elapsed
+            if elapsed > 0:
+                self.last_hashrate = hashes / elapsed
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
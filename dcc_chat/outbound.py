@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from collections import deque
+
+from dcc_chat.protocol import (
+    ARCHIVE_REQUEST,
+    ARCHIVE_RESPONSE,
+    ARCHIVE_SINCE_REQUEST,
+    PEER_LIST,
+    PEER_REQUEST,
+    MESSAGE_NAMES,
+)
+
+log = logging.getLogger(__name__)
+
+# Mensagens que podem ser descartadas em favor de uma mais nova do mesmo tipo.
+REPLACEABLE = frozenset({PEER_REQUEST, PEER_LIST, ARCHIVE_REQUEST, ARCHIVE_RESPONSE, ARCHIVE_SINCE_REQUEST})
+# Mensagens aguardando envio por par.
+MAX_QUEUE = 64
+
+
+class PeerSender:
+    """
+    Fila de saída de um par, esvaziada por uma tarefa própria. Tem a mesma
+    interface de escrita de um `asyncio.StreamWriter`, mas `write` só enfileira
+    e `drain` retorna na hora: um par lento não atrasa quem envia.
+
+    As mensagens acumuladas enquanto a escrita anterior drena são enviadas
+    juntas em um único `write`. Uma mensagem de tipo substituível (ver
+    REPLACEABLE) toma o lugar da anterior do mesmo tipo ainda na fila, em vez de
+    duplicá-la. Se ainda assim a fila encher, o par não está acompanhando: a
+    conexão é fechada, em vez de perder mensagens sem que ninguém saiba.
+
+    Com `metrics`, conta as mensagens enviadas por tipo e os bytes escritos
+    para o par `peer`.
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter, max_queue: int = MAX_QUEUE, metrics=None, peer: str | None = None):
+        self.writer = writer
+        self.max_queue = max_queue
+        self.metrics = metrics
+        self.peer = peer
+        self._queue = deque()
+        self._wakeup = asyncio.Event()
+        self.replaced = 0
+        self.dropped = 0
+        self.writes = 0
+        self.closed = False
+        self._task = asyncio.create_task(self._run())
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def write(self, message: bytes) -> bool:
+        """Enfileira `message`; retorna False se ela não vai ser enviada porque a conexão fechou."""
+        if self.closed:
+            return False
+        msg_type = message[0] if message else None
+        if self.metrics is not None:
+            self.metrics.inc("dcc_messages_sent_total", type=MESSAGE_NAMES.get(msg_type, "unknown"))
+        if msg_type in REPLACEABLE:
+            for idx, queued in enumerate(self._queue):
+                if queued[0] == msg_type:
+                    self._queue[idx] = message
+                    self.replaced += 1
+                    return True
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            if self.metrics is not None:
+                self.metrics.inc("dcc_slow_peers_total")
+            log.warning("Fila de saída de %s cheia; fechando a conexão.", self.peer)
+            self.close()
+            return False
+        self._queue.append(message)
+        self._wakeup.set()
+        return True
+
+    async def drain(self):
+        pass
+
+    async def _run(self):
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                if not self._queue:
+                    continue
+                batch = b"".join(self._queue)
+                self._queue.clear()
+                self.writer.write(batch)
+                self.writes += 1
+                if self.metrics is not None:
+                    self.metrics.inc("dcc_peer_bytes_sent_total", len(batch), peer=self.peer)
+                await self.writer.drain()
+        except (ConnectionResetError, BrokenPipeError) as e:
+            log.warning("Não foi possível enviar mensagem para %s: %s", self.get_extra_info("peername"), e)
+            self.closed = True
+            self._queue.clear()
+            self.writer.close()
+
+    def get_extra_info(self, name, default=None):
+        return self.writer.get_extra_info(name, default)
+
+    def is_closing(self) -> bool:
+        return self.writer.is_closing()
+
+    def close(self):
+        self.closed = True
+        self._task.cancel()
+        self._queue.clear()
+        self.writer.close()
+
+    async def wait_closed(self):
+        await self.writer.wait_closed()
@@ -0,0 +1,270 @@
+import asyncio
+import random
+import socket
+import time
+
+from dcc_chat.config import (
+    DIAL_BACKOFF_BASE,
+    DIAL_BACKOFF_MAX,
+    MAX_CONCURRENT_DIALS,
+    MAX_INBOUND,
+    MAX_KNOWN_PEERS,
+    MAX_OUTBOUND,
+    PEER_STALE_SECONDS,
+    TARGET_OUTBOUND,
+)
+from dcc_chat.scheduler import wait_event
+
+# Peso de uma nova medida na média móvel do RTT.
+RTT_ALPHA = 0.3
+# Conexões que caem antes disso (s) contam como falha: em geral o outro lado
+# estava lotado e só respondeu com outros pares antes de fechar.
+MIN_UPTIME = 5.0
+
+
+class PeerInfo:
+    """O que se sabe de um par: RTT médio, falhas seguidas, quando foi visto e até quando está banido."""
+
+    def __init__(self, ip: str):
+        self.ip = ip
+        self.rtt = None
+        self.failures = 0
+        self.last_seen = None
+        self.next_dial = 0.0
+        self.direction = None
+        self.ping_sent = None
+        self.connected_at = None
+        self.banned_until = 0.0
+
+    def score(self) -> tuple:
+        """Ordem de preferência: menos falhas, depois menor RTT (desconhecido por último)."""
+        return (self.failures, self.rtt if self.rtt is not None else float("inf"))
+
+
+class PeerTable:
+    """
+    Pares conhecidos e conectados. `connected` (ip -> writer) nunca é alterado
+    no lugar: cada conexão ou desconexão publica um dicionário novo, então quem
+    só difunde mensagens pode iterar sobre `table.connected` sem lock e sem
+    copiar, vendo um retrato consistente.
+
+    Mantém os limites de conexões de entrada e de saída e escolhe quem discar
+    para chegar a `target_outbound` pares de saída: no máximo `max_dialing`
+    discagens simultâneas, com espera exponencial após cada falha.
+    """
+
+    def __init__(
+        self,
+        my_ip: str | None = None,
+        max_inbound: int = MAX_INBOUND,
+        max_outbound: int = MAX_OUTBOUND,
+        target_outbound: int = TARGET_OUTBOUND,
+        max_dialing: int = MAX_CONCURRENT_DIALS,
+        max_known: int = MAX_KNOWN_PEERS,
+        clock=time.monotonic,
+    ):
+        self.my_ip = my_ip
+        self.max_inbound = max_inbound
+        self.max_outbound = max_outbound
+        self.target_outbound = target_outbound
+        self.max_dialing = max_dialing
+        self.max_known = max_known
+        self.clock = clock
+        self.known = {}
+        self.connected = {}
+        self.dialing = set()
+        self.wakeup = asyncio.Event()
+
+    def info(self, ip: str) -> PeerInfo | None:
+        return self.known.get(ip)
+
+    def add_known(self, ip: str) -> PeerInfo | None:
+        """Registra um endereço descoberto; ignora o próprio nó."""
+        if ip == self.my_ip:
+            return None
+        info = self.known.get(ip)
+        if info is None:
+            if len(self.known) >= self.max_known and not self._evict():
+                return None
+            info = self.known[ip] = PeerInfo(ip)
+            self.wakeup.set()
+        return info
+
+    def _evict(self) -> bool:
+        """Esquece o pior par desconectado para abrir espaço na tabela."""
+        idle = [info for ip, info in self.known.items() if ip not in self.connected and ip not in self.dialing]
+        if not idle:
+            return False
+        del self.known[max(idle, key=PeerInfo.score).ip]
+        return True
+
+    def count(self, direction: str) -> int:
+        return sum(
+            1 for ip in self.connected
+            if ip in self.known and self.known[ip].direction == direction
+        )
+
+    def can_accept(self, ip: str, direction: str) -> bool:
+        """Se uma nova conexão com `ip` nessa direção cabe nos limites."""
+        if ip == self.my_ip or ip in self.connected:
+            return False
+        info = self.known.get(ip)
+        if info is not None and info.banned_until > self.clock():
+            return False
+        if direction == "in":
+            return self.count("in") < self.max_inbound
+        return self.count("out") < self.max_outbound
+
+    def keeps(self, ip: str, direction: str) -> bool:
+        """
+        Se uma segunda conexão com `ip`, nessa direção, deve substituir a atual.
+        Quando dois nós discam um para o outro ao mesmo tempo, fica a conexão
+        discada pelo menor IP; os dois lados chegam à mesma escolha sem trocar
+        nenhuma mensagem, e sobra uma única conexão por par.
+        """
+        dialer = self.my_ip if direction == "out" else ip
+        other = ip if direction == "out" else self.my_ip
+        return socket.inet_aton(dialer) < socket.inet_aton(other)
+
+    def replaces(self, ip: str, direction: str, confirmed: bool = True) -> bool:
+        """
+        Se uma nova conexão com `ip`, nessa direção, deve fechar a que já existe.
+        Na mesma direção da atual, a nova fica: o par reiniciou e a antiga está
+        meio aberta. Em direções opostas, é uma discagem simultânea e decide `keeps`.
+        Uma conexão que não vem do endereço `ip` (`confirmed` falso) pode ser de
+        qualquer um que mandou Identify com ele: só fica se a atual está calada
+        há mais de PEER_STALE_SECONDS.
+        """
+        info = self.known.get(ip)
+        if not confirmed and (info is None or info.last_seen is None or self.clock() - info.last_seen <= PEER_STALE_SECONDS):
+            return False
+        if info is not None and info.direction == direction:
+            return True
+        return self.keeps(ip, direction)
+
+    def attach(self, ip: str, writer, direction: str, rtt: float | None = None):
+        info = self.add_known(ip) or PeerInfo(ip)
+        info.direction = direction
+        info.failures = 0
+        info.last_seen = info.connected_at = self.clock()
+        if rtt is not None:
+            self.record_rtt(ip, rtt)
+        self.connected = {**self.connected, ip: writer}
+
+    def detach(self, ip: str):
+        """Remove a conexão; o par continua conhecido e pode ser discado de novo."""
+        if ip in self.connected:
+            connected = dict(self.connected)
+            del connected[ip]
+            self.connected = connected
+        info = self.known.get(ip)
+        if info is not None:
+            info.ping_sent = None
+            if info.connected_at is not None and self.clock() - info.connected_at < MIN_UPTIME:
+                self.record_failure(ip)
+            else:
+                info.next_dial = self.clock() + DIAL_BACKOFF_BASE
+            info.next_dial = max(info.next_dial, info.banned_until)
+            info.connected_at = None
+        self.wakeup.set()
+
+    def clear(self):
+        self.connected = {}
+
+    def seen(self, ip: str):
+        info = self.known.get(ip)
+        if info is not None:
+            info.last_seen = self.clock()
+
+    def record_failure(self, ip: str):
+        """Falha ao discar: a próxima tentativa espera o dobro da anterior."""
+        info = self.add_known(ip)
+        if info is None:
+            return
+        info.failures += 1
+        delay = min(DIAL_BACKOFF_BASE * 2 ** (info.failures - 1), DIAL_BACKOFF_MAX)
+        info.next_dial = self.clock() + delay
+
+    def ban(self, ip: str, seconds: float):
+        """Recusa conexões com `ip`, nas duas direções, pelos próximos `seconds` segundos."""
+        info = self.add_known(ip)
+        if info is not None:
+            info.banned_until = info.next_dial = self.clock() + seconds
+
+    def record_rtt(self, ip: str, seconds: float):
+        info = self.known.get(ip)
+        if info is None:
+            return
+        info.rtt = seconds if info.rtt is None else (1 - RTT_ALPHA) * info.rtt + RTT_ALPHA * seconds
+
+    def ping_sent(self, ip: str):
+        """Marca o envio de um PeerRequest; o PeerList de resposta mede o RTT."""
+        info = self.known.get(ip)
+        if info is not None and info.ping_sent is None:
+            info.ping_sent = self.clock()
+
+    def pong_received(self, ip: str):
+        info = self.known.get(ip)
+        if info is not None and info.ping_sent is not None:
+            self.record_rtt(ip, self.clock() - info.ping_sent)
+            info.ping_sent = None
+
+    def by_latency(self) -> list[str]:
+        """Pares conectados, do menor para o maior RTT."""
+        return sorted(
+            self.connected,
+            key=lambda ip: self.known[ip].score() if ip in self.known else (0, float("inf")),
+        )
+
+    def _slots(self) -> int:
+        return min(
+            self.target_outbound - self.count("out") - len(self.dialing),
+            self.max_dialing - len(self.dialing),
+        )
+
+    def dial_candidates(self) -> list[str]:
+        """Pares a discar agora para se aproximar do grau de saída alvo."""
+        slots = self._slots()
+        if slots <= 0:
+            return []
+        now = self.clock()
+        ready = [
+            info for ip, info in self.known.items()
+            if ip not in self.connected and ip not in self.dialing and info.next_dial <= now
+        ]
+        # Embaralhados antes: pares de mesma pontuação não atraem todos os nós ao mesmo tempo.
+        random.shuffle(ready)
+        ready.sort(key=PeerInfo.score)
+        return [info.ip for info in ready[:slots]]
+
+    def feeler(self) -> str | None:
+        """
+        Um par conhecido e ocioso, ao acaso, para uma conexão de saída além do
+        alvo (até `max_outbound`). Sem essas conexões, um nó que já atingiu o
+        alvo nunca mais disca, e os dois lados de uma partição que acabou
+        continuariam separados.
+        """
+        if self.dialing or self.count("out") >= self.max_outbound:
+            return None
+        now = self.clock()
+        ready = [
+            ip for ip, info in self.known.items()
+            if ip not in self.connected and info.next_dial <= now
+        ]
+        return random.choice(ready) if ready else None
+
+    def delay(self, default: float) -> float:
+        """Segundos até o próximo par discável (no máximo `default`)."""
+        if self._slots() <= 0:
+            return default
+        now = self.clock()
+        waits = [
+            info.next_dial - now for ip, info in self.known.items()
+            if ip not in self.connected and ip not in self.dialing
+        ]
+        return max(0.0, min(waits + [default]))
+
+    async def wait(self, default: float):
+        """Dorme até o próximo par discável ou até a tabela mudar."""
+        self.wakeup.clear()
+        await wait_event(self.wakeup, self.delay(default))
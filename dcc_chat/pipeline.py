@@ -0,0 +1,337 @@
+import asyncio
+import logging
+import struct
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from dcc_chat.chain import WINDOW, ChatChain
+from dcc_chat.config import ARCHIVE_VERIFY_BLOCK, PIPELINE_QUEUE_SIZE
+from dcc_chat.forkchoice import common_ancestor
+from dcc_chat.messages import print_chats, read_chats
+from dcc_chat.protocol import ARCHIVE_RESPONSE
+from dcc_chat.verification import InvalidChainError, first_invalid
+
+log = logging.getLogger(__name__)
+
+# Arquivos já recebidos lembrados para descartar cópias vindas de outros pares.
+MAX_SEEN = 256
+
+
+class ArchiveJob:
+    """
+    Arquivo recebido de `ip`, ainda não verificado. `chats[0]` está na altura
+    `base` da cadeia e os chats novos começam na altura `start`: num
+    ArchiveResponse os dois são 0; num ArchiveSuffix os chats antes de `start`
+    são o contexto local necessário para verificar os novos. Os `checked`
+    primeiros chats de `chats` já foram verificados na leitura.
+    """
+
+    def __init__(self, ip: str | None, chats: ChatChain, start: int = 0, base: int = 0, checked: int = 0):
+        self.ip = ip
+        self.chats = chats
+        self.start = start
+        self.base = base
+        self.checked = checked
+
+    @property
+    def height(self) -> int:
+        return self.base + len(self.chats)
+
+    @property
+    def key(self) -> tuple:
+        return (self.start, self.height, self.chats.tip)
+
+
+def _below_pruned(local: ChatChain, fork: int) -> bool:
+    """
+    Se uma troca de ramo na altura `fork` mexeria nos chats podados de `local`
+    ou na janela deles: os chats recebidos não poderiam ser verificados sobre
+    os bytes locais, que não estão mais em memória.
+    """
+    return local.base > 0 and fork < local.base + WINDOW
+
+
+class SyncPipeline:
+    """
+    Verificação e aplicação dos arquivos recebidos, fora do laço de eventos.
+    Quem lê a conexão verifica cada bloco do arquivo com `check` antes de ler o
+    próximo e entrega o arquivo com `submit`; daí ele passa por duas filas
+    limitadas:
+
+        leitura -> [decoded] -> verificação do que faltar -> [verified] -> aplicação
+
+    A verificação roda num executor (thread ou processos), então o laço de
+    eventos continua atendendo os demais pares. Um bloco com os mesmos bytes de
+    outro já verificado ou em verificação, vindo de outro par, reaproveita o
+    resultado dele. Com as filas cheias, `submit` espera, e a leitura daquele
+    par para até haver espaço. Um arquivo igual a outro já recebido (mesmo
+    início, altura e ponta) ou com a ponta de um ramo já preterido é
+    descartado antes de ser aplicado; descartar nunca adota nada, então é
+    seguro mesmo que as cópias difiram.
+    """
+
+    def __init__(self, node, queue_size: int = PIPELINE_QUEUE_SIZE, max_seen: int = MAX_SEEN):
+        self.node = node
+        self.decoded = asyncio.Queue(queue_size)
+        self.verified = asyncio.Queue(queue_size)
+        self.max_seen = max_seen
+        self.seen = OrderedDict()
+        # Blocos verificados por `check`: chave -> (cadeia, resultado).
+        self.checks = OrderedDict()
+        self.dropped = 0
+        self._executor = None
+        self._tasks = None
+
+    def _start(self):
+        if self._tasks is None:
+            self._tasks = (
+                self.node._create_task(self._verify_loop()),
+                self.node._create_task(self._commit_loop()),
+            )
+
+    async def submit(self, job: ArchiveJob) -> bool:
+        """Enfileira `job` para verificação; retorna False se ele foi descartado."""
+        local = self.node.chats
+        if job.key in self.seen or (job.height == len(local) and job.chats.tip == local.tip):
+            return self._drop("duplicate")
+        if self.node.fork_choice.is_known(job.chats.tip):
+            # Um ramo já preterido nunca volta a ganhar: a cadeia local só é
+            # trocada por outra mais longa.
+            return self._drop("known_branch")
+        self.seen[job.key] = True
+        while len(self.seen) > self.max_seen:
+            self.seen.popitem(last=False)
+        self._start()
+        await self.decoded.put(job)
+        return True
+
+    def _drop(self, reason: str) -> bool:
+        self.dropped += 1
+        self.node.metrics.inc("dcc_archives_dropped_total", reason=reason)
+        return False
+
+    async def join(self):
+        """Espera todos os arquivos enfileirados serem verificados e aplicados."""
+        await self.decoded.join()
+        await self.verified.join()
+
+    async def _verify_loop(self):
+        while True:
+            job = await self.decoded.get()
+            try:
+                await self.verify(job)
+            except InvalidChainError as e:
+                self.seen.pop(job.key, None)
+                self.node.drop_peer(job.ip, e)
+            except Exception:
+                # Uma falha do executor não pode parar a etapa: as filas encheriam
+                # e a leitura de todos os pares ficaria presa em `submit`.
+                self.seen.pop(job.key, None)
+                log.exception("Falha ao verificar o arquivo de %s", job.ip)
+            else:
+                await self.verified.put(job)
+            finally:
+                self.decoded.task_done()
+
+    async def _commit_loop(self):
+        while True:
+            job = await self.verified.get()
+            try:
+                self.commit(job)
+            except Exception:
+                self.seen.pop(job.key, None)
+                log.exception("Falha ao aplicar o arquivo de %s", job.ip)
+            finally:
+                self.verified.task_done()
+
+    async def verify(self, job: ArchiveJob):
+        """
+        Verifica os chats que não são byte a byte iguais aos já verificados na
+        cadeia local nem foram verificados na leitura. Levanta InvalidChainError
+        no primeiro inválido.
+        """
+        node = self.node
+        if job.base == 0 and job.start == 0:
+            fork = common_ancestor(node.chats, job.chats)
+            if _below_pruned(node.chats, fork):
+                # `commit` vai descartá-lo.
+                return
+            start = min(fork, node.verified.height)
+        else:
+            start = job.start - job.base
+        await self.check(job.chats, max(start, job.checked), job.base)
+
+    async def check(self, chats: ChatChain, start: int, base: int = 0):
+        """
+        Verifica no executor os chats de `chats` a partir do índice `start`;
+        `chats[0]` está na altura `base`. Levanta InvalidChainError com a altura
+        do primeiro inválido.
+        """
+        if start >= len(chats):
+            return
+        key = (base, start, len(chats), chats.tip)
+        lo = max(0, start - WINDOW)
+        entry = self.checks.get(key)
+        known = entry[0]() if entry is not None else None
+        try:
+            same = known is not None and known.view(lo, len(chats)) == chats.view(lo)
+        except IndexError:
+            same = False
+        if same and not entry[1].cancelled():
+            # Os mesmos bytes, com as mesmas janelas: o resultado é o mesmo.
+            future = entry[1]
+        else:
+            future = asyncio.ensure_future(self._first_invalid(chats, start))
+            self.checks[key] = (weakref.ref(chats), future)
+            while len(self.checks) > self.max_seen:
+                self.checks.popitem(last=False)
+        try:
+            invalid = await asyncio.shield(future)
+        except Exception:
+            if self.checks.get(key, (None, None))[1] is future:
+                del self.checks[key]
+            raise
+        if invalid is not None:
+            raise InvalidChainError(base + invalid)
+
+    async def _first_invalid(self, chats: ChatChain, start: int):
+        node = self.node
+        threshold = node.verifier.threshold
+        if threshold is not None and len(chats) - start >= threshold:
+            mode, verify = "process", node.verifier.first_invalid
+        else:
+            mode, verify = "thread", first_invalid
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dcc-verify")
+        loop = asyncio.get_running_loop()
+        with node.metrics.timer("dcc_verification_seconds", mode=mode):
+            return await loop.run_in_executor(self._executor, verify, chats, start)
+
+    def commit(self, job: ArchiveJob):
+        """
+        Aplica um arquivo verificado, se ele ainda vale diante da cadeia local
+        atual. Se a gravação da nova cadeia falhar, a cadeia local volta a ser a
+        anterior e a exceção é propagada.
+        """
+        node = self.node
+        local = node.chats
+        if job.base == 0 and job.start == 0:
+            fork = common_ancestor(local, job.chats)
+            if _below_pruned(local, fork):
+                log.info("Histórico de %s diverge antes da poda local (altura %d); ignorado.", job.ip, local.base)
+                return
+            if fork == len(job.chats) == len(local):
+                return
+            incoming = job.chats
+            if local.base:
+                # Com a cadeia local podada, só o trecho após a bifurcação é trocado.
+                incoming = local.copy()
+                incoming.truncate(fork)
+                incoming.extend(job.chats.view(fork))
+            if node.fork_choice.choose(local, incoming, fork):
+                node.chats = incoming
+                try:
+                    node.on_chain_changed(fork, job.ip)
+                except Exception:
+                    # A cadeia local continua sendo a atual, não um ramo preterido.
+                    node.chats = local
+                    node.fork_choice.forget(local.tip)
+                    raise
+                if node.show_chats and log.isEnabledFor(logging.INFO):
+                    print_chats(incoming, '', fork)
+            return
+        # Sufixo: só se encaixa se a cadeia local ainda termina no mesmo contexto.
+        context = job.start - job.base
+        if job.start != len(local) or job.base < local.base or local.view(job.base, job.start) != job.chats.view(0, context):
+            return
+        local.extend(job.chats.view(context))
+        try:
+            node.on_chain_changed(job.start, job.ip)
+        except Exception:
+            local.truncate(job.start)
+            raise
+        if node.show_chats and log.isEnabledFor(logging.INFO):
+            print_chats(local, '', job.start)
+
+    def close(self):
+        if self._tasks is not None:
+            for task in self._tasks:
+                task.cancel()
+            self._tasks = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+async def _read_checked(node, reader, count: int, chats: ChatChain, base: int = 0, local: ChatChain | None = None):
+    """
+    Lê `count` chats para o fim de `chats` em blocos de ARCHIVE_VERIFY_BLOCK e
+    verifica cada bloco no executor do pipeline antes de ler o próximo. Os
+    chats que já estavam em `chats` não são verificados, nem, com `local`, os
+    iniciais byte a byte iguais ao trecho já verificado dela. Levanta
+    InvalidChainError no primeiro chat inválido, sem ler o resto do arquivo.
+    """
+    checked = len(chats)
+    height = checked + count
+    trusted = min(node.verified.height, len(local)) if local is not None else 0
+    shared = 0
+    while checked < height:
+        await read_chats(reader, min(ARCHIVE_VERIFY_BLOCK, height - checked), chats)
+        # Abaixo da poda de `local` não há com o que comparar: o bloco é verificado.
+        if shared == checked < trusted and len(chats) > local.base:
+            shared = common_ancestor(local, chats, shared)
+        await node.pipeline.check(chats, max(checked, min(shared, trusted)), base)
+        checked = len(chats)
+
+
+async def read_archive_response(node, reader, ip=None):
+    """
+    Etapa de leitura de um ArchiveResponse: decodifica e verifica os chats bloco
+    a bloco e os entrega ao pipeline do nó. Arquivos mais curtos que a cadeia
+    local são apenas consumidos. Um arquivo inválido é recusado no primeiro
+    bloco com um chat inválido (InvalidChainError), e um par só consegue fazer
+    o nó guardar um bloco por vez sem verificação.
+    """
+    count = struct.unpack("!I", await reader.readexactly(4))[0]
+    if count < len(node.chats):
+        await read_chats(reader, count)
+        node.scheduler.observe(ip, (count, None))
+        return
+    chats = ChatChain()
+    await _read_checked(node, reader, count, chats, local=node.chats)
+    node.scheduler.observe(ip, (count, chats.tip))
+    await node.pipeline.submit(ArchiveJob(ip, chats, checked=count))
+
+
+async def read_archive_suffix(node, reader, ip=None):
+    """
+    Etapa de leitura de um ArchiveSuffix: os chats novos são decodificados e
+    verificados bloco a bloco após os 19 últimos chats locais, o contexto de
+    que a verificação precisa.
+    """
+    start, count = struct.unpack("!II", await reader.readexactly(8))
+    local = node.chats
+    if count == 0 or start > len(local) or (local.base and start - WINDOW < local.base):
+        # Nada novo, ou um sufixo que não se encaixa na cadeia local (ou na parte dela em memória).
+        await read_chats(reader, count)
+        node.scheduler.observe(ip, (start + count, None))
+        return
+    base = max(0, start - WINDOW)
+    pending = ChatChain()
+    pending.extend(local.view(base, start))
+    await _read_checked(node, reader, count, pending, base)
+    node.scheduler.observe(ip, (start + count, pending.tip))
+    await node.pipeline.submit(ArchiveJob(ip, pending, start, base, len(pending)))
+
+
+async def discard_archive(reader, msg_type: int):
+    """
+    Consome um ArchiveResponse ou ArchiveSuffix sem decodificar os chats. O
+    corpo não tem tamanho no cabeçalho, então pulá-lo exige lê-lo.
+    """
+    if msg_type == ARCHIVE_RESPONSE:
+        count = struct.unpack("!I", await reader.readexactly(4))[0]
+    else:
+        count = struct.unpack("!II", await reader.readexactly(8))[1]
+    await read_chats(reader, count)
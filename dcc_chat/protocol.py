@@ -1,8 +1,12 @@
+import asyncio
 import binascii
-import hashlib
 import socket
 import struct
 
+from dcc_chat.chain import CHAT_MIN_SIZE, ChatChain
+from dcc_chat.config import MAX_ARCHIVE_SIZE, MAX_MESSAGE_SIZE
+from dcc_chat.verification import verification_check
+
 # --- Códigos de Mensagem ---
 IDENTIFY = 0x00
 PEER_REQUEST = 0x1
@@ -10,6 +14,42 @@ PEER_LIST = 0x2
 ARCHIVE_REQUEST = 0x3
 ARCHIVE_RESPONSE = 0x4
 
+# --- Extensões opcionais, usadas apenas com pares que anunciam suporte ---
+HELLO = 0x5
+ARCHIVE_SINCE_REQUEST = 0x6
+ARCHIVE_SUFFIX = 0x7
+NEW_TIP = 0x8
+VERSION = 0x9
+
+# --- Capacidades anunciadas no Hello ---
+CAP_DELTA_SYNC = 0x01
+CAP_GOSSIP = 0x02
+CAP_HANDSHAKE = 0x04
+# Bit sempre ligado no byte de capacidades do Hello. Um nó antigo não conhece
+# o tipo 0x05 e lê esse byte como o tipo da mensagem seguinte; com o bit, ele
+# nunca é um dos tipos originais (0x00 a 0x04) e também é ignorado.
+HELLO_MARKER = 0x80
+
+# Versão do protocolo (maior, menor) trocada no Version; só a maior precisa coincidir.
+PROTOCOL_VERSION = (1, 0)
+
+# Corpo de um NewTip: altura (4) + md5 (16) + instante de origem em ms (8).
+NEW_TIP_SIZE = 28
+
+# Nomes dos tipos de mensagem, usados em logs e métricas.
+MESSAGE_NAMES = {
+    IDENTIFY: "identify",
+    PEER_REQUEST: "peer_request",
+    PEER_LIST: "peer_list",
+    ARCHIVE_REQUEST: "archive_request",
+    ARCHIVE_RESPONSE: "archive_response",
+    HELLO: "hello",
+    ARCHIVE_SINCE_REQUEST: "archive_since_request",
+    ARCHIVE_SUFFIX: "archive_suffix",
+    NEW_TIP: "new_tip",
+    VERSION: "version",
+}
+
 
 def encode_identify(ip: str):
     """Codifica uma mensagem de identificação. Formato: [0x00, IP (4 bytes)]"""
@@ -58,13 +98,19 @@ def encode_archive_request():
     return struct.pack("!B", ARCHIVE_REQUEST)
 
 
-def decode_archive_response(data: bytes) -> list[str]:
+def encode_archive_response(chats) -> bytes:
     """
-    Decodifica o corpo de uma mensagem de arquivo.
-    Espera-se que `data` contenha [N (4 bytes), IP1, ...].
+    Codifica um ArchiveResponse. Formato: [0x4, N (4 bytes), chat1, ..., chatN].
+    Para uma ChatChain o corpo é o próprio buffer da cadeia; numa cadeia podada,
+    os chats fora da memória vêm antes do `snapshot` dela.
     """
-
-def encode_archive_response(chats: dict) -> bytes:
+    if isinstance(chats, ChatChain):
+        header = struct.pack("!BI", ARCHIVE_RESPONSE, len(chats))
+        if chats.base:
+            if chats.snapshot is None:
+                raise IndexError("histórico podado sem arquivo de onde servi-lo")
+            return b"".join((header, chats.snapshot.prefix(chats.base_offset), chats.view()))
+        return b"".join((header, chats.view()))
     parts = [struct.pack("!B", ARCHIVE_RESPONSE)]
     parts.append(struct.pack("!I", len(chats)))
 
@@ -74,6 +120,268 @@ def encode_archive_response(chats: dict) -> bytes:
     #print_encoded_archive_response_with_verification(c)
     return c
 
+def encode_hello(capabilities: int) -> bytes:
+    """
+    Anuncia as extensões suportadas. Formato: [0x5, 0x80 | capacidades (7 bits)].
+    As demais capacidades só seguem no Version.
+    """
+    return struct.pack("!BB", HELLO, HELLO_MARKER | capabilities & 0x7F)
+
+
+def decode_hello(data: bytes) -> int:
+    return struct.unpack("!B", data)[0] & 0x7F
+
+
+def encode_version(version: tuple[int, int], capabilities: int) -> bytes:
+    """
+    Versão do protocolo e todas as capacidades, enviado a quem anunciou
+    CAP_HANDSHAKE no Hello. Formato: [0x9, maior (1 byte), menor (1 byte), capacidades (4 bytes)]
+    """
+    return struct.pack("!BBBI", VERSION, *version, capabilities)
+
+
+def decode_version(data: bytes):
+    """Devolve ((maior, menor), capacidades)."""
+    major, minor, capabilities = struct.unpack("!BBI", data)
+    return (major, minor), capabilities
+
+
+def encode_archive_since_request(height: int, tip) -> bytes:
+    """
+    Pede os chats após os `height` primeiros, cujo último tem md5 `tip`.
+    Formato: [0x6, altura (4 bytes), md5 (16 bytes)]
+    """
+    return struct.pack("!BI", ARCHIVE_SINCE_REQUEST, height) + (tip or bytes(16))
+
+
+def decode_archive_since_request(data: bytes):
+    height = struct.unpack("!I", data[0:4])[0]
+    return height, bytes(data[4:20])
+
+
+def encode_archive_suffix(chats: ChatChain, start: int) -> bytes:
+    """
+    Codifica os chats a partir de `start` (nenhum, se a cadeia não passa dele).
+    Formato: [0x7, início (4 bytes), N (4 bytes), chat1, ..., chatN]
+    """
+    count = max(0, len(chats) - start)
+    header = struct.pack("!BII", ARCHIVE_SUFFIX, start, count)
+    return b"".join((header, chats.view(start))) if count else header
+
+
+def encode_new_tip(height: int, tip: bytes, origin_ms: int) -> bytes:
+    """
+    Anuncia uma nova ponta de cadeia.
+    Formato: [0x8, altura (4 bytes), md5 (16 bytes), origem em ms (8 bytes)]
+    """
+    return struct.pack("!BI16sQ", NEW_TIP, height, tip, origin_ms)
+
+
+def decode_new_tip(data: bytes):
+    return struct.unpack("!I16sQ", data)
+
+
+class ArchiveDecoder:
+    """
+    Decodificador incremental do corpo de um ArchiveResponse (após o contador).
+    Recebe blocos de bytes via `feed` e devolve os chats completos como fatias
+    `memoryview` do próprio bloco, sem copiá-los.
+    """
+
+    def __init__(self, count: int):
+        self.remaining = count
+        self._leftover = b""
+
+    def bytes_needed(self) -> int:
+        """
+        Limite inferior dos bytes que ainda faltam na mensagem. Ler até esse
+        limite nunca consome bytes da mensagem seguinte.
+        """
+        if self.remaining == 0:
+            return 0
+        if self._leftover:
+            total = 1 + self._leftover[0] + 32 + (self.remaining - 1) * CHAT_MIN_SIZE
+        else:
+            total = self.remaining * CHAT_MIN_SIZE
+        return total - len(self._leftover)
+
+    def feed(self, data: bytes) -> list[memoryview]:
+        """Consome `data` e retorna os chats completos (tamanho, texto, código, md5)."""
+        chunk = self._leftover + data if self._leftover else data
+        view = memoryview(chunk)
+        records = []
+        offset = 0
+        end = len(chunk)
+        while self.remaining and offset < end:
+            size = 33 + chunk[offset]
+            if offset + size > end:
+                break
+            records.append(view[offset : offset + size])
+            offset += size
+            self.remaining -= 1
+        self._leftover = bytes(view[offset:])
+        return records
+
+
+class ProtocolError(Exception):
+    """Mensagem de tipo desconhecido ou grande demais; a conexão deve ser fechada."""
+
+
+def _count(header: bytes, at: int = 0) -> int:
+    return struct.unpack_from("!I", header, at)[0]
+
+
+# Tabela de mensagens: tamanho do cabeçalho após o tipo, tamanho do corpo em
+# função do cabeçalho e decodificador de cabeçalho + corpo. O protocolo não
+# tem prefixo de tamanho, então é daqui que sai o tamanho de cada mensagem.
+# Em ArchiveResponse e ArchiveSuffix o corpo varia com o texto de cada chat:
+# o tamanho indicado é só o mínimo, e os chats são lidos pelo tratador.
+FRAMES = {
+    IDENTIFY: (4, None, decode_identify),
+    PEER_REQUEST: (0, None, None),
+    PEER_LIST: (4, lambda header: 4 * _count(header), decode_peer_list),
+    ARCHIVE_REQUEST: (0, None, None),
+    ARCHIVE_RESPONSE: (4, lambda header: CHAT_MIN_SIZE * _count(header), None),
+    HELLO: (1, None, decode_hello),
+    ARCHIVE_SINCE_REQUEST: (20, None, decode_archive_since_request),
+    ARCHIVE_SUFFIX: (8, lambda header: CHAT_MIN_SIZE * _count(header, 4), None),
+    NEW_TIP: (NEW_TIP_SIZE, None, decode_new_tip),
+    VERSION: (6, None, decode_version),
+}
+# Mensagens cujo corpo é lido pelo tratador, à medida que chega.
+STREAMED = frozenset({ARCHIVE_RESPONSE, ARCHIVE_SUFFIX})
+# Bytes pedidos ao socket por leitura.
+READ_CHUNK = 1 << 16
+
+
+class FrameReader:
+    """
+    Leitor de mensagens de uma conexão. Lê do socket em blocos de `chunk`
+    bytes para um único buffer, reaproveitado entre mensagens, de onde as
+    mensagens são recortadas: várias mensagens pequenas chegam com uma só
+    leitura. `read_frame` devolve (tipo, valor decodificado); para
+    ArchiveResponse e ArchiveSuffix o valor é o próprio leitor, do qual o
+    tratador lê os chats com `readexactly` enquanto os verifica.
+
+    Antes de ler o corpo, o tamanho declarado no cabeçalho é comparado com
+    `max_size` (ou `max_archive_size`): um PeerList com 2^32 pares é recusado
+    com ProtocolError sem alocar nada. Um tipo desconhecido também levanta
+    ProtocolError, pois sem prefixo de tamanho não há como pular a mensagem.
+    """
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        max_size: int = MAX_MESSAGE_SIZE,
+        max_archive_size: int = MAX_ARCHIVE_SIZE,
+        chunk: int = READ_CHUNK,
+    ):
+        self.reader = reader
+        self.max_size = max_size
+        self.max_archive_size = max_archive_size
+        self.chunk = chunk
+        self._buf = bytearray()
+        self._pos = 0
+        self._budget = None
+
+    @property
+    def buffered(self) -> int:
+        return len(self._buf) - self._pos
+
+    async def _fill(self, n: int):
+        """Garante `n` bytes no buffer."""
+        while len(self._buf) - self._pos < n:
+            if self._pos:
+                del self._buf[: self._pos]
+                self._pos = 0
+            data = await self.reader.read(max(self.chunk, n - len(self._buf)))
+            if not data:
+                raise asyncio.IncompleteReadError(bytes(self._buf), n)
+            self._buf += data
+
+    def _take(self, n: int) -> bytes:
+        if self._budget is not None:
+            self._budget -= n
+            if self._budget < 0:
+                raise ProtocolError("mensagem maior que o limite")
+        data = bytes(self._buf[self._pos : self._pos + n])
+        self._pos += n
+        return data
+
+    async def readexactly(self, n: int) -> bytes:
+        await self._fill(n)
+        return self._take(n)
+
+    async def read_frame(self):
+        """Lê a próxima mensagem completa e retorna (tipo, valor)."""
+        self._budget = None
+        if self._pos >= len(self._buf):
+            await self._fill(1)
+        msg_type = self._buf[self._pos]
+        spec = FRAMES.get(msg_type)
+        if spec is None:
+            raise ProtocolError(f"tipo de mensagem desconhecido: {msg_type}")
+        header_size, body_size, decoder = spec
+        size = 1 + header_size
+        if body_size is not None:
+            if len(self._buf) - self._pos < size:
+                await self._fill(size)
+            size += body_size(self._buf[self._pos + 1 : self._pos + size])
+            limit = self.max_archive_size if msg_type in STREAMED else self.max_size
+            if size > limit:
+                raise ProtocolError(f"mensagem do tipo {msg_type} com {size} bytes excede o limite de {limit}")
+            if msg_type in STREAMED:
+                self._budget = limit - 1
+                self._pos += 1
+                return msg_type, self
+        if len(self._buf) - self._pos < size:
+            await self._fill(size)
+        start = self._pos + 1
+        self._pos += size
+        if decoder is None:
+            return msg_type, None
+        return msg_type, decoder(self._buf[start : self._pos])
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self.read_frame()
+        except asyncio.IncompleteReadError as e:
+            if e.partial or self.buffered:
+                raise
+            raise StopAsyncIteration
+
+
+class ArchiveCache:
+    """
+    Guarda o último ArchiveResponse codificado. Ele só é refeito quando a cadeia
+    muda, e o mesmo objeto `bytes` é compartilhado por todos os envios. O de
+    uma cadeia podada não é guardado: ocuparia a memória que a poda liberou.
+    """
+
+    def __init__(self):
+        self._chats = None
+        self._version = None
+        self._encoded = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, chats: ChatChain) -> bytes:
+        if chats.base:
+            self._chats = self._encoded = None
+            self.misses += 1
+            return encode_archive_response(chats)
+        if chats is not self._chats or chats.version != self._version:
+            self._encoded = encode_archive_response(chats)
+            self._chats = chats
+            self._version = chats.version
+            self.misses += 1
+        else:
+            self.hits += 1
+        return self._encoded
+
 def print_encoded_archive_response_with_verification(encoded: bytes):
     offset = 0
 
@@ -119,19 +427,7 @@ def print_encoded_archive_response_with_verification(encoded: bytes):
             print("✅ Primeiro chat (válido por definição)")
         else:
             range_start = max(0, i - 19)
-            valid = verification_check2(chat, chats, range(range_start, i))
+            valid = verification_check(chat, chats, range(range_start, i))
             print(f"🛡️  Verificação de integridade: {'✔️ Válido' if valid else '❌ Inválido'}")
             print(f"📍 Usou os chats de {range_start + 1} até {i}")
         print("-" * 60)
-
-def verification_check2(chat, chats_before, range):
-    
-    bytes_s = b''
-    for i in range:
-        bytes_s += b''.join(chats_before[i].values())
-    
-    md5 = b'\x11' * 16
-    message = chat["length"] + chat["text"] + chat["verification_code"]
-    S = bytes_s + message
-    md5 = hashlib.md5(S).digest()
-    return True if chat["md5"] == md5 else False
\ No newline at end of file
@@ -0,0 +1,75 @@
+import time
+
+from dcc_chat.config import MISBEHAVIOR_DECAY, MISBEHAVIOR_TOLERANCE, RATE_LIMITS
+from dcc_chat.protocol import ProtocolError
+
+
+class RateLimitExceeded(ProtocolError):
+    """Par que passou do limite de mensagens e deve ser desconectado."""
+
+
+class TokenBucket:
+    """Balde de fichas: `rate` fichas por segundo, acumuladas até `burst`."""
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def take(self, now: float, cost: float = 1.0) -> bool:
+        """Gasta `cost` fichas, se houver; retorna se havia."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
+
+
+class RateLimiter:
+    """
+    Limite das mensagens recebidas de cada par, com um balde de fichas por par
+    e por tipo (`limits`: nome do tipo -> (por segundo, rajada)). Uma mensagem
+    acima do limite deve ser descartada e conta como falta. Cada par tem direito
+    a `tolerance` faltas, recuperadas a uma por `decay` segundos; passar disso
+    levanta RateLimitExceeded.
+    """
+
+    def __init__(
+        self,
+        limits: dict = RATE_LIMITS,
+        tolerance: int = MISBEHAVIOR_TOLERANCE,
+        decay: float = MISBEHAVIOR_DECAY,
+        clock=time.monotonic,
+    ):
+        self.limits = limits
+        self.tolerance = tolerance
+        self.decay = decay
+        self.clock = clock
+        self.buckets = {}
+        self.faults = {}
+
+    def allow(self, ip: str, name: str) -> bool:
+        """Se a mensagem `name` de `ip` cabe no limite; levanta RateLimitExceeded se o par abusou."""
+        limit = self.limits.get(name)
+        if limit is None:
+            return True
+        now = self.clock()
+        bucket = self.buckets.get((ip, name))
+        if bucket is None:
+            bucket = self.buckets[(ip, name)] = TokenBucket(*limit, now)
+        if bucket.take(now):
+            return True
+        faults = self.faults.get(ip)
+        if faults is None:
+            faults = self.faults[ip] = TokenBucket(1 / self.decay, self.tolerance, now)
+        if not faults.take(now):
+            raise RateLimitExceeded(f"{name} acima do limite de taxa")
+        return False
+
+    def forget(self, ip: str):
+        """Descarta os baldes de um par desconectado."""
+        self.faults.pop(ip, None)
+        for key in [key for key in self.buckets if key[0] == ip]:
+            del self.buckets[key]
@@ -0,0 +1,145 @@
+import asyncio
+import random
+import time
+
+from dcc_chat.config import PEER_REQUEST_INTERVAL, SYNC_BACKOFF, SYNC_JITTER, SYNC_MAX_INTERVAL, SYNC_REQUESTS_PER_SECOND
+
+
+class PeerSchedule:
+    """Estado de sincronização de um par: intervalo atual, próximo envio e última ponta vista."""
+
+    def __init__(self, interval: float, due: float):
+        self.interval = interval
+        self.due = due
+        self.tip = None
+
+
+class SyncScheduler:
+    """
+    Agenda das sincronizações periódicas, uma por par. Enquanto a ponta
+    informada por um par não muda, o intervalo dele dobra (até `max_interval`);
+    uma ponta nova, um chat local ou uma conexão nova o levam de volta a
+    `min_interval`. Cada intervalo recebe um ruído de ±`jitter` para que os
+    pares não sincronizem todos no mesmo instante, e um balde de fichas limita
+    o total de requisições por segundo. Cada sincronização custa `cost` fichas.
+
+    O relógio e o gerador aleatório podem ser trocados, o que permite simular
+    a agenda sem esperar o tempo real (ver benchmarks/scheduler.py).
+    """
+
+    def __init__(
+        self,
+        min_interval: float = PEER_REQUEST_INTERVAL,
+        max_interval: float = SYNC_MAX_INTERVAL,
+        backoff: float = SYNC_BACKOFF,
+        jitter: float = SYNC_JITTER,
+        rate: float = SYNC_REQUESTS_PER_SECOND,
+        cost: int = 2,
+        clock=time.monotonic,
+        rng=None,
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.rate = rate
+        self.cost = cost
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.peers = {}
+        self.tokens = float(max(rate, cost))
+        self._refilled = clock()
+        self.wakeup = asyncio.Event()
+        self.sent = 0
+
+    def _jittered(self, interval: float) -> float:
+        return interval * self.rng.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _refill(self, now: float):
+        self.tokens = min(max(self.rate, self.cost), self.tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def add(self, ip: str):
+        """Par recém-conectado: a primeira sincronização periódica vem logo."""
+        self.peers[ip] = PeerSchedule(self.min_interval, self.clock() + self._jittered(self.min_interval))
+        self.wakeup.set()
+
+    def remove(self, ip: str):
+        self.peers.pop(ip, None)
+
+    def observe(self, ip: str, tip):
+        """Registra a ponta informada por `ip`; se não mudou, o intervalo do par cresce."""
+        schedule = self.peers.get(ip)
+        if schedule is None:
+            return
+        if tip == schedule.tip:
+            self.idle(ip)
+            return
+        schedule.tip = tip
+        self._speed_up(schedule)
+
+    def idle(self, ip: str):
+        """Nada novo do par nesta rodada: o intervalo dele cresce."""
+        schedule = self.peers.get(ip)
+        if schedule is not None:
+            schedule.interval = min(schedule.interval * self.backoff, self.max_interval)
+
+    def kick(self, ip: str | None = None):
+        """Volta ao intervalo mínimo para `ip` ou, sem ele, para todos os pares."""
+        for peer, schedule in self.peers.items():
+            if ip is None or peer == ip:
+                self._speed_up(schedule)
+
+    def _speed_up(self, schedule: PeerSchedule):
+        schedule.interval = self.min_interval
+        due = self.clock() + self._jittered(self.min_interval)
+        if due < schedule.due:
+            schedule.due = due
+            self.wakeup.set()
+
+    def delay(self) -> float:
+        """Segundos até a próxima sincronização possível (`max_interval` sem pares)."""
+        if not self.peers:
+            return self.max_interval
+        now = self.clock()
+        wait = min(schedule.due for schedule in self.peers.values()) - now
+        self._refill(now)
+        if self.tokens < self.cost:
+            wait = max(wait, (self.cost - self.tokens) / self.rate)
+        return max(wait, 0.0)
+
+    def pop_due(self) -> list[str]:
+        """
+        Pares a sincronizar agora, dos mais atrasados aos mais recentes, até onde
+        o orçamento permitir; os demais continuam vencidos para a próxima rodada.
+        """
+        now = self.clock()
+        self._refill(now)
+        due = sorted((s.due, ip) for ip, s in self.peers.items() if s.due <= now)
+        ready = []
+        for _, ip in due:
+            if self.tokens < self.cost:
+                break
+            self.tokens -= self.cost
+            schedule = self.peers[ip]
+            schedule.due = now + self._jittered(schedule.interval)
+            ready.append(ip)
+        self.sent += len(ready) * self.cost
+        return ready
+
+    async def wait(self):
+        """Dorme até a próxima sincronização ou até a agenda mudar."""
+        self.wakeup.clear()
+        await wait_event(self.wakeup, self.delay())
+
+
+async def wait_event(event: asyncio.Event, timeout: float):
+    """
+    Espera `event` por até `timeout` segundos. Ao contrário de
+    `asyncio.wait_for`, nunca engole um cancelamento que chegue junto com o evento.
+    """
+    handle = asyncio.get_running_loop().call_later(timeout, event.set)
+    try:
+        await event.wait()
+    finally:
+        handle.cancel()
@@ -0,0 +1,97 @@
+import mmap
+import os
+import struct
+
+from dcc_chat.chain import ChatChain
+from dcc_chat.verification import first_invalid
+
+# Checkpoint: altura verificada (8 bytes) + md5 do último chat verificado (16 bytes).
+CHECKPOINT_FORMAT = "!Q16s"
+
+
+class ChainStore:
+    """
+    Arquivo append-only com os chats no formato do fio, acompanhado de um
+    checkpoint (`<arquivo>.ckpt`) com a altura já verificada. Na inicialização
+    o arquivo é mapeado em memória e só os chats após o checkpoint são verificados.
+    """
+
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = path
+        self.checkpoint_path = path + ".ckpt"
+        self.fsync = fsync
+        self.height = 0
+        self._file = None
+
+    def _read_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, "rb") as f:
+                return struct.unpack(CHECKPOINT_FORMAT, f.read())
+        except (OSError, struct.error):
+            return 0, b""
+
+    def _write_checkpoint(self, chats: ChatChain):
+        """Grava o checkpoint de forma atômica (arquivo temporário + rename)."""
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(struct.pack(CHECKPOINT_FORMAT, len(chats), chats.tip or bytes(16)))
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, self.checkpoint_path)
+
+    def load(self) -> ChatChain:
+        """
+        Carrega a cadeia do disco. Um chat final escrito pela metade é cortado,
+        e a cadeia é truncada no primeiro chat inválido após o checkpoint.
+        """
+        self._file = open(self.path, "a+b")
+        size = os.fstat(self._file.fileno()).st_size
+        if size == 0:
+            chats = ChatChain()
+        else:
+            with mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                chats = ChatChain.from_buffer(mm)
+
+        height, tip = self._read_checkpoint()
+        trusted = 0 < height <= len(chats) and chats.md5(height - 1) == tip
+        invalid = first_invalid(chats, height if trusted else 1)
+        if invalid is not None:
+            chats.truncate(invalid)
+
+        if chats.nbytes != size:
+            self._file.truncate(chats.nbytes)
+        self.height = len(chats)
+        self._write_checkpoint(chats)
+        return chats
+
+    def sync(self, chats: ChatChain, start: int):
+        """
+        Grava `chats` sabendo que os chats antes de `start` não mudaram. Em uma
+        troca de ramo o arquivo é cortado na altura `start` antes de acrescentar.
+        """
+        if self._file is None:
+            self._file = open(self.path, "a+b")
+        start = min(start, self.height, len(chats))
+        if start < self.height:
+            self._file.truncate(chats.offset(start))
+            # Se a escrita abaixo falhar, a próxima gravação recomeça daqui.
+            self.height = start
+        self._file.write(chats.view(start))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.height = len(chats)
+        self._write_checkpoint(chats)
+
+    def prefix(self, nbytes: int) -> bytes:
+        """
+        Os primeiros `nbytes` do arquivo: de onde saem, no modo de poda, os
+        chats que já não estão na memória quando um par pede o histórico inteiro.
+        """
+        return os.pread(self._file.fileno(), nbytes, 0)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+from collections import deque
+
+from dcc_chat.config import MAX_BATCH_CHATS, MAX_BATCH_SECONDS
+from dcc_chat.messages import encode_text, send_to_chats_to_all_peers
+from dcc_chat.mining import MiningCancelled
+
+log = logging.getLogger(__name__)
+
+
+class ChatSubmitter:
+    """
+    Fila de chats a publicar por um nó. `submit` devolve na hora um futuro com
+    a altura do chat na cadeia, resolvido quando ele for publicado.
+
+    Como cada chat depende do md5 do anterior, a mineração é sequencial, mas
+    sem pausas: o chat seguinte começa a ser minerado assim que o anterior é
+    acrescentado à cadeia local. Os pares são avisados com um único anúncio
+    por lote, quando a fila esvazia ou o lote chega a `max_batch` chats ou
+    `max_delay` segundos.
+
+    Se uma ponta de outro nó for adotada durante o lote, a mineração em curso
+    é abortada, e os chats do lote que ficaram fora da nova cadeia voltam para
+    o início da fila, para serem minerados de novo sobre ela.
+    """
+
+    def __init__(self, node, max_batch: int = MAX_BATCH_CHATS, max_delay: float = MAX_BATCH_SECONDS):
+        self.node = node
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = deque()
+        self.wakeup = asyncio.Event()
+        self.batches = 0
+        self.aborted = 0
+        self._cancel = None
+        self._task = None
+
+    def submit(self, text: str) -> asyncio.Future:
+        partial = encode_text(text)
+        future = asyncio.get_running_loop().create_future()
+        self.queue.append((partial, future))
+        if self._task is None:
+            self._task = self.node._create_task(self._run())
+        self.wakeup.set()
+        return future
+
+    def competing_tip(self):
+        """A cadeia local mudou por causa de outro nó: o chat em mineração perde a base."""
+        if self._cancel is not None:
+            self._cancel.set()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            batch = []
+            while self.queue:
+                partial, future = self.queue[0]
+                if future.cancelled():
+                    self.queue.popleft()
+                    continue
+                chats = self.node.chats
+                height = len(chats)
+                self._cancel = asyncio.Event()
+                try:
+                    code, md5 = await self.node.miner.mine(bytes(chats.tail()), partial, self._cancel)
+                except MiningCancelled:
+                    code = None
+                except Exception as e:
+                    self.queue.popleft()
+                    if not future.done():
+                        future.set_exception(e)
+                    continue
+                finally:
+                    self._cancel = None
+                if code is None or self.node.chats is not chats or len(chats) != height:
+                    self.aborted += 1
+                    batch = self._requeue_orphans(batch)
+                    continue
+                chats.append_record(partial + code + md5)
+                self.queue.popleft()
+                if not batch:
+                    started = loop.time()
+                batch.append((partial, future, height, md5))
+                if len(batch) >= self.max_batch or loop.time() - started >= self.max_delay:
+                    self._publish(batch)
+                    batch = []
+            if batch:
+                self._publish(batch)
+
+    def _requeue_orphans(self, batch: list) -> list:
+        """Devolve à fila os chats do lote que não estão mais na cadeia local."""
+        chats = self.node.chats
+        for idx, (_, _, height, md5) in enumerate(batch):
+            if height >= len(chats) or (height >= chats.base and chats.md5(height) != md5):
+                self.queue.extendleft((partial, future) for partial, future, _, _ in reversed(batch[idx:]))
+                return batch[:idx]
+        return batch
+
+    def _publish(self, batch: list):
+        node = self.node
+        self.batches += 1
+        node.on_chain_changed(batch[0][2])
+        node._create_task(send_to_chats_to_all_peers(node))
+        log.info("%d chat(s) publicados até a altura %d", len(batch), len(node.chats))
+        for _, future, height, _ in batch:
+            if not future.done():
+                future.set_result(height)
+
+    def close(self):
+        """Cancela os chats ainda não publicados."""
+        while self.queue:
+            _, future = self.queue.popleft()
+            future.cancel()
@@ -0,0 +1,284 @@
+import ctypes
+import ctypes.util
+import hashlib
+import os
+from array import array
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from dcc_chat.chain import WINDOW
+from dcc_chat.config import PARALLEL_VERIFY_THRESHOLD, VERIFY_KERNEL
+
+# Quantidade mínima de chats por segmento enviado a um processo.
+MIN_SEGMENT = 4096
+# Quantidade de chats por lote entregue a uma thread do kernel "threads".
+THREAD_BATCH = 2048
+
+
+class InvalidChainError(Exception):
+    """Cadeia recebida com um chat cujo hash não confere."""
+
+    def __init__(self, index: int):
+        super().__init__(f"chat #{index + 1} inválido")
+        self.index = index
+
+
+def verification_check(chat, chats_before, range):
+    """Verificação original, chat a chat sobre dicionários; referência dos kernels."""
+    bytes_s = b''.join(b''.join(chats_before[i].values()) for i in range)
+    message = chat["length"] + chat["text"] + chat["verification_code"]
+    return hashlib.md5(bytes_s + message).digest() == chat["md5"]
+
+
+def hashlib_kernel(buf, offsets, start: int, stop: int):
+    """
+    Kernel de verificação: recebe a cadeia inteira no formato do fio (`buf`) e
+    seus offsets, e retorna o primeiro chat inválido em [start, stop), ou None.
+    Cada janela de 20 chats é uma fatia de `buf`, sem cópia nem junção de bytes.
+    """
+    md5 = hashlib.md5
+    for idx in range(start, stop):
+        end = offsets[idx + 1]
+        if md5(buf[offsets[idx - WINDOW if idx > WINDOW else 0] : end - 16]).digest() != buf[end - 16 : end]:
+            return idx
+    return None
+
+
+class OpenSSLKernel:
+    """
+    O mesmo kernel chamando o MD5 da libcrypto via ctypes. A chamada solta o
+    GIL, o que o hashlib só faz com entradas de 2 KiB ou mais; por isso é o
+    kernel usado pelas threads quando a biblioteca existe. Buffers somente
+    leitura não têm endereço para o ctypes e caem no hashlib.
+    """
+
+    def __init__(self, path: str | None = None):
+        path = path or ctypes.util.find_library("crypto")
+        if path is None:
+            raise OSError("libcrypto não encontrada")
+        self._md5 = ctypes.CDLL(path).MD5
+        self._md5.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_void_p]
+        self._md5.restype = ctypes.c_void_p
+
+    def __call__(self, buf, offsets, start: int, stop: int):
+        if start >= stop or buf.readonly:
+            return hashlib_kernel(buf, offsets, start, stop)
+        md5 = self._md5
+        out = ctypes.create_string_buffer(16)
+        raw = ctypes.c_char.from_buffer(buf)
+        try:
+            base = ctypes.addressof(raw)
+            for idx in range(start, stop):
+                first, end = offsets[idx - WINDOW if idx > WINDOW else 0], offsets[idx + 1]
+                md5(base + first, end - 16 - first, out)
+                if out.raw != buf[end - 16 : end]:
+                    return idx
+            return None
+        finally:
+            # Libera a exportação do buffer antes que a cadeia volte a crescer.
+            del raw
+
+
+class ThreadedKernel:
+    """
+    Divide [start, stop) em lotes de `batch` chats verificados por um pool de
+    threads. Só há paralelismo se o kernel de cada lote soltar o GIL.
+    """
+
+    def __init__(self, kernel=hashlib_kernel, workers: int | None = None, batch: int = THREAD_BATCH):
+        self.kernel = kernel
+        self.workers = workers or os.cpu_count() or 1
+        self.batch = batch
+        self._executor = None
+
+    def __call__(self, buf, offsets, start: int, stop: int):
+        if stop - start <= self.batch or self.workers == 1:
+            return self.kernel(buf, offsets, start, stop)
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="verify")
+        futures = [
+            self._executor.submit(self.kernel, buf, offsets, a, min(a + self.batch, stop))
+            for a in range(start, stop, self.batch)
+        ]
+        try:
+            # Em ordem: o primeiro lote com um chat inválido dá a resposta.
+            for fut in futures:
+                invalid = fut.result()
+                if invalid is not None:
+                    return invalid
+            return None
+        finally:
+            for fut in futures:
+                fut.cancel()
+            wait(futures)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def _fastest_single_kernel():
+    try:
+        return OpenSSLKernel()
+    except (OSError, AttributeError):
+        return hashlib_kernel
+
+
+def make_kernel(name: str):
+    """Cria o kernel `name`: "hashlib", "openssl" ou "threads"."""
+    if name == "hashlib":
+        return hashlib_kernel
+    if name == "openssl":
+        return OpenSSLKernel()
+    if name == "threads":
+        return ThreadedKernel(_fastest_single_kernel())
+    raise ValueError(f"kernel de verificação desconhecido: {name}")
+
+
+_kernel = None
+
+
+def get_kernel():
+    """Kernel usado por `first_invalid`, criado na primeira verificação a partir de VERIFY_KERNEL."""
+    global _kernel
+    if _kernel is None:
+        _kernel = make_kernel(VERIFY_KERNEL)
+    return _kernel
+
+
+def set_kernel(kernel):
+    """Troca o kernel padrão (um nome de `make_kernel` ou um chamável)."""
+    global _kernel
+    _kernel = make_kernel(kernel) if isinstance(kernel, str) else kernel
+
+
+def first_invalid(chats, start: int = 1, stop: int | None = None, kernel=None):
+    """
+    Retorna o índice do primeiro chat inválido em [start, stop), ou None. Numa
+    cadeia podada, só os chats com a janela inteira em memória são verificados.
+    """
+    base = chats.base
+    stop = len(chats) if stop is None else stop
+    start = max(start, base + WINDOW if base else 1)
+    if start >= stop:
+        return None
+    with chats.view() as buf:
+        invalid = (kernel or get_kernel())(buf, chats.offsets, start - base, stop - base)
+    return None if invalid is None else base + invalid
+
+
+class VerifiedPrefix:
+    """Altura e md5 da ponta da parte da cadeia local já verificada."""
+
+    def __init__(self):
+        self.height = 0
+        self.tip = None
+
+    def update(self, chats):
+        """Marca toda a cadeia `chats` (uma ChatChain) como verificada."""
+        self.height = len(chats)
+        self.tip = chats.tip
+
+
+def _verify_segment(name: str, buf_size: int, count: int, start: int, stop: int):
+    """
+    Executado nos processos do pool: verifica os chats [start, stop) de uma
+    cadeia publicada em memória compartilhada como [buffer | offsets].
+    """
+    from multiprocessing import shared_memory
+
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        buf = shm.buf[:buf_size]
+        offsets = shm.buf[buf_size : buf_size + 8 * (count + 1)].cast("Q")
+        try:
+            return hashlib_kernel(buf, offsets, start, stop)
+        finally:
+            offsets.release()
+            buf.release()
+    finally:
+        shm.close()
+
+
+class ParallelVerifier:
+    """
+    Verificação de cadeias grandes em paralelo. Os chats a verificar, com a
+    janela antes do primeiro, são copiados uma única vez para memória
+    compartilhada e cada processo verifica um segmento deles. `threshold` é a
+    menor quantidade de chats que compensa mandar para cá, ou None com um só
+    processo.
+    """
+
+    def __init__(self, workers: int | None = None, min_segment: int = MIN_SEGMENT, threshold: int = PARALLEL_VERIFY_THRESHOLD):
+        self.workers = workers or os.cpu_count() or 1
+        self.min_segment = min_segment
+        # O ganho é a fração (w - 1)/w do tempo serial e a cópia para a memória
+        # compartilhada custa o mesmo: com menos processos, só compensa com mais chats.
+        self.threshold = threshold * self.workers // (self.workers - 1) if self.workers > 1 else None
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            # Importado só aqui: o pool de processos pesa no início do nó.
+            from concurrent.futures import ProcessPoolExecutor
+
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def first_invalid(self, chats, start: int = 1):
+        """Mesmo resultado de `first_invalid(chats, start)`, calculado em paralelo."""
+        start = max(start, 1)
+        count = len(chats)
+        if self.workers < 2 or count - start <= self.min_segment or chats.base:
+            return first_invalid(chats, start)
+
+        segment = max(self.min_segment, -(-(count - start) // (self.workers * 4)))
+        # Só a partir da janela do primeiro chat verificado, com offsets relativos a ela.
+        lo = max(0, start - WINDOW)
+        cut = chats.offsets[lo]
+        offsets = chats.offsets[lo:]
+        if cut:
+            offsets = array("Q", (offset - cut for offset in offsets))
+        offsets = offsets.tobytes()
+        buf_size = chats.nbytes - cut
+        from multiprocessing import shared_memory
+
+        shm = shared_memory.SharedMemory(create=True, size=buf_size + len(offsets))
+        try:
+            shm.buf[:buf_size] = chats.view(lo)
+            shm.buf[buf_size : buf_size + len(offsets)] = offsets
+            executor = self._get_executor()
+            pending = {
+                executor.submit(_verify_segment, shm.name, buf_size, count - lo, a - lo, min(a + segment, count) - lo): a
+                for a in range(start, count, segment)
+            }
+            best = None
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    pending.pop(fut)
+                    invalid = fut.result()
+                    if invalid is not None and (best is None or lo + invalid < best):
+                        best = lo + invalid
+                if best is not None:
+                    # Segmentos posteriores ao primeiro inválido não mudam a resposta.
+                    for fut, a in list(pending.items()):
+                        if a > best and fut.cancel():
+                            pending.pop(fut)
+            return best
+        except BrokenProcessPool:
+            # Um processo do pool morreu e o pool não serve mais: a próxima
+            # cadeia grande cria outro, e esta é verificada aqui mesmo.
+            self.close()
+            return first_invalid(chats, start)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
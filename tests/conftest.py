@@ -0,0 +1,24 @@
+import struct
+
+import pytest
+
+from dcc_chat.chain import ChatChain
+from dcc_chat.mining import mine_batch
+
+
+def mine_chain(texts, chats=None):
+    """Minera, no próprio processo, chats com os textos dados ao fim de `chats`."""
+    chats = chats.copy() if chats is not None else ChatChain()
+    for text in texts:
+        partial = struct.pack("!B", len(text)) + text.encode("ascii")
+        prefix = bytes(chats.tail())
+        code = None
+        while code is None:
+            code, md5, _ = mine_batch(prefix, partial, b"\x00" * 8, 1 << 22)
+        chats.append_record(partial + code + md5)
+    return chats
+
+
+@pytest.fixture
+def make_chain():
+    return mine_chain
@@ -0,0 +1,76 @@
+import struct
+
+import pytest
+
+from dcc_chat.chain import ChatChain
+from dcc_chat.forkchoice import common_ancestor
+from dcc_chat.protocol import encode_archive_response
+
+
+def _chats(n):
+    chats = {}
+    for i in range(n):
+        text = f"chat {i}".encode("ascii")
+        chats[i] = {
+            "length": struct.pack("!B", len(text)), "text": text,
+            "verification_code": bytes([i % 256]) * 16, "md5": bytes([(i + 1) % 256]) * 16,
+        }
+    return chats
+
+
+def test_chain_encodes_like_dict():
+    """Testa se o ArchiveResponse da ChatChain é idêntico ao do dicionário."""
+    chats = _chats(30)
+    chain = ChatChain.from_chats(chats.values())
+    assert len(chain) == 30
+    assert encode_archive_response(chain) == encode_archive_response(chats)
+    assert chain[5] == chats[5]
+    assert chain[-1] == chats[29]
+    assert chain.tip == chats[29]["md5"]
+
+
+def test_chain_window_covers_previous_19():
+    """Testa se a janela do chat i são os 19 anteriores mais o chat i sem o md5."""
+    chats = _chats(30)
+    chain = ChatChain.from_chats(chats.values())
+    for idx in (0, 1, 19, 20, 29):
+        expected = b"".join(b"".join(chats[i].values()) for i in range(max(0, idx - 19), idx))
+        expected += chats[idx]["length"] + chats[idx]["text"] + chats[idx]["verification_code"]
+        assert bytes(chain.window(idx)) == expected
+    assert bytes(chain.tail()) == b"".join(b"".join(chats[i].values()) for i in range(11, 30))
+
+
+def test_chain_truncate_and_validation():
+    """Testa o descarte de chats e a rejeição de registros inconsistentes."""
+    chain = ChatChain.from_chats(_chats(10).values())
+    chain.truncate(4)
+    assert len(chain) == 4
+    assert chain == ChatChain.from_chats(_chats(4).values())
+    with pytest.raises(ValueError):
+        chain.append_record(b"\x05abc" + b"\x00" * 32)
+    with pytest.raises(IndexError):
+        chain.md5(4)
+
+
+def test_pruned_chain_keeps_absolute_heights():
+    """Testa se a cadeia podada mantém alturas, offsets e janelas dos chats em memória."""
+    full = ChatChain.from_chats(_chats(50).values())
+    chain = full.copy()
+    chain.prune(20)
+    assert (len(chain), chain.base, chain.tip) == (50, 20, full.tip)
+    assert chain[20] == full[20]
+    assert chain.offset(30) == full.offset(30) and chain.nbytes == full.nbytes
+    assert bytes(chain.view()) == bytes(full.view(20))
+    assert bytes(chain.window(45)) == bytes(full.window(45))
+    for read in (lambda: chain.record(19), lambda: chain.window(25), lambda: chain.view(0)):
+        with pytest.raises(IndexError):
+            read()
+
+    assert common_ancestor(chain, full) == 50
+    other = full.copy()
+    other.truncate(40)
+    for _ in range(3):
+        other.append(b"\x01", b"y", bytes(16), bytes(16))
+    assert common_ancestor(chain, other) == 40
+    chain.truncate(45)
+    assert len(chain) == 45 and chain.tip == full.md5(44)
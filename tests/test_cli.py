@@ -0,0 +1,57 @@
+import os
+import signal
+import subprocess
+import sys
+
+from dcc_chat import config
+from dcc_chat.cli import detect_local_ip, parse_args
+from dcc_chat.connection import P2PNode
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+
+def test_args_override_environment_and_config():
+    """Testa a precedência: linha de comando, depois DCC_*, depois config.py."""
+    env = {"DCC_IP": "10.0.0.1", "DCC_PORT": "6000", "DCC_HEADLESS": "1", "DCC_LOG_LEVEL": "warning"}
+
+    args = parse_args([], env)
+    assert (args.ip, args.bootstrap, args.port, args.headless) == ("10.0.0.1", None, 6000, True)
+    assert args.log_level == "WARNING"
+    assert args.metrics_port == config.METRICS_PORT
+
+    args = parse_args(["10.0.0.2", "bootstrap.example", "--port", "7000"], env)
+    assert (args.ip, args.bootstrap, args.port) == ("10.0.0.2", "bootstrap.example", 7000)
+
+    assert parse_args([], {}).port == config.PORT
+    assert parse_args(["--peer-port", "7001"], env).peer_port == 7001
+    assert parse_args([], env).peer_port is None
+
+
+def test_ephemeral_listen_port_is_not_dialed():
+    """Testa se, escutando numa porta escolhida pelo sistema, o nó continua discando a porta da rede."""
+    node = P2PNode("127.0.0.1", port=0, chain_path=None)
+    assert (node.listen_port, node.peer_port) == (0, config.PORT)
+    node = P2PNode("127.0.0.1", port=7000, chain_path=None)
+    assert node.peer_port == 7000
+    assert P2PNode("127.0.0.1", port=0, peer_port=7001, chain_path=None).peer_port == 7001
+
+
+def test_detect_local_ip_falls_back_to_loopback():
+    """Testa se, sem rota para a sonda, o nó usa 127.0.0.1 em vez de falhar."""
+    assert detect_local_ip(("256.0.0.1", 80)) == "127.0.0.1"
+
+
+def test_headless_node_starts_without_bootstrap_and_stops_on_sigterm():
+    """Testa o main.py sem bootstrap: o nó escuta e encerra limpo com SIGTERM."""
+    process = subprocess.Popen(
+        [sys.executable, MAIN, "127.0.0.1", "--headless", "--port", "0", "--log-level", "INFO"],
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        listening = any(line.startswith("Nó escutando em 127.0.0.1:") for line in process.stderr)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        code = process.wait(10)
+    assert listening
+    assert code == 0
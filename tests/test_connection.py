@@ -2,6 +2,20 @@ import asyncio
 import pytest
 
 from dcc_chat.connection import P2PNode
+from dcc_chat.memnet import MemoryNetwork
+from dcc_chat.protocol import (
+    ARCHIVE_RESPONSE,
+    ARCHIVE_SUFFIX,
+    CAP_DELTA_SYNC,
+    CAP_HANDSHAKE,
+    PROTOCOL_VERSION,
+    FrameReader,
+    encode_archive_request,
+    encode_archive_response,
+    encode_hello,
+    encode_identify,
+    encode_version,
+)
 
 
 @pytest.mark.asyncio
@@ -20,10 +34,8 @@ async def test_node_bootstrap_connection():
         await asyncio.sleep(2)  # Tempo para conexão e identificação
 
         # Verificações
-        async with node1.lock:
-            assert "127.0.0.2" in node1.peers
-        async with node2.lock:
-            assert "127.0.0.1" in node2.peers
+        assert "127.0.0.2" in node1.peers
+        assert "127.0.0.1" in node2.peers
 
     finally:
         await node1.stop()
@@ -55,12 +67,9 @@ async def test_three_node_discovery():
     try:
         await asyncio.sleep(3)
 
-        async with node3.lock:
-            assert "127.0.0.1" in node3.peers
-            assert "127.0.0.2" in node3.peers
-
-        async with node2.lock:
-            assert "127.0.0.3" in node2.peers
+        assert "127.0.0.1" in node3.peers
+        assert "127.0.0.2" in node3.peers
+        assert "127.0.0.3" in node2.peers
 
     finally:
         await node1.stop()
@@ -76,3 +85,183 @@ async def test_three_node_discovery():
             await task2
         with pytest.raises(asyncio.CancelledError):
             await task3
+
+
+async def _stop_all(nodes, tasks):
+    for node in nodes:
+        await node.stop()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    # Conexões aceitas durante o desligamento ainda têm tarefas pendentes.
+    rest = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in rest:
+        task.cancel()
+    await asyncio.gather(*rest, return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_simultaneous_dials_leave_one_connection():
+    """Testa se dois nós que discam um para o outro ao mesmo tempo ficam com uma só conexão."""
+    network = MemoryNetwork(latency=0.01)
+    low = P2PNode("10.0.0.9", "10.0.0.10", chain_path=None, show_chats=False, network=network.host("10.0.0.9"))
+    high = P2PNode("10.0.0.10", "10.0.0.9", chain_path=None, show_chats=False, network=network.host("10.0.0.10"))
+    tasks = [asyncio.create_task(node.start()) for node in (low, high)]
+    try:
+        await asyncio.sleep(0.5)
+        writers = (low.peers.get("10.0.0.10"), high.peers.get("10.0.0.9"))
+        assert None not in writers
+        assert low.peer_table.info("10.0.0.10").direction == "out"
+        assert high.peer_table.info("10.0.0.9").direction == "in"
+        # Uma conexão são dois sentidos na rede em memória.
+        assert len(network.writers) == 2
+        assert low.metrics.get("dcc_duplicate_connections_total") == 1
+        assert high.metrics.get("dcc_duplicate_connections_total") == 1
+        assert low.peer_versions == {"10.0.0.10": PROTOCOL_VERSION}
+        assert high.peer_versions == {"10.0.0.9": PROTOCOL_VERSION}
+
+        await asyncio.sleep(0.3)
+        assert (low.peers.get("10.0.0.10"), high.peers.get("10.0.0.9")) == writers
+    finally:
+        await _stop_all((low, high), tasks)
+
+
+@pytest.mark.asyncio
+async def test_archives_over_the_rate_limit_are_drained_before_disconnecting(make_chain):
+    """Testa se arquivos acima do limite são descartados sem fechar a conexão até a tolerância acabar."""
+    network = MemoryNetwork()
+    node = P2PNode("10.0.0.1", chain_path=None, show_chats=False, network=network.host("10.0.0.1"))
+    archive = encode_archive_response(make_chain(["a", "b"]))
+    tasks = [asyncio.create_task(node.start())]
+    try:
+        await node.ready.wait()
+        reader, writer = await network.host("10.0.0.2").open_connection("10.0.0.1", node.listen_port)
+        writer.write(encode_identify("10.0.0.2") + archive * 15)
+        await asyncio.sleep(0.2)
+        assert node.metrics.get("dcc_rate_limited_total", type="archive_response") == 5
+        assert "10.0.0.2" in node.peers and len(node.chats) == 2
+
+        writer.write(archive * 50)
+        await asyncio.wait_for(reader.read(), 2)
+        assert reader.at_eof()
+        assert node.metrics.get("dcc_misbehaving_peers_total") == 1
+    finally:
+        await _stop_all((node,), tasks)
+
+
+@pytest.mark.asyncio
+async def test_reconnect_replaces_stale_inbound_connection():
+    """Testa se um par que reconecta substitui a conexão antiga, mesmo perdendo o desempate por IP."""
+    network = MemoryNetwork()
+    node = P2PNode("10.0.0.1", chain_path=None, show_chats=False, network=network.host("10.0.0.1"))
+    tasks = [asyncio.create_task(node.start())]
+    try:
+        await node.ready.wait()
+        stale_reader, stale = await network.host("10.0.0.2").open_connection("10.0.0.1", node.listen_port)
+        stale.write(encode_identify("10.0.0.2"))
+        await asyncio.sleep(0.1)
+        old = node.peers.get("10.0.0.2")
+        assert old is not None
+
+        # O par reiniciou sem que a conexão antiga fosse fechada.
+        reader, writer = await network.host("10.0.0.2").open_connection("10.0.0.1", node.listen_port)
+        writer.write(encode_identify("10.0.0.2"))
+        await asyncio.sleep(0.1)
+        assert node.peers.get("10.0.0.2") not in (None, old)
+        await asyncio.wait_for(stale_reader.read(), 2)
+        assert stale_reader.at_eof() and not reader.at_eof()
+    finally:
+        await _stop_all((node,), tasks)
+
+
+@pytest.mark.asyncio
+async def test_identify_from_another_address_does_not_evict_peer():
+    """Testa se um host que se identifica com o IP de outro par não derruba a conexão dele."""
+    network = MemoryNetwork()
+    node = P2PNode("10.0.0.1", chain_path=None, show_chats=False, network=network.host("10.0.0.1"))
+    tasks = [asyncio.create_task(node.start())]
+    try:
+        await node.ready.wait()
+        victim_reader, victim = await network.host("10.0.0.2").open_connection("10.0.0.1", node.listen_port)
+        victim.write(encode_identify("10.0.0.2"))
+        await asyncio.sleep(0.1)
+        current = node.peers.get("10.0.0.2")
+        assert current is not None
+
+        reader, writer = await network.host("10.0.0.3").open_connection("10.0.0.1", node.listen_port)
+        writer.write(encode_identify("10.0.0.2"))
+        await asyncio.wait_for(reader.read(), 2)
+        assert reader.at_eof()
+        assert node.peers.get("10.0.0.2") is current and not victim_reader.at_eof()
+    finally:
+        await _stop_all((node,), tasks)
+
+
+@pytest.mark.asyncio
+async def test_incompatible_protocol_version_closes_connection():
+    """Testa se um par com outra versão maior do protocolo é desconectado após o Version."""
+    network = MemoryNetwork()
+    node = P2PNode("10.0.0.1", chain_path=None, show_chats=False, network=network.host("10.0.0.1"))
+    tasks = [asyncio.create_task(node.start())]
+    try:
+        await node.ready.wait()
+        reader, writer = await network.host("10.0.0.2").open_connection("10.0.0.1", node.listen_port)
+        writer.write(encode_identify("10.0.0.2") + encode_hello(CAP_HANDSHAKE))
+        writer.write(encode_version((PROTOCOL_VERSION[0] + 1, 0), CAP_HANDSHAKE))
+        await asyncio.wait_for(reader.read(), 2)
+        assert reader.at_eof()
+        assert "10.0.0.2" not in node.peers
+        assert node.metrics.get("dcc_protocol_errors_total") == 1
+    finally:
+        await _stop_all((node,), tasks)
+
+
+@pytest.mark.asyncio
+async def test_repeated_archive_requests_get_not_modified_then_disconnect():
+    """Testa a resposta "nada novo" a pedidos repetidos e a desconexão de quem insiste."""
+    network = MemoryNetwork()
+    node = P2PNode("10.0.0.1", chain_path=None, show_chats=False, network=network.host("10.0.0.1"))
+    tasks = [asyncio.create_task(node.start())]
+    try:
+        await node.ready.wait()
+        reader, writer = await network.host("10.0.0.2").open_connection("10.0.0.1", node.listen_port)
+        writer.write(encode_identify("10.0.0.2") + encode_hello(CAP_DELTA_SYNC))
+        writer.write(encode_archive_request() * 2)
+        frames = FrameReader(reader)
+        types = []
+        while ARCHIVE_SUFFIX not in types:
+            msg_type, value = await asyncio.wait_for(frames.read_frame(), 2)
+            types.append(msg_type)
+            if msg_type == ARCHIVE_RESPONSE:
+                assert await value.readexactly(4) == bytes(4)
+            elif msg_type == ARCHIVE_SUFFIX:
+                assert await value.readexactly(8) == bytes(8)
+        assert types.index(ARCHIVE_RESPONSE) < types.index(ARCHIVE_SUFFIX)
+        assert node.metrics.get("dcc_archive_not_modified_total") == 1
+
+        writer.write(encode_archive_request() * 100)
+        await asyncio.wait_for(reader.read(), 2)
+        assert reader.at_eof()
+        assert node.metrics.get("dcc_misbehaving_peers_total") == 1
+        assert not node.peer_table.can_accept("10.0.0.2", "in")
+    finally:
+        await _stop_all((node,), tasks)
+
+
+class _RefusingWriter:
+    """Writer de um par cuja fila de saída já fechou."""
+
+    def write(self, message):
+        return False
+
+    async def drain(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_archive_not_marked_served_when_send_fails():
+    """Um histórico que não chegou à fila do par não vale como enviado."""
+    node = P2PNode("10.0.0.1", chain_path=None, show_chats=False, network=MemoryNetwork().host("10.0.0.1"))
+    await node._send_archive("10.0.0.2", _RefusingWriter())
+    assert "10.0.0.2" not in node.archive_served
+    assert node.metrics.get("dcc_archive_not_modified_total") == 0
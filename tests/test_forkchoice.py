@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from dcc_chat.connection import P2PNode
+from dcc_chat.forkchoice import ForkChoice, common_ancestor
+from dcc_chat.pipeline import read_archive_response
+from dcc_chat.protocol import encode_archive_response
+
+
+def _reader_with(data: bytes) -> asyncio.StreamReader:
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+def test_common_ancestor(make_chain):
+    """Testa a altura da bifurcação entre dois ramos."""
+    base = make_chain(["a", "b", "c"])
+    left = make_chain(["d", "e"], base)
+    right = make_chain(["x"], base)
+    assert common_ancestor(left, right) == 3
+    assert common_ancestor(left, base) == 3
+    assert common_ancestor(left, left.copy()) == 5
+    assert common_ancestor(make_chain(["z"]), left) == 0
+
+
+def test_fork_choice_prefers_strictly_longer(make_chain):
+    """Testa se só uma cadeia estritamente mais longa é adotada."""
+    base = make_chain(["a", "b"])
+    local = make_chain(["c"], base)
+    equal = make_chain(["x"], base)
+    longer = make_chain(["x", "y"], base)
+    choice = ForkChoice(max_branches=1)
+
+    assert not choice.choose(local, equal)
+    assert choice.is_known(equal.tip)
+    assert choice.branches[equal.tip].fork_height == 2
+
+    assert choice.choose(local, longer)
+    assert choice.is_known(local.tip)
+    assert not choice.is_known(equal.tip)
+    assert len(choice.branches[local.tip]) == 3
+
+
+@pytest.mark.asyncio
+async def test_node_ignores_equal_and_shorter_archives(make_chain):
+    """Testa se o nó não troca de ramo por arquivos de mesmo tamanho ou menores."""
+    base = make_chain(["a", "b"])
+    node = P2PNode("127.0.0.1")
+    node.chats = make_chain(["c"], base)
+    node.on_chain_changed(0)
+    local = node.chats
+
+    try:
+        for other in (make_chain(["x"], base), base):
+            trailer = b"\x01"
+            reader = _reader_with(encode_archive_response(other)[1:] + trailer)
+            await read_archive_response(node, reader)
+            await node.pipeline.join()
+            assert node.chats is local
+            assert await reader.read() == trailer
+
+        longer = make_chain(["x", "y"], base)
+        await read_archive_response(node, _reader_with(encode_archive_response(longer)[1:]))
+        await node.pipeline.join()
+    finally:
+        node.pipeline.close()
+    assert node.chats == longer
+    assert node.verified.height == 4
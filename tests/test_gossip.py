@@ -0,0 +1,65 @@
+import pytest
+
+from dcc_chat.connection import P2PNode
+from dcc_chat.gossip import Gossip, now_ms
+from dcc_chat.messages import announce_tip, handle_new_tip
+from dcc_chat.protocol import (
+    decode_new_tip,
+    ARCHIVE_SINCE_REQUEST,
+    CAP_DELTA_SYNC,
+    CAP_GOSSIP,
+    NEW_TIP,
+)
+
+
+class _Writer:
+    def __init__(self):
+        self.messages = []
+
+    def write(self, data):
+        self.messages.append(bytes(data))
+
+    async def drain(self):
+        pass
+
+
+def test_gossip_seen_cache_and_latency():
+    """Testa o cache de pontas vistas, o repasse único e a latência registrada."""
+    gossip = Gossip(fanout=2, max_seen=2)
+    assert gossip.mark_seen(b"a" * 16, now_ms() - 50)
+    assert not gossip.mark_seen(b"a" * 16, now_ms())
+    assert gossip.should_forward(b"a" * 16)
+    assert not gossip.should_forward(b"a" * 16)
+
+    gossip.record_adoption(b"a" * 16)
+    gossip.record_adoption(b"a" * 16)
+    assert gossip.stats()["adopted"] == 1
+    assert gossip.stats()["latency_max_ms"] >= 50
+
+    gossip.mark_seen(b"b" * 16, 0)
+    gossip.mark_seen(b"c" * 16, 0)
+    assert b"a" * 16 not in gossip.seen
+    assert len(gossip.targets([1, 2, 3, 4])) == 2
+
+
+@pytest.mark.asyncio
+async def test_new_tip_is_pulled_once_and_announced_once(make_chain):
+    """Testa se uma ponta nova é pedida uma vez e a local é anunciada uma vez."""
+    node = P2PNode("127.0.0.1")
+    node.chats = make_chain(["a"])
+    node.verified.update(node.chats)
+    node.peers = {"10.0.0.2": _Writer(), "10.0.0.3": _Writer()}
+    node.peer_capabilities = {"10.0.0.2": CAP_DELTA_SYNC | CAP_GOSSIP, "10.0.0.3": 0}
+
+    for _ in range(2):
+        await handle_new_tip(node, "10.0.0.2", 5, b"t" * 16, now_ms())
+    await handle_new_tip(node, "10.0.0.2", 1, b"u" * 16, now_ms())
+    sent = node.peers["10.0.0.2"].messages
+    assert [m[0] for m in sent] == [ARCHIVE_SINCE_REQUEST]
+
+    for _ in range(2):
+        await announce_tip(node)
+    announcements = [m for m in sent if m[0] == NEW_TIP]
+    assert len(announcements) == 1
+    assert decode_new_tip(announcements[0][1:])[:2] == (1, node.chats.tip)
+    assert node.peers["10.0.0.3"].messages == []
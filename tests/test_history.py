@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+import json
+
+import pytest
+
+from dcc_chat.chain import ChatChain
+from dcc_chat.connection import P2PNode
+from dcc_chat.history import HistoryIndex, serve_history
+
+
+def fake_chain(texts, chats=None):
+    """Cadeia sem prova de trabalho: o índice não verifica os chats."""
+    chats = chats.copy() if chats is not None else ChatChain()
+    for text in texts:
+        md5 = hashlib.md5(bytes(chats.tail()) + text.encode()).digest()
+        chats.append(bytes([len(text)]), text.encode(), bytes(16), md5)
+    return chats
+
+
+def test_index_pages_finds_and_searches():
+    """Testa a leitura paginada, a busca por md5 e a busca por palavras."""
+    chats = fake_chain([f"chat {i} {'par' if i % 2 == 0 else 'impar'}" for i in range(10)])
+    index = HistoryIndex()
+    index.sync(chats)
+
+    page, cursor = index.page(limit=3)
+    assert [height for height, _ in page] == [7, 8, 9]
+    assert cursor == 7
+    page, cursor = index.page(cursor, 10)
+    assert [height for height, _ in page] == list(range(7))
+    assert cursor is None
+
+    assert index.find(chats.md5(4)) == (4, chats[4])
+    assert index.find(bytes(16)) is None
+
+    found, cursor = index.search("PAR chat", limit=2)
+    assert [height for height, _ in found] == [8, 6]
+    found, cursor = index.search("par chat", before=cursor, limit=10)
+    assert [height for height, _ in found] == [4, 2, 0]
+    assert cursor is None
+    assert index.search("chat 3")[0][0][0] == 3
+    assert index.search("nada")[0] == []
+
+
+def test_fork_switch_reindexes_only_the_new_branch():
+    """Testa se a troca de ramo deixa o índice igual ao de uma cadeia indexada do zero."""
+    base = fake_chain(["a comum", "b comum"])
+    old = fake_chain(["c velho", "d velho"], base)
+    new = fake_chain(["c novo", "d novo", "e novo"], base)
+
+    index = HistoryIndex()
+    index.sync(old)
+    index.sync(new, 2)
+
+    fresh = HistoryIndex()
+    fresh.sync(new)
+    assert index.by_md5 == fresh.by_md5
+    assert index.postings == fresh.postings
+    assert b"velho" not in index.postings
+    assert index.find(old.md5(3)) is None
+    assert index.page()[0] == fresh.page()[0]
+
+
+def test_pruning_drops_old_heights_from_the_index():
+    """Testa se os chats podados da cadeia saem do índice e os demais continuam."""
+    chats = fake_chain([f"chat {i} {'velho' if i < 10 else 'novo'}" for i in range(30)])
+    index = HistoryIndex()
+    index.sync(chats)
+    chats.prune(15)
+    chats = fake_chain(["chat 30 novo"], chats)
+    index.sync(chats, 30)
+
+    assert (index.base, index.height) == (15, 31)
+    assert index.find(chats.md5(20)) == (20, chats[20])
+    assert b"velho" not in index.postings and index.postings[b"novo"][0] == 15
+    page, cursor = index.page(20, 10)
+    assert [height for height, _ in page] == [15, 16, 17, 18, 19] and cursor is None
+    assert index.search("chat")[0][-1][0] == 15
+
+
+@pytest.mark.asyncio
+async def test_query_socket_answers_json_lines():
+    """Testa o socket local de consultas com as operações page, find e search."""
+    node = P2PNode("127.0.0.1", chain_path=None)
+    node.chats = fake_chain(["ola mundo", "tudo bem", "ola de novo"])
+    node.on_chain_changed(0)
+    server = await serve_history(node, "127.0.0.1", 0)
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+
+    async def ask(request):
+        writer.write(json.dumps(request).encode() + b"\n")
+        return json.loads(await reader.readline())
+
+    try:
+        response = await ask({"op": "page", "limit": 2})
+        assert [chat["text"] for chat in response["chats"]] == ["tudo bem", "ola de novo"]
+        assert response["next"] == 1
+        response = await ask({"op": "find", "md5": node.chats.md5(0).hex()})
+        assert response["chat"]["height"] == 0
+        response = await ask({"op": "search", "query": "ola"})
+        assert [chat["height"] for chat in response["chats"]] == [2, 0]
+        assert "error" in await ask({"op": "apagar"})
+    finally:
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        await node.stop()
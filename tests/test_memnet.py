@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import pytest
+
+from dcc_chat.connection import P2PNode
+from dcc_chat.memnet import MemoryNetwork
+
+
+@pytest.mark.asyncio
+async def test_memory_connection_delivers_in_order_after_latency():
+    """Testa latência, ordem, banda e fim de conexão da rede em memória."""
+    network = MemoryNetwork(latency=0.05, bandwidth=100_000)
+    accepted = asyncio.Queue()
+
+    async def handler(reader, writer):
+        await accepted.put((reader, writer))
+
+    await network.host("10.0.0.1").start_server(handler, "10.0.0.1", 1)
+    reader, writer = await network.host("10.0.0.2").open_connection("10.0.0.1", 1)
+    remote_reader, remote_writer = await accepted.get()
+
+    start = time.perf_counter()
+    writer.write(b"a" * 5000)
+    writer.write(b"b")
+    assert await remote_reader.readexactly(5001) == b"a" * 5000 + b"b"
+    # 5001 bytes a 100 kB/s mais a latência.
+    assert time.perf_counter() - start >= 0.09
+    assert remote_writer.get_extra_info("peername")[0] == "10.0.0.2"
+    assert network.bytes_sent == 5001
+
+    writer.close()
+    assert await remote_reader.read() == b""
+    assert await reader.read() == b""
+
+
+@pytest.mark.asyncio
+async def test_partition_resets_connections_and_refuses_new_ones():
+    """Testa se a partição derruba as conexões entre os grupos até `heal`."""
+    network = MemoryNetwork()
+    accepted = asyncio.Queue()
+
+    async def handler(reader, writer):
+        await accepted.put(reader)
+
+    await network.host("10.0.0.1").start_server(handler, "10.0.0.1", 1)
+    reader, _ = await network.host("10.0.0.2").open_connection("10.0.0.1", 1)
+    remote_reader = await accepted.get()
+
+    network.partition(["10.0.0.1"], ["10.0.0.2"])
+    for stream in (reader, remote_reader):
+        with pytest.raises(ConnectionResetError):
+            await stream.read(1)
+    with pytest.raises(ConnectionRefusedError):
+        await network.host("10.0.0.2").open_connection("10.0.0.1", 1)
+
+    network.heal()
+    await network.host("10.0.0.2").open_connection("10.0.0.1", 1)
+
+
+@pytest.mark.asyncio
+async def test_nodes_spread_past_a_full_bootstrap():
+    """Testa se nós recusados por um bootstrap lotado descobrem outros pares por ele."""
+    network = MemoryNetwork(latency=0.001)
+    ips = [f"10.0.0.{i + 1}" for i in range(12)]
+    nodes = [
+        P2PNode(ip, ips[0] if i else None, chain_path=None, show_chats=False, network=network.host(ip))
+        for i, ip in enumerate(ips)
+    ]
+    nodes[0].peer_table.max_inbound = 3
+    tasks = [asyncio.create_task(node.start()) for node in nodes]
+    try:
+        deadline = time.perf_counter() + 5
+        while not all(len(node.peers) >= 3 for node in nodes) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.02)
+        assert all(len(node.peers) >= 3 for node in nodes)
+        assert len(nodes[0].peers) <= 3 + nodes[0].peer_table.count("out")
+        assert nodes[0].metrics.get("dcc_rejected_connections_total") > 0
+    finally:
+        for node in nodes:
+            await node.stop()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Conexões aceitas durante o desligamento ainda têm tarefas pendentes.
+        rest = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in rest:
+            task.cancel()
+        await asyncio.gather(*rest, return_exceptions=True)
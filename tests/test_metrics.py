@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from dcc_chat.connection import P2PNode
+from dcc_chat.metrics import CountingReader, Metrics, serve_metrics
+from dcc_chat.outbound import PeerSender
+from dcc_chat.protocol import encode_archive_response, encode_peer_request
+
+
+class _Writer:
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_render_prometheus_text():
+    """Testa o formato texto de contadores, histogramas e coletores."""
+    metrics = Metrics()
+    metrics.inc("dcc_messages_received_total", type="peer_list")
+    metrics.inc("dcc_messages_received_total", 2, type="peer_list")
+    metrics.observe("dcc_message_seconds", 0.002, type="peer_list")
+    metrics.observe("dcc_message_seconds", 7.0, type="peer_list")
+    metrics.collectors.append(lambda: [("dcc_chain_height", "gauge", {}, 5)])
+
+    text = metrics.render()
+    assert "# TYPE dcc_messages_received_total counter" in text
+    assert 'dcc_messages_received_total{type="peer_list"} 3' in text
+    assert "# TYPE dcc_chain_height gauge\ndcc_chain_height 5" in text
+    assert "# TYPE dcc_message_seconds histogram" in text
+    assert 'dcc_message_seconds_bucket{type="peer_list",le="0.005"} 1' in text
+    assert 'dcc_message_seconds_bucket{type="peer_list",le="+Inf"} 2' in text
+    assert 'dcc_message_seconds_count{type="peer_list"} 2' in text
+    assert metrics.total("dcc_messages_received_total") == 3
+
+
+@pytest.mark.asyncio
+async def test_node_counts_messages_and_bytes(make_chain):
+    """Testa as métricas de um par: mensagens por tipo, bytes e verificação."""
+    chain = make_chain(["a", "b", "c"])
+    node = P2PNode("127.0.0.1")
+    data = encode_peer_request() + encode_archive_response(chain)
+    raw = asyncio.StreamReader()
+    raw.feed_data(data)
+    raw.feed_eof()
+    writer = PeerSender(_Writer(), metrics=node.metrics, peer="10.0.0.2")
+    node.peers["10.0.0.2"] = writer
+
+    await node.listen_to_peer("10.0.0.2", CountingReader(raw, node.metrics, "10.0.0.2"), writer)
+    await node.pipeline.join()
+    node.pipeline.close()
+
+    metrics = node.metrics
+    assert metrics.get("dcc_messages_received_total", type="peer_request") == 1
+    assert metrics.get("dcc_messages_received_total", type="archive_response") == 1
+    assert metrics.get("dcc_messages_sent_total", type="peer_list") == 1
+    assert metrics.get("dcc_peer_bytes_received_total", peer="10.0.0.2") == len(data)
+    assert metrics.get("dcc_disconnects_total") == 1
+    assert len(node.chats) == 3
+    assert 'dcc_verification_seconds_count{mode="thread"} 1' in metrics.render()
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint():
+    """Testa o endpoint HTTP local de métricas."""
+    node = P2PNode("127.0.0.1")
+    node.metrics.inc("dcc_reconnects_total")
+    server = await serve_metrics(node.metrics, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        response = (await reader.read()).decode()
+        writer.close()
+    finally:
+        server.close()
+        await server.wait_closed()
+
+    assert response.startswith("HTTP/1.0 200 OK")
+    assert "dcc_reconnects_total 1" in response
+    assert "dcc_chain_height 0" in response
+    assert "dcc_mining_hashrate" in response
@@ -0,0 +1,48 @@
+import asyncio
+import hashlib
+import pytest
+
+from dcc_chat.chain import ChatChain
+from dcc_chat.messages import put_chat_in_queue
+from dcc_chat.mining import Miner, MiningCancelled, mine_batch
+from dcc_chat.verification import first_invalid
+
+
+def test_mine_batch_finds_valid_code():
+    """Testa se um lote encontra um código cujo MD5 começa com 0x0000."""
+    prefix, partial = b"abc", b"\x02oi"
+    code, md5, tries = mine_batch(prefix, partial, b"\x00" * 8, 1 << 20)
+    assert code is not None
+    assert md5.startswith(b"\x00\x00")
+    assert hashlib.md5(prefix + partial + code).digest() == md5
+    assert tries >= 1
+
+
+@pytest.mark.asyncio
+async def test_put_chat_in_queue_mines_valid_chain():
+    """Testa se chats minerados pelo pool formam uma cadeia válida."""
+    miner = Miner(workers=2)
+    chats = ChatChain()
+    try:
+        for text in ["primeiro", "segundo", "terceiro"]:
+            await put_chat_in_queue(chats, text, miner)
+    finally:
+        miner.close()
+
+    assert len(chats) == 3
+    assert first_invalid(chats) is None
+    assert miner.total_hashes > 0
+    assert miner.hashrate > 0
+
+
+@pytest.mark.asyncio
+async def test_mining_cancellation():
+    """Testa se a mineração é interrompida quando o evento de cancelamento é acionado."""
+    miner = Miner(workers=1, batch_size=1 << 10)
+    cancel = asyncio.Event()
+    cancel.set()
+    try:
+        with pytest.raises(MiningCancelled):
+            await miner.mine(b"", b"\x01x", cancel)
+    finally:
+        miner.close()
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from dcc_chat.outbound import PeerSender
+from dcc_chat.protocol import (
+    encode_archive_request,
+    encode_hello,
+    encode_peer_request,
+    ARCHIVE_RESPONSE,
+)
+
+
+class _SlowWriter:
+    """Writer cujo drain só termina quando `release` é acionado."""
+
+    def __init__(self):
+        self.writes = []
+        self.release = asyncio.Event()
+        self.closed = False
+
+    def write(self, data):
+        self.writes.append(bytes(data))
+
+    async def drain(self):
+        await self.release.wait()
+
+    def close(self):
+        self.closed = True
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_sender_coalesces_small_messages():
+    """Testa se mensagens enviadas juntas saem em um único write."""
+    writer = _SlowWriter()
+    writer.release.set()
+    sender = PeerSender(writer)
+    sender.write(encode_peer_request())
+    sender.write(encode_archive_request())
+    await sender.drain()
+    await _settle()
+    assert writer.writes == [encode_peer_request() + encode_archive_request()]
+    sender.close()
+
+
+@pytest.mark.asyncio
+async def test_sender_replaces_stale_archive_and_closes_on_overflow():
+    """Testa a troca de arquivos obsoletos e o fechamento da conexão de um par parado."""
+    writer = _SlowWriter()
+    sender = PeerSender(writer, max_queue=3)
+    sender.write(encode_hello(1))
+    await _settle()  # o primeiro write fica preso no drain
+
+    old = bytes([ARCHIVE_RESPONSE]) + b"old"
+    new = bytes([ARCHIVE_RESPONSE]) + b"new"
+    sender.write(old)
+    sender.write(encode_peer_request())
+    sender.write(new)
+    assert sender.depth == 2
+    assert sender.replaced == 1
+
+    assert sender.write(encode_hello(2))
+    assert not sender.write(encode_hello(3))
+    assert sender.dropped == 1
+    assert sender.closed and writer.closed
+    assert not sender.write(encode_peer_request())
+
+    writer.release.set()
+    await _settle()
+    assert writer.writes == [encode_hello(1)]
@@ -0,0 +1,131 @@
+from dcc_chat.config import PEER_STALE_SECONDS
+from dcc_chat.peers import PeerTable
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_connection_limits():
+    """Testa os limites por direção e a recusa do próprio nó e de pares já conectados."""
+    table = PeerTable("10.0.0.1", max_inbound=1, max_outbound=1)
+    assert not table.can_accept("10.0.0.1", "out")
+    assert table.can_accept("10.0.0.2", "in")
+    table.attach("10.0.0.2", object(), "in")
+    assert not table.can_accept("10.0.0.2", "out")
+    assert not table.can_accept("10.0.0.3", "in")
+    assert table.can_accept("10.0.0.3", "out")
+    table.attach("10.0.0.3", object(), "out")
+    assert not table.can_accept("10.0.0.4", "out")
+
+
+def test_simultaneous_dials_keep_the_lower_ips_connection():
+    """Testa se os dois lados de uma discagem simultânea escolhem a mesma conexão."""
+    low, high = PeerTable("10.0.0.9"), PeerTable("10.0.0.10")
+    # A conexão discada por 10.0.0.9 é "out" para ele e "in" para o outro lado.
+    assert low.keeps("10.0.0.10", "out") and high.keeps("10.0.0.9", "in")
+    assert not low.keeps("10.0.0.10", "in") and not high.keeps("10.0.0.9", "out")
+
+
+def test_same_direction_duplicate_replaces_the_stale_connection():
+    """Testa se uma nova conexão na mesma direção da atual sempre a substitui, sem o desempate por IP."""
+    low = PeerTable("10.0.0.9")
+    low.attach("10.0.0.10", object(), "in")
+    # O par de IP maior reiniciou e discou de novo: perderia o desempate, mas a antiga está morta.
+    assert low.replaces("10.0.0.10", "in") and not low.keeps("10.0.0.10", "in")
+
+    low.attach("10.0.0.10", object(), "out")
+    assert not low.replaces("10.0.0.10", "in")
+
+
+def test_unconfirmed_address_replaces_only_a_silent_connection():
+    """Testa se um Identify vindo de outro endereço só substitui uma conexão calada."""
+    clock = _Clock()
+    low, high = PeerTable("10.0.0.9", clock=clock), PeerTable("10.0.0.10", clock=clock)
+    low.attach("10.0.0.10", object(), "in")
+    high.attach("10.0.0.9", object(), "out")
+    # Na mesma direção, ou ganhando o desempate por IP: só com o endereço confirmado.
+    assert low.replaces("10.0.0.10", "in") and not low.replaces("10.0.0.10", "in", confirmed=False)
+    assert high.replaces("10.0.0.9", "in") and not high.replaces("10.0.0.9", "in", confirmed=False)
+
+    clock.now = PEER_STALE_SECONDS + 1
+    assert low.replaces("10.0.0.10", "in", confirmed=False)
+    low.seen("10.0.0.10")
+    assert not low.replaces("10.0.0.10", "in", confirmed=False)
+
+
+def test_snapshot_is_replaced_not_mutated():
+    """Testa se um retrato lido antes de uma mudança continua intacto."""
+    table = PeerTable()
+    table.attach("10.0.0.2", "w2", "out")
+    snapshot = table.connected
+    table.attach("10.0.0.3", "w3", "in")
+    table.detach("10.0.0.2")
+    assert snapshot == {"10.0.0.2": "w2"}
+    assert table.connected == {"10.0.0.3": "w3"}
+
+
+def test_dialing_prefers_healthy_low_latency_peers_and_backs_off():
+    """Testa a ordem de discagem, o limite de discagens simultâneas e a espera após falhas."""
+    clock = _Clock()
+    table = PeerTable("10.0.0.1", target_outbound=3, max_dialing=2, clock=clock)
+    for ip in ("10.0.0.2", "10.0.0.3", "10.0.0.4", "10.0.0.1"):
+        table.add_known(ip)
+    assert "10.0.0.1" not in table.known
+    table.record_rtt("10.0.0.3", 0.010)
+    table.record_rtt("10.0.0.4", 0.001)
+    assert table.dial_candidates() == ["10.0.0.4", "10.0.0.3"]
+
+    table.record_failure("10.0.0.4")
+    table.record_failure("10.0.0.4")
+    assert table.dial_candidates() == ["10.0.0.3", "10.0.0.2"]
+    assert table.delay(60) == 0
+    table.dialing.update({"10.0.0.3", "10.0.0.2"})
+    assert table.dial_candidates() == []
+    table.dialing.clear()
+    table.attach("10.0.0.3", object(), "out")
+    table.attach("10.0.0.2", object(), "out")
+    assert 1.9 <= table.delay(60) <= 2
+    clock.now = 2
+    assert table.dial_candidates() == ["10.0.0.4"]
+    table.attach("10.0.0.4", object(), "out")
+    assert table.info("10.0.0.4").failures == 0
+    assert table.dial_candidates() == []
+    assert table.by_latency()[0] == "10.0.0.4"
+
+
+def test_short_connections_count_as_failures_and_feeler_picks_idle_peer():
+    """Testa se uma conexão que cai logo conta como falha e se a conexão extra só vai a pares ociosos."""
+    clock = _Clock()
+    table = PeerTable("10.0.0.1", max_outbound=2, clock=clock)
+    table.attach("10.0.0.2", object(), "out")
+    clock.now = 1
+    table.detach("10.0.0.2")
+    assert table.info("10.0.0.2").failures == 1
+
+    table.attach("10.0.0.3", object(), "out")
+    clock.now = 10
+    table.detach("10.0.0.3")
+    assert table.info("10.0.0.3").failures == 0
+    assert table.feeler() in ("10.0.0.2", "10.0.0.3")
+    table.attach("10.0.0.2", object(), "out")
+    table.attach("10.0.0.3", object(), "out")
+    assert table.feeler() is None
+
+
+def test_rtt_from_peer_request():
+    """Testa a medida de RTT entre um PeerRequest e o PeerList de resposta."""
+    clock = _Clock()
+    table = PeerTable(clock=clock)
+    table.attach("10.0.0.2", object(), "out", rtt=0.1)
+    table.ping_sent("10.0.0.2")
+    clock.now = 0.2
+    table.pong_received("10.0.0.2")
+    assert abs(table.info("10.0.0.2").rtt - 0.13) < 1e-9
+    clock.now = 1
+    table.pong_received("10.0.0.2")
+    assert abs(table.info("10.0.0.2").rtt - 0.13) < 1e-9
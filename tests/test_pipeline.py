@@ -0,0 +1,200 @@
+import asyncio
+
+import pytest
+
+from dcc_chat.chain import ChatChain
+from dcc_chat.connection import P2PNode
+from dcc_chat.pipeline import ArchiveJob, read_archive_response, read_archive_suffix
+from dcc_chat.protocol import encode_archive_response, encode_archive_suffix
+
+
+class _Writer:
+    def __init__(self):
+        self.closed = False
+
+    def write(self, data):
+        pass
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def _reader_with(data: bytes) -> asyncio.StreamReader:
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+@pytest.mark.asyncio
+async def test_duplicate_archives_are_verified_once(make_chain):
+    """Testa se o mesmo arquivo vindo de vários pares é verificado uma única vez."""
+    chats = make_chain(["a", "b", "c"])
+    node = P2PNode("127.0.0.1")
+    try:
+        results = [
+            await node.pipeline.submit(ArchiveJob(ip, chats.copy()))
+            for ip in ("10.0.0.2", "10.0.0.3", "10.0.0.4")
+        ]
+        await node.pipeline.join()
+        # Depois de adotada, uma cópia da própria cadeia local também é descartada.
+        late = await node.pipeline.submit(ArchiveJob("10.0.0.5", chats.copy()))
+    finally:
+        node.pipeline.close()
+
+    assert results == [True, False, False] and late is False
+    assert node.chats == chats
+    assert node.metrics.get("dcc_archives_dropped_total", reason="duplicate") == 3
+    assert 'dcc_verification_seconds_count{mode="thread"} 1' in node.metrics.render()
+
+
+@pytest.mark.asyncio
+async def test_archive_read_from_several_peers_is_verified_once(make_chain):
+    """Testa se pares lendo juntos o mesmo arquivo reaproveitam a verificação de cada bloco."""
+    chats = make_chain(["a", "b", "c"])
+    body = encode_archive_response(chats)[1:]
+    node = P2PNode("127.0.0.1")
+    try:
+        await asyncio.gather(*(read_archive_response(node, _reader_with(body), f"10.0.0.{i}") for i in (2, 3, 4)))
+        await node.pipeline.join()
+    finally:
+        node.pipeline.close()
+
+    assert node.chats == chats
+    assert 'dcc_verification_seconds_count{mode="thread"} 1' in node.metrics.render()
+
+
+@pytest.mark.asyncio
+async def test_known_losing_branch_is_not_verified_again(make_chain):
+    """Testa se um ramo já preterido pela escolha de ramo é descartado antes da verificação."""
+    base = make_chain(["a", "b"])
+    node = P2PNode("127.0.0.1")
+    node.chats = make_chain(["c"], base)
+    node.on_chain_changed(0)
+    rival = make_chain(["x"], base)
+    try:
+        assert await node.pipeline.submit(ArchiveJob("10.0.0.2", rival.copy()))
+        await node.pipeline.join()
+        # Mesmo depois de sair da lista de arquivos recebidos.
+        node.pipeline.seen.clear()
+        assert not await node.pipeline.submit(ArchiveJob("10.0.0.3", rival.copy()))
+    finally:
+        node.pipeline.close()
+
+    assert node.fork_choice.is_known(rival.tip)
+    assert node.metrics.get("dcc_archives_dropped_total", reason="known_branch") == 1
+    assert 'dcc_verification_seconds_count{mode="thread"} 1' in node.metrics.render()
+
+
+@pytest.mark.asyncio
+async def test_invalid_archive_drops_peer_but_not_valid_copy(make_chain):
+    """Testa se um arquivo adulterado fecha o par sem impedir uma cópia válida de mesma ponta."""
+    chats = make_chain(["a", "b", "c"])
+    tampered = list(chats.values())
+    tampered[1] = dict(tampered[1], text=b"X")
+    node = P2PNode("127.0.0.1")
+    liar, honest = _Writer(), _Writer()
+    node.peers = {"10.0.0.2": liar, "10.0.0.3": honest}
+    try:
+        await node.pipeline.submit(ArchiveJob("10.0.0.2", ChatChain.from_chats(tampered)))
+        await node.pipeline.join()
+        await node.pipeline.submit(ArchiveJob("10.0.0.3", chats.copy()))
+        await node.pipeline.join()
+    finally:
+        node.pipeline.close()
+
+    assert liar.closed and not honest.closed
+    assert node.metrics.get("dcc_invalid_chains_total") == 1
+    assert node.chats == chats
+
+
+@pytest.mark.asyncio
+async def test_suffix_is_applied_only_if_it_still_fits(make_chain):
+    """Testa se um sufixo verificado é descartado quando a cadeia local mudou no meio do caminho."""
+    base = make_chain([str(i) for i in range(25)])
+    longer = make_chain(["x", "y"], base)
+    node = P2PNode("127.0.0.1")
+    node.chats = base.copy()
+    node.on_chain_changed(0)
+    try:
+        await read_archive_suffix(node, _reader_with(bytes(encode_archive_suffix(longer, 25)[1:])))
+        await node.pipeline.join()
+        assert node.chats == longer
+
+        # A cadeia local troca de ramo antes de o próximo sufixo ser aplicado:
+        # mesma altura, mas o contexto em que ele foi verificado já não existe.
+        rival = make_chain(["w"], base)
+        node.chats = rival
+        pending = ChatChain()
+        pending.extend(longer.view(7))
+        await node.pipeline.submit(ArchiveJob("10.0.0.2", pending, 26, 7))
+        await node.pipeline.join()
+    finally:
+        node.pipeline.close()
+
+    assert node.chats is rival and len(rival) == 26
+
+
+@pytest.mark.asyncio
+async def test_pruned_node_refuses_forks_below_the_pruned_height(make_chain):
+    """Testa se o nó podado recusa ramos que divergem antes da poda e adota os mais recentes."""
+    chats = make_chain([str(i) for i in range(45)])
+    node = P2PNode("127.0.0.1")
+    node.chats = chats.copy()
+    node.chats.prune(20)
+    node.on_chain_changed(0)
+
+    def branch(height, count):
+        prefix = chats.copy()
+        prefix.truncate(height)
+        return make_chain([f"r{i}" for i in range(count)], prefix)
+
+    try:
+        # A janela dos chats após a bifurcação alcançaria chats já podados.
+        await node.pipeline.submit(ArchiveJob("10.0.0.2", branch(30, 17)))
+        await node.pipeline.join()
+        assert node.chats.tip == chats.tip
+
+        shallow = branch(42, 5)
+        await node.pipeline.submit(ArchiveJob("10.0.0.3", shallow))
+        await node.pipeline.join()
+    finally:
+        node.pipeline.close()
+
+    assert (len(node.chats), node.chats.base, node.chats.tip) == (47, 20, shallow.tip)
+    assert bytes(node.chats.view()) == bytes(shallow.view(20))
+
+
+@pytest.mark.asyncio
+async def test_failed_write_rolls_back_and_keeps_the_stages_running(make_chain):
+    """Testa se uma falha ao gravar a cadeia desfaz a troca sem parar o pipeline."""
+    chats = make_chain(["a", "b", "c"])
+
+    class FlakyStore:
+        height = 0
+
+        def sync(self, chats, start):
+            if self.height == 0:
+                self.height = -1
+                raise OSError("disco cheio")
+            self.height = len(chats)
+
+    node = P2PNode("127.0.0.1")
+    local = node.chats = make_chain(["x"])
+    node.on_chain_changed(0)
+    node.store = FlakyStore()
+    try:
+        await node.pipeline.submit(ArchiveJob("10.0.0.2", chats.copy()))
+        await node.pipeline.join()
+        assert node.chats is local and node.verified.height == 1
+        assert not node.fork_choice.is_known(local.tip)
+
+        await node.pipeline.submit(ArchiveJob("10.0.0.3", chats.copy()))
+        await node.pipeline.join()
+    finally:
+        node.pipeline.close()
+
+    assert node.chats == chats and node.verified.height == 3
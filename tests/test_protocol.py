@@ -1,11 +1,28 @@
+import asyncio
 import struct
 
+import pytest
+
+from dcc_chat.chain import ChatChain, decode_chat
+
 from dcc_chat.protocol import (
     encode_identify,
     decode_identify,
     encode_peer_request,
     encode_peer_list,
     decode_peer_list,
+    encode_archive_response,
+    encode_hello,
+    decode_hello,
+    encode_new_tip,
+    ArchiveCache,
+    ArchiveDecoder,
+    FrameReader,
+    ProtocolError,
+    ARCHIVE_REQUEST,
+    ARCHIVE_RESPONSE,
+    HELLO,
+    NEW_TIP,
     IDENTIFY,
     PEER_REQUEST,
     PEER_LIST,
@@ -55,3 +72,141 @@ def test_decode_empty_peer_list():
     encoded = encode_peer_list(peers)
     decoded = decode_peer_list(encoded[1:])
     assert decoded == []
+
+
+def test_hello_capability_byte_is_never_a_legacy_type():
+    """Testa se o byte após o 0x05 nunca é um tipo original e se as capacidades voltam intactas."""
+    for capabilities in range(256):
+        encoded = encode_hello(capabilities)
+        assert encoded[0] == HELLO and encoded[1] > ARCHIVE_RESPONSE
+        assert decode_hello(encoded[1:]) == capabilities & 0x7F
+
+
+async def _legacy_loop(reader) -> list[int]:
+    """
+    O laço de mensagens de um nó sem as extensões: lê um byte de tipo e trata
+    só os tipos originais, ignorando os demais. Devolve os tipos tratados.
+    """
+    handled = []
+    while True:
+        header = await reader.read(1)
+        if not header:
+            return handled
+        msg_type = header[0]
+        if msg_type in (PEER_REQUEST, ARCHIVE_REQUEST):
+            handled.append(msg_type)
+        elif msg_type == PEER_LIST:
+            count = struct.unpack("!I", await reader.readexactly(4))[0]
+            await reader.readexactly(4 * count)
+            handled.append(msg_type)
+        elif msg_type == ARCHIVE_RESPONSE:
+            for _ in range(struct.unpack("!I", await reader.readexactly(4))[0]):
+                await reader.readexactly((await reader.readexactly(1))[0] + 32)
+            handled.append(msg_type)
+
+
+@pytest.mark.asyncio
+async def test_legacy_peer_ignores_every_hello():
+    """Testa se um nó sem as extensões ignora o Hello com qualquer conjunto de capacidades."""
+    for capabilities in range(256):
+        reader = _reader_with(encode_hello(capabilities) + encode_peer_request())
+        assert await _legacy_loop(reader) == [PEER_REQUEST]
+
+
+def _sample_chats():
+    chats = {}
+    for i, text in enumerate([b"", b"oi", b"x" * 255]):
+        chats[i] = {
+            "length": struct.pack("!B", len(text)), "text": text,
+            "verification_code": bytes([i]) * 16, "md5": bytes([i + 1]) * 16,
+        }
+    return chats
+
+
+def test_archive_decoder_round_trip_in_chunks():
+    """Testa o decodificador incremental com blocos de tamanhos variados."""
+    chats = _sample_chats()
+    body = encode_archive_response(chats)[5:]
+
+    for chunk_size in (1, 7, 33, len(body)):
+        decoder = ArchiveDecoder(len(chats))
+        decoded, offset = [], 0
+        while decoder.remaining:
+            needed = decoder.bytes_needed()
+            assert 0 < needed <= len(body) - offset
+            size = min(needed, chunk_size)
+            decoded.extend(decode_chat(r) for r in decoder.feed(body[offset : offset + size]))
+            offset += size
+        assert offset == len(body)
+        assert decoded == list(chats.values())
+
+
+def test_archive_cache_reencodes_only_after_change():
+    """Testa se o cache devolve o mesmo objeto até a cadeia mudar."""
+    chain = ChatChain.from_chats(_sample_chats().values())
+    cache = ArchiveCache()
+    first = cache.get(chain)
+    assert cache.get(chain) is first
+    assert first == encode_archive_response(chain)
+
+    chain.append(b"\x01", b"z", b"\x00" * 16, b"\x00" * 16)
+    second = cache.get(chain)
+    assert second is not first
+    assert second == encode_archive_response(chain)
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def _reader_with(data: bytes) -> asyncio.StreamReader:
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+@pytest.mark.asyncio
+async def test_frame_reader_decodes_frames_from_one_buffer():
+    """Testa o recorte de várias mensagens que chegam juntas e o fim limpo da conexão."""
+    chats = ChatChain.from_chats(_sample_chats().values())
+    data = (
+        encode_identify("10.0.0.7") + encode_peer_request() + encode_hello(3)
+        + encode_peer_list(["10.0.0.2", "10.0.0.3"]) + encode_new_tip(5, b"t" * 16, 99)
+        + encode_archive_response(chats) + encode_peer_request()
+    )
+    frames = FrameReader(_reader_with(data), chunk=7)
+
+    received = []
+    async for msg_type, value in frames:
+        if msg_type == ARCHIVE_RESPONSE:
+            assert struct.unpack("!I", await value.readexactly(4))[0] == len(chats)
+            value = ChatChain.from_buffer(await value.readexactly(chats.nbytes))
+        received.append((msg_type, value))
+
+    assert received[:5] == [
+        (IDENTIFY, "10.0.0.7"),
+        (PEER_REQUEST, None),
+        (HELLO, 3),
+        (PEER_LIST, ["10.0.0.2", "10.0.0.3"]),
+        (NEW_TIP, (5, b"t" * 16, 99)),
+    ]
+    assert received[5] == (ARCHIVE_RESPONSE, chats)
+    assert received[6] == (PEER_REQUEST, None)
+
+
+@pytest.mark.asyncio
+async def test_frame_reader_rejects_hostile_sizes_and_unknown_types():
+    """Testa o limite de tamanho antes de alocar o corpo e a recusa de tipos desconhecidos."""
+    hostile = struct.pack("!BI", PEER_LIST, 2**32 - 1)
+    with pytest.raises(ProtocolError):
+        await FrameReader(_reader_with(hostile)).read_frame()
+
+    with pytest.raises(ProtocolError):
+        await FrameReader(_reader_with(b"\x42" + bytes(64))).read_frame()
+
+    chats = ChatChain.from_chats(_sample_chats().values())
+    archive = encode_archive_response(chats)
+    frames = FrameReader(_reader_with(archive), max_archive_size=len(archive) - 1)
+    msg_type, body = await frames.read_frame()
+    assert msg_type == ARCHIVE_RESPONSE
+    await body.readexactly(4)
+    with pytest.raises(ProtocolError):
+        await body.readexactly(chats.nbytes)
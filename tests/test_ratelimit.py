@@ -0,0 +1,45 @@
+import pytest
+
+from dcc_chat.peers import PeerTable
+from dcc_chat.ratelimit import RateLimiter, RateLimitExceeded
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_limits_are_per_peer_and_type_and_faults_disconnect():
+    """Testa a rajada e a recarga dos baldes, o limite de faltas e os tipos sem limite."""
+    clock = _Clock()
+    limiter = RateLimiter({"archive_request": (1, 3)}, tolerance=2, decay=10, clock=clock)
+    assert [limiter.allow("10.0.0.2", "archive_request") for _ in range(4)] == [True, True, True, False]
+    assert limiter.allow("10.0.0.3", "archive_request")
+    assert all(limiter.allow("10.0.0.2", "new_tip") for _ in range(100))
+
+    clock.now = 1.0
+    assert limiter.allow("10.0.0.2", "archive_request")
+    assert not limiter.allow("10.0.0.2", "archive_request")
+    with pytest.raises(RateLimitExceeded):
+        limiter.allow("10.0.0.2", "archive_request")
+
+    limiter.forget("10.0.0.2")
+    assert limiter.allow("10.0.0.2", "archive_request")
+
+
+def test_banned_peer_is_neither_accepted_nor_dialed():
+    """Testa se um par banido fica fora das conexões até o banimento acabar."""
+    clock = _Clock()
+    table = PeerTable("10.0.0.1", clock=clock)
+    table.attach("10.0.0.2", object(), "in")
+    table.ban("10.0.0.2", 60)
+    table.detach("10.0.0.2")
+    assert not table.can_accept("10.0.0.2", "in")
+    assert "10.0.0.2" not in table.dial_candidates()
+
+    clock.now = 61
+    assert table.can_accept("10.0.0.2", "in")
+    assert table.dial_candidates() == ["10.0.0.2"]
@@ -0,0 +1,82 @@
+import random
+
+from dcc_chat.scheduler import SyncScheduler
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _scheduler(clock, **kwargs):
+    options = dict(min_interval=5, max_interval=60, backoff=2, jitter=0.2, rate=100, clock=clock, rng=random.Random(1))
+    options.update(kwargs)
+    return SyncScheduler(**options)
+
+
+def test_backoff_while_tip_is_unchanged():
+    """Testa se o intervalo dobra até o máximo enquanto a ponta não muda."""
+    clock = _Clock()
+    scheduler = _scheduler(clock)
+    scheduler.add("a")
+    assert 4 <= scheduler.delay() <= 6
+
+    intervals = []
+    for _ in range(7):
+        clock.now += scheduler.delay() + 1e-9
+        assert scheduler.pop_due() == ["a"]
+        scheduler.observe("a", (3, b"tip"))
+        intervals.append(scheduler.peers["a"].interval)
+    assert intervals == [5, 10, 20, 40, 60, 60, 60]
+
+
+def test_new_tip_and_kick_speed_up():
+    """Testa se uma ponta nova ou um chat local trazem o par de volta ao intervalo mínimo."""
+    clock = _Clock()
+    scheduler = _scheduler(clock)
+    scheduler.add("a")
+    scheduler.observe("a", 1)
+    for _ in range(5):
+        scheduler.observe("a", 1)
+    clock.now += scheduler.delay() + 1e-9
+    scheduler.pop_due()
+    assert scheduler.delay() > 40
+
+    scheduler.observe("a", 2)
+    assert scheduler.peers["a"].interval == 5
+    assert scheduler.delay() <= 6
+
+    for _ in range(5):
+        scheduler.observe("a", 2)
+    clock.now += scheduler.delay() + 1e-9
+    scheduler.pop_due()
+    scheduler.kick()
+    assert scheduler.delay() <= 6
+
+
+def test_jitter_spreads_peers():
+    """Testa se pares adicionados juntos não vencem no mesmo instante."""
+    clock = _Clock()
+    scheduler = _scheduler(clock)
+    for i in range(20):
+        scheduler.add(str(i))
+    dues = [s.due for s in scheduler.peers.values()]
+    assert len(set(dues)) == 20
+    assert all(4 <= due <= 6 for due in dues)
+
+
+def test_global_budget():
+    """Testa se o orçamento de requisições por segundo adia os pares excedentes."""
+    clock = _Clock()
+    scheduler = _scheduler(clock, rate=10)
+    for i in range(20):
+        scheduler.add(str(i))
+    clock.now = 10
+    assert len(scheduler.pop_due()) == 5
+    assert scheduler.pop_due() == []
+    assert 0.1 <= scheduler.delay() <= 0.2
+    clock.now += 1
+    assert len(scheduler.pop_due()) == 5
@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from dcc_chat.connection import P2PNode
+from dcc_chat.protocol import encode_archive_response
+from dcc_chat.storage import ChainStore
+from dcc_chat.verification import first_invalid
+
+
+def test_store_round_trip(tmp_path, make_chain):
+    """Testa se a cadeia gravada é recarregada igual e com checkpoint na ponta."""
+    chats = make_chain(["a", "b", "c"])
+    path = str(tmp_path / "chain.bin")
+    store = ChainStore(path)
+    store.load()
+    store.sync(chats, 0)
+    store.close()
+
+    store = ChainStore(path)
+    assert store.load() == chats
+    assert store.height == 3
+
+
+def test_store_truncates_torn_tail(tmp_path, make_chain):
+    """Testa se um chat escrito pela metade é descartado na inicialização."""
+    chats = make_chain(["a", "b", "c"])
+    path = str(tmp_path / "chain.bin")
+    with open(path, "wb") as f:
+        f.write(bytes(chats.view()) + bytes(chats.record(2))[:10])
+
+    store = ChainStore(path)
+    assert store.load() == chats
+    store.close()
+    assert os.path.getsize(path) == chats.nbytes
+
+
+def test_store_drops_invalid_records_after_checkpoint(tmp_path, make_chain):
+    """Testa se chats adulterados após o checkpoint são cortados ao carregar."""
+    chats = make_chain(["a", "b", "c", "d"])
+    path = str(tmp_path / "chain.bin")
+    store = ChainStore(path)
+    store.load()
+    store.sync(chats, 0)
+    store.close()
+    with open(path, "r+b") as f:
+        f.seek(chats.offset(2) + 1)
+        f.write(b"Z")
+    os.remove(path + ".ckpt")
+
+    store = ChainStore(path)
+    loaded = store.load()
+    assert len(loaded) == 2
+    assert store.height == 2
+
+
+def test_store_rewrites_after_fork(tmp_path, make_chain):
+    """Testa a troca de ramo: o arquivo é cortado no ponto comum e estendido."""
+    base = make_chain(["a", "b"])
+    path = str(tmp_path / "chain.bin")
+    store = ChainStore(path)
+    store.load()
+    store.sync(make_chain(["c"], base), 0)
+    fork = make_chain(["x", "y"], base)
+    store.sync(fork, 2)
+    store.close()
+
+    assert ChainStore(path).load() == fork
+
+
+@pytest.mark.asyncio
+async def test_pruned_node_serves_full_archive_from_disk(tmp_path, make_chain):
+    """Testa se o nó podado guarda só a cauda em memória e serve o histórico inteiro do disco."""
+    chats = make_chain([f"chat {i}" for i in range(40)])
+    path = str(tmp_path / "chain.bin")
+    store = ChainStore(path)
+    store.load()
+    store.sync(chats, 0)
+    store.close()
+
+    node = P2PNode("127.0.0.1", chain_path=path, show_chats=False, prune_tail=20)
+    node.load_chain()
+    try:
+        assert (len(node.chats), node.chats.base, node.chats.tip) == (40, 20, chats.tip)
+        assert node.chats.nbytes - node.chats.base_offset == chats.offset(40) - chats.offset(20)
+        assert node.archive_cache.get(node.chats) == encode_archive_response(chats)
+        assert node.history.page(limit=100)[0][0][0] == 20
+
+        longer = make_chain(["novo"], chats)
+        node.chats.extend(longer.view(40))
+        assert first_invalid(node.chats, 40) is None
+        node.on_chain_changed(40)
+        assert node.archive_cache.get(node.chats) == encode_archive_response(longer)
+        assert node.find_chat(longer.md5(40)) == (40, longer[40])
+    finally:
+        await node.stop()
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from dcc_chat.connection import P2PNode
+from dcc_chat.mining import Miner, MiningCancelled, mine_batch
+from dcc_chat.verification import first_invalid
+
+
+class _BlockingMiner:
+    """Minera no próprio processo, mas segura os textos em `blocked` até um cancelamento."""
+
+    def __init__(self, blocked=()):
+        self.blocked = set(blocked)
+        self.started = asyncio.Queue()
+
+    async def mine(self, prefix, partial, cancel=None):
+        text = partial[1:].decode()
+        await self.started.put(text)
+        if text in self.blocked:
+            await cancel.wait()
+            raise MiningCancelled("Mineração cancelada.")
+        code = None
+        while code is None:
+            code, md5, _ = mine_batch(prefix, partial, b"\x00" * 8, 1 << 22)
+        return code, md5
+
+    def close(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_burst_is_mined_back_to_back_and_published_once():
+    """Testa se chats enviados juntos são minerados em sequência e anunciados num só lote."""
+    node = P2PNode("127.0.0.1")
+    node.miner.close()
+    node.miner = Miner(workers=1)
+    try:
+        futures = [node.submit_chat(text) for text in ("a", "b", "c")]
+        heights = await asyncio.wait_for(asyncio.gather(*futures), 60)
+    finally:
+        await node.stop()
+
+    assert heights == [0, 1, 2]
+    assert [chat["text"] for chat in node.chats.values()] == [b"a", b"b", b"c"]
+    assert first_invalid(node.chats) is None
+    assert node.submitter.batches == 1
+    with pytest.raises(ValueError):
+        node.submit_chat("x" * 256)
+
+
+@pytest.mark.asyncio
+async def test_competing_tip_aborts_and_remines_orphaned_chats(make_chain):
+    """Testa se uma ponta adotada durante o lote faz os chats do lote serem minerados de novo sobre ela."""
+    base = make_chain(["0", "1"])
+    rival = make_chain(["r"], base)
+    node = P2PNode("127.0.0.1")
+    node.chats = base.copy()
+    node.miner = _BlockingMiner(blocked={"y"})
+    try:
+        futures = [node.submit_chat("x"), node.submit_chat("y")]
+        assert await node.miner.started.get() == "x"
+        assert await node.miner.started.get() == "y"
+        assert len(node.chats) == 3
+
+        # Chega uma cadeia mais longa sem o "x", que ainda não tinha sido anunciado.
+        node.miner.blocked.clear()
+        node.chats = make_chain(["s"], rival)
+        node.on_chain_changed(2, "10.0.0.2")
+        heights = await asyncio.wait_for(asyncio.gather(*futures), 30)
+    finally:
+        await node.stop()
+
+    assert heights == [4, 5]
+    assert [chat["text"] for chat in node.chats.values()] == [b"0", b"1", b"r", b"s", b"x", b"y"]
+    assert first_invalid(node.chats) is None
+    assert node.submitter.aborted == 1
+    assert node.submitter.batches == 1
+
+
+@pytest.mark.asyncio
+async def test_long_burst_is_published_in_capped_batches():
+    """Testa se uma rajada maior que o limite do lote é anunciada aos poucos, sem esperar a fila esvaziar."""
+    node = P2PNode("127.0.0.1")
+    node.miner = _BlockingMiner()
+    node.submitter.max_batch = 2
+    try:
+        futures = [node.submit_chat(str(i)) for i in range(5)]
+        heights = await asyncio.wait_for(asyncio.gather(*futures), 30)
+    finally:
+        await node.stop()
+
+    assert heights == [0, 1, 2, 3, 4]
+    assert node.submitter.batches == 3
+    assert first_invalid(node.chats) is None
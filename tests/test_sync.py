@@ -0,0 +1,122 @@
+import asyncio
+import struct
+
+import pytest
+
+from dcc_chat.chain import ChatChain
+from dcc_chat.connection import P2PNode
+from dcc_chat.messages import send_to_chats_to_all_peers
+from dcc_chat.pipeline import read_archive_suffix
+from dcc_chat.protocol import (
+    decode_archive_since_request,
+    encode_archive_since_request,
+    ARCHIVE_RESPONSE,
+    ARCHIVE_SUFFIX,
+)
+from dcc_chat.verification import InvalidChainError
+
+
+class _Writer:
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+
+def _Node(chats):
+    node = P2PNode("127.0.0.1")
+    node.chats = chats
+    node.verified.update(chats)
+    return node
+
+
+async def _answer(server_chats, client_chats):
+    """Simula um ArchiveSinceRequest do cliente e devolve a resposta do servidor."""
+    request = encode_archive_since_request(len(client_chats), client_chats.tip)
+    writer = _Writer()
+    await _Node(server_chats).on_archive_since_request("10.0.0.9", writer, decode_archive_since_request(request[1:]))
+    return bytes(writer.data)
+
+
+async def _receive(node, response: bytes):
+    """Lê o ArchiveSuffix e espera o pipeline verificá-lo e aplicá-lo."""
+    try:
+        await read_archive_suffix(node, _reader_with(response[1:]), "10.0.0.9")
+        await node.pipeline.join()
+    finally:
+        node.pipeline.close()
+
+
+def _reader_with(data: bytes) -> asyncio.StreamReader:
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+@pytest.mark.asyncio
+async def test_suffix_sync_appends_only_new_chats(make_chain):
+    """Testa se um par com prefixo comum recebe só os chats novos."""
+    server = make_chain([f"m{i}" for i in range(25)])
+    client = ChatChain()
+    client.extend(server.view(0, 22))
+    node = _Node(client)
+
+    response = await _answer(server, client)
+    assert response[0] == ARCHIVE_SUFFIX
+    assert struct.unpack("!II", response[1:9]) == (22, 3)
+
+    await _receive(node, response)
+    assert node.chats == server
+    assert node.verified.height == 25
+
+
+@pytest.mark.asyncio
+async def test_suffix_sync_is_tiny_when_nothing_changed(make_chain):
+    """Testa se, sem novidades, a resposta é só o cabeçalho do sufixo."""
+    server = make_chain(["a", "b"])
+    response = await _answer(server, server.copy())
+    assert response == struct.pack("!BII", ARCHIVE_SUFFIX, 2, 0)
+
+
+@pytest.mark.asyncio
+async def test_suffix_sync_falls_back_to_full_archive_on_fork(make_chain):
+    """Testa se um par em outro ramo recebe o histórico completo."""
+    server = make_chain(["a", "b", "c"])
+    fork = make_chain(["x"], make_chain(["a"]))
+    response = await _answer(server, fork)
+    assert response[0] == ARCHIVE_RESPONSE
+
+
+@pytest.mark.asyncio
+async def test_suffix_sync_rejects_invalid_chat(make_chain):
+    """Testa se um sufixo adulterado é rejeitado sem alterar a cadeia local."""
+    server = make_chain(["a", "b", "c", "d"])
+    client = ChatChain()
+    client.extend(server.view(0, 2))
+    node = _Node(client)
+
+    response = bytearray(await _answer(server, client))
+    response[-1] ^= 0xFF
+    with pytest.raises(InvalidChainError) as error:
+        await _receive(node, bytes(response))
+    assert error.value.index == 3
+    assert len(node.chats) == 2
+
+
+@pytest.mark.asyncio
+async def test_broadcast_encodes_archive_once(make_chain):
+    """Testa se todos os pares recebem o mesmo ArchiveResponse, codificado uma vez."""
+    node = _Node(make_chain(["a", "b"]))
+    node.peers = {f"10.0.0.{i}": _Writer() for i in range(5)}
+
+    await send_to_chats_to_all_peers(node)
+
+    payloads = {bytes(w.data) for w in node.peers.values()}
+    assert len(payloads) == 1
+    assert payloads.pop()[0] == ARCHIVE_RESPONSE
+    assert node.archive_cache.misses == 1
@@ -0,0 +1,206 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from dcc_chat import pipeline
+from dcc_chat.pipeline import read_archive_response
+from dcc_chat.protocol import encode_archive_response
+from dcc_chat.chain import ChatChain
+from dcc_chat.connection import P2PNode
+from dcc_chat.verification import (
+    InvalidChainError,
+    OpenSSLKernel,
+    ParallelVerifier,
+    ThreadedKernel,
+    first_invalid,
+    hashlib_kernel,
+    make_kernel,
+    verification_check,
+)
+
+
+def test_first_invalid_detects_tampering(make_chain):
+    """Testa se a verificação aponta o primeiro chat adulterado."""
+    chats = make_chain(["a", "b", "c", "d"])
+    assert first_invalid(chats) is None
+
+    tampered = list(chats.values())
+    tampered[2] = dict(tampered[2], text=b"X")
+    assert first_invalid(ChatChain.from_chats(tampered)) == 2
+
+
+def test_chain_window_matches_verification_check(make_chain):
+    """Testa se a janela da ChatChain é exatamente o que foi hasheado na mineração."""
+    chats = make_chain([str(i) for i in range(25)])
+    as_dict = dict(enumerate(chats.values()))
+    for idx in range(1, len(chats)):
+        assert hashlib.md5(chats.window(idx)).digest() == chats.md5(idx)
+        assert verification_check(as_dict[idx], as_dict, range(max(0, idx - 19), idx))
+
+
+def _reader_with(data: bytes) -> asyncio.StreamReader:
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+async def _receive(node, reader):
+    """Lê o ArchiveResponse e espera o pipeline verificá-lo e aplicá-lo."""
+    try:
+        await read_archive_response(node, reader)
+        await node.pipeline.join()
+    finally:
+        node.pipeline.close()
+
+
+@pytest.mark.asyncio
+async def test_read_archive_response_does_not_overread(make_chain):
+    """Testa se o decodificador em blocos lê exatamente o ArchiveResponse."""
+    chats = make_chain(["a" * 200, "b", "c" * 50, "d"])
+    node = P2PNode("127.0.0.1")
+    trailer = b"\x01\x03"
+    reader = _reader_with(encode_archive_response(chats)[1:] + trailer)
+
+    await _receive(node, reader)
+
+    assert node.chats == chats
+    assert node.verified.height == 4
+    assert await reader.read() == trailer
+
+
+@pytest.mark.asyncio
+async def test_read_archive_response_rejects_at_first_invalid(make_chain):
+    """Testa se a leitura recusa o arquivo apontando o primeiro chat adulterado."""
+    chats = make_chain(["a", "b", "c", "d"])
+    tampered = list(chats.values())
+    tampered[1] = dict(tampered[1], verification_code=b"\x00" * 16)
+    node = P2PNode("127.0.0.1")
+
+    with pytest.raises(InvalidChainError) as error:
+        await _receive(node, _reader_with(encode_archive_response(ChatChain.from_chats(tampered))[1:]))
+
+    assert error.value.index == 1
+    assert len(node.chats) == 0
+
+
+@pytest.mark.asyncio
+async def test_read_archive_response_stops_at_first_invalid_block(make_chain, monkeypatch):
+    """Testa se um arquivo inválido é recusado sem ser lido até o fim."""
+    monkeypatch.setattr(pipeline, "ARCHIVE_VERIFY_BLOCK", 4)
+    chats = make_chain([str(i) for i in range(25)])
+    tampered = list(chats.values())
+    tampered[2] = dict(tampered[2], text=b"X")
+    node = P2PNode("127.0.0.1")
+    body = encode_archive_response(ChatChain.from_chats(tampered))[1:]
+    reader = _reader_with(body)
+
+    with pytest.raises(InvalidChainError) as error:
+        await _receive(node, reader)
+
+    assert error.value.index == 2
+    assert len(await reader.read()) == len(body) - 4 - chats.offset(4)
+    assert len(node.chats) == 0
+
+
+def test_parallel_verifier_matches_serial(make_chain):
+    """Testa se a verificação paralela aponta o mesmo primeiro chat inválido."""
+    chats = make_chain([str(i) for i in range(40)])
+    verifier = ParallelVerifier(workers=2, min_segment=4)
+    try:
+        assert verifier.first_invalid(chats) is None
+
+        tampered = list(chats.values())
+        for bad in (30, 12):
+            tampered[bad] = dict(tampered[bad], verification_code=b"\x01" * 16)
+        tampered = ChatChain.from_chats(tampered)
+        assert first_invalid(tampered) == 12
+        assert verifier.first_invalid(tampered) == 12
+        assert verifier.first_invalid(tampered, start=13) == first_invalid(tampered, 13)
+        # A partir de depois da primeira janela, só parte da cadeia é copiada.
+        late = list(chats.values())
+        late[30] = dict(late[30], verification_code=b"\x01" * 16)
+        assert verifier.first_invalid(ChatChain.from_chats(late), start=25) == 30
+        assert verifier.first_invalid(chats, start=25) is None
+    finally:
+        verifier.close()
+
+
+def test_parallel_verifier_needs_two_workers(make_chain):
+    """Testa se um único processo verifica em série e se o limiar cai com mais processos."""
+    chats = make_chain([str(i) for i in range(40)])
+    verifier = ParallelVerifier(workers=1, min_segment=4)
+    assert verifier.first_invalid(chats) is None
+    assert verifier._executor is None and verifier.threshold is None
+    assert ParallelVerifier(workers=2, threshold=1000).threshold == 2000
+    assert ParallelVerifier(workers=5, threshold=1000).threshold == 1250
+
+
+@pytest.mark.asyncio
+async def test_read_archive_response_rechecks_old_chats_with_copied_hashes(make_chain):
+    """Testa se um chat antigo alterado é detectado mesmo com todos os md5 iguais aos locais."""
+    chats = make_chain([str(i) for i in range(25)])
+    node = P2PNode("127.0.0.1")
+    node.chats = chats
+    node.on_chain_changed(0)
+
+    forged = list(make_chain(["novo"], chats).values())
+    forged[0] = dict(forged[0], text=b"X")
+
+    with pytest.raises(InvalidChainError) as error:
+        await _receive(node, _reader_with(encode_archive_response(ChatChain.from_chats(forged))[1:]))
+    assert error.value.index == 1
+    assert node.chats is chats
+
+
+def _openssl():
+    try:
+        return OpenSSLKernel()
+    except OSError:
+        pytest.skip("libcrypto indisponível")
+
+
+KERNELS = {
+    "hashlib": lambda: hashlib_kernel,
+    "openssl": _openssl,
+    "threads": lambda: ThreadedKernel(hashlib_kernel, workers=3, batch=4),
+    "threads-openssl": lambda: ThreadedKernel(_openssl(), workers=3, batch=4),
+}
+
+
+@pytest.mark.parametrize("name", sorted(KERNELS))
+def test_kernels_match_verification_check(name):
+    """Testa se cada kernel aponta o mesmo primeiro chat inválido que a verificação original."""
+    kernel = KERNELS[name]()
+    # Os kernels só conferem o md5, então a cadeia dispensa a mineração. Textos
+    # longos fazem janelas acima de 2 KiB, onde o hashlib solta o GIL.
+    chats = ChatChain()
+    for i in range(30):
+        text = b"x" * 250 if i % 3 == 0 else str(i).encode()
+        partial = bytes([len(text)]) + text + bytes([i]) * 16
+        chats.append_record(partial + hashlib.md5(bytes(chats.tail()) + partial).digest())
+    tampered = list(chats.values())
+    for bad in (25, 17, 9):
+        tampered[bad] = dict(tampered[bad], verification_code=b"\x02" * 16)
+    try:
+        for chain in (chats, ChatChain.from_chats(tampered)):
+            as_dict = dict(enumerate(chain.values()))
+            valid = [idx == 0 or verification_check(as_dict[idx], as_dict, range(max(0, idx - 19), idx)) for idx in range(len(chain))]
+            for start in (1, 9, 10, 18, 26):
+                expected = next((idx for idx in range(start, len(chain)) if not valid[idx]), None)
+                assert first_invalid(chain, start, kernel=kernel) == expected
+            assert first_invalid(chain, 1, 9, kernel=kernel) is None
+            # Buffer somente leitura, como o de um arquivo mapeado em memória.
+            readonly = memoryview(bytes(chain.view()))
+            assert kernel(readonly, chain.offsets, 1, len(chain)) == first_invalid(chain)
+    finally:
+        if hasattr(kernel, "close"):
+            kernel.close()
+
+
+def test_make_kernel_rejects_unknown_backend():
+    """Testa se um nome de kernel desconhecido em VERIFY_KERNEL é um erro claro."""
+    assert make_kernel("hashlib") is hashlib_kernel
+    with pytest.raises(ValueError):
+        make_kernel("gpu")